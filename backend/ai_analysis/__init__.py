@@ -1,5 +1,7 @@
 from .data_analyzer import FitnessDataAnalyzer
 from .ai_coach import FitnessAICoach
-from .profile_transformer import get_user_profile_for_ai, transform_user_profile
+from .profile_transformer import get_user_profile_for_ai, get_cached_user_profile, invalidate_user_profile, transform_user_profile
+from .chat_sessions import ChatSessionStore
 
-__all__ = ["FitnessDataAnalyzer", "FitnessAICoach", "get_user_profile_for_ai", "transform_user_profile"]
+__all__ = ["FitnessDataAnalyzer", "FitnessAICoach", "get_user_profile_for_ai", "get_cached_user_profile",
+           "invalidate_user_profile", "transform_user_profile", "ChatSessionStore"]
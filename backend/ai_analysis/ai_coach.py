@@ -3,25 +3,51 @@ Fitness AI Coach - OpenAI Integration
 Generates personalized fitness insights using OpenAI API.
 """
 
-import json
-from typing import Dict, List, Any, Optional
+import time
+from typing import Dict, List, Any, Optional, Tuple
 from openai import OpenAI
 
+from .llm_client import get_llm_client
+from .rate_limiter import llm_limiter, estimate_tokens, RateLimitExceeded
+from .prompt_encoder import encode_summary, encode_profile
+from .model_router import model_router, FAILOVER_ERRORS
+from .usage_ledger import usage_ledger
+from metrics import observe_llm_call
+from profiling import span, traced
+
+# Number of most recent chat messages sent to the model verbatim
+CHAT_HISTORY_WINDOW = 8
+
 
 class FitnessAICoach:
     """AI-powered fitness coach using OpenAI API."""
 
-    def __init__(self, api_key: str, model: str = "gpt-4o", user_profile: Optional[Dict] = None):
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, user_profile: Optional[Dict] = None,
+                 client: Optional[OpenAI] = None, user_id: Optional[str] = None, endpoint: Optional[str] = None,
+                 profile_hash: Optional[str] = None):
         """
-        Initialize OpenAI client.
+        Initialize coach. Coaches are lightweight per-request views over a shared,
+        connection-pooled OpenAI client.
 
         Args:
-            api_key: OpenAI API key
-            model: Model to use (default: gpt-4o)
+            api_key: OpenAI API key (default: OPENAI_API_KEY env var)
+            model: Force this model for every call (default: routed per call type by model_router)
             user_profile: Optional user profile data
+            client: Optional OpenAI client (default: the shared client for api_key)
+            user_id: User the calls are made for (used for fair rate limiting)
+            endpoint: API endpoint making the calls (recorded in the usage ledger)
+            profile_hash: Hash of user_profile; requests sharing it share a provider prompt-cache key
         """
-        self.client = OpenAI(api_key=api_key)
+        self.client = client or get_llm_client(api_key)
+        if self.client is None:
+            raise ValueError("OpenAI API key not configured")
         self.model = model
+        self.user_id = user_id
+        self.limiter = llm_limiter
+        self.model_router = model_router
+        self.usage_ledger = usage_ledger
+        self.endpoint = endpoint
+        self.profile_hash = profile_hash
 
         # Default user profile (can be customized per user)
         self.user_profile = user_profile or {
@@ -37,15 +63,98 @@ class FitnessAICoach:
             }
         }
 
+    def _create_completion(self, call_type: str, messages: List[Dict], temperature: float, max_tokens: int) -> Tuple[Any, str]:
+        """
+        Run a chat completion through the shared rate limiter, routing it to the
+        model configured for `call_type`, and record it in the usage ledger.
+
+        Returns:
+            Tuple of (response, model actually used)
+        """
+        entry = {
+            "user_id": self.user_id,
+            "endpoint": self.endpoint,
+            "call_type": call_type,
+            "profile_hash": self.profile_hash,
+            "model": None,
+            "status": "error",
+            "retries": 0
+        }
+        started = time.monotonic()
+        try:
+            with self.limiter.acquire(self.user_id, estimate_tokens(messages, max_tokens)) as grant:
+                entry["queue_ms"] = round((time.monotonic() - started) * 1000)
+                response = self._complete_with_failover(call_type, messages, temperature, max_tokens, entry)
+                grant.actual_tokens = response.usage.total_tokens
+
+            usage = response.usage
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached_tokens = getattr(details, "cached_tokens", 0) or 0
+            entry.update({
+                "status": "success",
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "total_tokens": usage.total_tokens,
+                "cached_tokens": cached_tokens,
+                "cache_hit": cached_tokens > 0
+            })
+            return response, entry["model"]
+        except RateLimitExceeded:
+            entry["status"] = "rate_limited"
+            raise
+        except Exception as e:
+            entry["error"] = type(e).__name__
+            raise
+        finally:
+            entry["latency_ms"] = round((time.monotonic() - started) * 1000)
+            self.usage_ledger.record(entry)
+            observe_llm_call(entry)
+
+    def _complete_with_failover(self, call_type: str, messages: List[Dict], temperature: float, max_tokens: int,
+                                entry: Dict[str, Any]):
+        """Try the routed models in order, failing over on timeouts and provider errors."""
+        candidates = self.model_router.candidates(call_type, self.model)
+        timeout = self.model_router.timeout(call_type)
+        # Prompts start with the same profile block, so route them to the same provider prompt cache
+        extra_body = {"prompt_cache_key": f"{self.user_id}:{self.profile_hash}"} if self.user_id and self.profile_hash else None
+
+        for attempt, model in enumerate(candidates):
+            is_last = attempt == len(candidates) - 1
+            entry["model"] = model
+            entry["retries"] = attempt
+            # Leave retries to the fallback model instead of retrying a struggling primary
+            client = self.client.with_options(timeout=timeout, max_retries=self.client.max_retries if is_last else 0)
+            started = time.monotonic()
+            try:
+                with span("llm.completion", model=model, call_type=call_type, attempt=attempt):
+                    response = client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        extra_body=extra_body
+                    )
+            except FAILOVER_ERRORS:
+                self.model_router.record(model, time.monotonic() - started, ok=False)
+                if is_last:
+                    raise
+                continue
+            except Exception:
+                self.model_router.record(model, time.monotonic() - started, ok=False)
+                raise
+
+            self.model_router.record(model, time.monotonic() - started, ok=True)
+            return response
+
     def _build_general_analysis_prompt(self, summary: Dict[str, Any], previous_analyses: Optional[List[str]] = None) -> str:
         """Build structured prompt for General Analysis with optional previous months' context."""
-        profile_json = json.dumps(self.user_profile, indent=2, default=str)
-        summary_json = json.dumps(summary, indent=2, default=str)
-        
+        profile_text = encode_profile(self.user_profile)
+        summary_text = encode_summary(summary)
+
         prompt = f"""You are an expert fitness coach providing a personalized monthly review.
 
 USER PROFILE:
-{profile_json}
+{profile_text}
 """
 
         # Add previous months' analyses as context if provided
@@ -68,7 +177,7 @@ PREVIOUS MONTHS' ANALYSES (in chronological order, for context and trend analysi
 """
 
         prompt += f"""CURRENT MONTH DATA:
-{summary_json}
+{summary_text}
 
 Provide a structured analysis covering these sections:
 
@@ -129,6 +238,7 @@ Format your response with clear section headers."""
 
         return prompt
 
+    @traced("coach.generate_general_analysis")
     def generate_general_analysis(self, summary: Dict[str, Any], previous_analyses: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Generate comprehensive General Analysis report with optional previous months' context.
@@ -163,8 +273,8 @@ Format your response with clear section headers."""
                     "error": "Prompt is not a valid string"
                 }
             
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response, model = self._create_completion(
+                "analysis",
                 messages=[
                     {
                         "role": "system",
@@ -184,11 +294,13 @@ Format your response with clear section headers."""
             return {
                 "status": "success",
                 "analysis": analysis_text,
-                "model": self.model,
+                "model": model,
                 "tokens_used": response.usage.total_tokens,
                 "summary_data": summary
             }
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             return {
                 "status": "error",
@@ -203,7 +315,7 @@ Format your response with clear section headers."""
         lifestyle = summary.get('lifestyle', {})
 
         return f"""USER PROFILE:
-{json.dumps(self.user_profile, indent=2)}
+{encode_profile(self.user_profile)}
 
 RECENT DATA (monthly summary):
 Training: {training.get('sessions_per_week', 0)} sessions/week, {training.get('progression', 'stable')} progression
@@ -212,7 +324,10 @@ Recovery: {recovery.get('avg_sleep_hours', 0)}h sleep (trend: {recovery.get('sle
 Lifestyle: Stress {lifestyle.get('avg_stress', 0)}/10, {lifestyle.get('high_stress_days', 0)} high-stress days
 """
 
-    def chat(self, user_message: str, summary: Dict[str, Any], conversation_history: Optional[List[Dict]] = None) -> Dict[str, Any]:
+    @traced("coach.chat")
+    def chat(self, user_message: str, summary: Dict[str, Any], conversation_history: Optional[List[Dict]] = None,
+             conversation_summary: Optional[str] = None, history_window: Optional[int] = CHAT_HISTORY_WINDOW,
+             relevant_notes: Optional[List[Dict]] = None) -> Dict[str, Any]:
         """
         Handle chatbot interactions with context awareness.
 
@@ -220,12 +335,17 @@ Lifestyle: Stress {lifestyle.get('avg_stress', 0)}/10, {lifestyle.get('high_stre
             user_message: User's question/message
             summary: Current fitness data summary
             conversation_history: Previous conversation messages
+            conversation_summary: Rolling summary of older turns that are no longer sent verbatim
+            history_window: Only the most recent messages of the history are sent (None sends all)
+            relevant_notes: Log entries retrieved for this message (date, collection, text)
 
         Returns:
             Dict containing response status, message, tokens used, and updated history
         """
         if conversation_history is None:
             conversation_history = []
+        # Only the prompt is trimmed; the returned history keeps every turn the caller sent
+        recent_history = conversation_history[-history_window:] if history_window else conversation_history
 
         context = self._build_chatbot_context(summary)
 
@@ -237,13 +357,26 @@ Provide specific, personalized advice based on their actual data. Be conversatio
 Reference their actual numbers when relevant (sleep hours, training frequency, etc.).
 Consider their constraints (busy student schedule) in your recommendations."""
 
+        if relevant_notes:
+            notes = "\n".join(f"- {n.get('date', '')} ({n.get('collection', '')}): {n.get('text', '')}" for n in relevant_notes)
+            system_message += f"""
+
+RELEVANT ENTRIES FROM THEIR LOGS (retrieved for this message):
+{notes}"""
+
+        if conversation_summary:
+            system_message += f"""
+
+EARLIER IN THIS CONVERSATION (summary):
+{conversation_summary}"""
+
         messages = [{"role": "system", "content": system_message}]
-        messages.extend(conversation_history)
+        messages.extend(recent_history)
         messages.append({"role": "user", "content": user_message})
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response, model = self._create_completion(
+                "chat",
                 messages=messages,
                 temperature=0.7,
                 max_tokens=500
@@ -254,6 +387,7 @@ Consider their constraints (busy student schedule) in your recommendations."""
             return {
                 "status": "success",
                 "response": assistant_message,
+                "model": model,
                 "tokens_used": response.usage.total_tokens,
                 "conversation_history": conversation_history + [
                     {"role": "user", "content": user_message},
@@ -261,6 +395,55 @@ Consider their constraints (busy student schedule) in your recommendations."""
                 ]
             }
 
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+
+    @traced("coach.summarize_conversation")
+    def summarize_conversation(self, previous_summary: Optional[str], messages: List[Dict]) -> Dict[str, Any]:
+        """
+        Fold older conversation turns into a short rolling summary.
+
+        Args:
+            previous_summary: Existing rolling summary (may be empty)
+            messages: Messages to fold in, in chronological order
+
+        Returns:
+            Dict containing status, the new summary and tokens used
+        """
+        transcript = "\n".join(f"{m.get('role', 'user').upper()}: {m.get('content', '')}" for m in messages)
+        prompt = f"""Update the running summary of a conversation between a fitness coach and their client.
+
+CURRENT SUMMARY:
+{previous_summary or "(none)"}
+
+NEW MESSAGES:
+{transcript}
+
+Write the updated summary in at most 120 words. Keep facts the client shared (injuries, schedule,
+preferences, numbers) and any advice or commitments already given. Do not add anything new."""
+
+        try:
+            response, model = self._create_completion(
+                "summary",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.2,
+                max_tokens=200
+            )
+
+            return {
+                "status": "success",
+                "summary": response.choices[0].message.content.strip(),
+                "model": model,
+                "tokens_used": response.usage.total_tokens
+            }
+
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             return {
                 "status": "error",
@@ -0,0 +1,199 @@
+"""
+Chat Session Store
+Persists AI coach conversations in Firestore so clients only send the new message.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from firebase_admin import firestore
+
+from .ai_coach import CHAT_HISTORY_WINDOW
+
+# Older messages are folded into the rolling summary once this many have aged out of the window
+SUMMARY_BATCH_SIZE = 6
+
+# How long the cached monthly summary context stays valid before it is rebuilt
+CONTEXT_TTL_SECONDS = 6 * 60 * 60
+
+
+@firestore.transactional
+def _append_in_transaction(transaction, session_ref, messages_ref, messages: List[tuple], tokens_used: int) -> int:
+    snapshot = session_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        raise KeyError(session_ref.id)
+    # Numbered from the count read in this transaction, so concurrent turns cannot reuse a seq
+    seq = (snapshot.to_dict() or {}).get("message_count", 0)
+    now = datetime.now().isoformat()
+    for offset, (role, content) in enumerate(messages):
+        transaction.set(messages_ref.document(f"{seq + offset:06d}"), {
+            "seq": seq + offset,
+            "role": role,
+            "content": content,
+            "created_at": now
+        })
+    transaction.update(session_ref, {
+        "message_count": seq + len(messages),
+        "tokens_used": firestore.Increment(tokens_used or 0),
+        "updated_at": now
+    })
+    return seq + len(messages)
+
+
+@firestore.transactional
+def _update_summary_in_transaction(transaction, session_ref, rolling_summary: str, summarized_through: int,
+                                   expected_through: int) -> bool:
+    snapshot = session_ref.get(transaction=transaction)
+    if not snapshot.exists or (snapshot.to_dict() or {}).get("summarized_through", -1) != expected_through:
+        return False
+    transaction.update(session_ref, {
+        "rolling_summary": rolling_summary,
+        "summarized_through": summarized_through
+    })
+    return True
+
+
+class ChatSessionStore:
+    """Reads and writes chat sessions for a single user."""
+
+    def __init__(self, db, user_id: str):
+        """
+        Initialize session store.
+
+        Args:
+            db: Firestore database client
+            user_id: User ID owning the sessions
+        """
+        self.db = db
+        self.user_id = user_id
+
+    def _sessions_ref(self):
+        return self.db.collection("users").document(self.user_id).collection("chat_sessions")
+
+    def _messages_ref(self, session_id: str):
+        return self._sessions_ref().document(session_id).collection("messages")
+
+    def create_session(self, year: int, month: int, summary: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new session with the monthly summary cached as its context."""
+        now = datetime.now().isoformat()
+        session_data = {
+            "year": year,
+            "month": month,
+            "message_count": 0,
+            "rolling_summary": "",
+            "summarized_through": -1,
+            "tokens_used": 0,
+            "context_summary": summary,
+            "context_built_at": now,
+            "created_at": now,
+            "updated_at": now
+        }
+        doc_ref = self._sessions_ref().document()
+        doc_ref.set(session_data)
+        return {"id": doc_ref.id, **session_data}
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch session metadata, or None if it does not exist."""
+        doc = self._sessions_ref().document(session_id).get()
+        if not doc.exists:
+            return None
+        return {"id": doc.id, **doc.to_dict()}
+
+    def list_sessions(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """List the user's most recently active sessions without their cached context."""
+        docs = self._sessions_ref().order_by("updated_at", direction="DESCENDING").limit(limit).stream()
+        sessions = []
+        for doc in docs:
+            data = doc.to_dict()
+            data.pop("context_summary", None)
+            sessions.append({"id": doc.id, **data})
+        return sessions
+
+    def is_context_stale(self, session: Dict[str, Any]) -> bool:
+        """Check whether the cached monthly summary needs to be rebuilt."""
+        built_at = session.get("context_built_at")
+        if not built_at or not session.get("context_summary"):
+            return True
+        try:
+            age = (datetime.now() - datetime.fromisoformat(built_at)).total_seconds()
+        except ValueError:
+            return True
+        return age > CONTEXT_TTL_SECONDS
+
+    def update_context(self, session_id: str, summary: Dict[str, Any]) -> None:
+        """Replace the cached monthly summary context."""
+        self._sessions_ref().document(session_id).update({
+            "context_summary": summary,
+            "context_built_at": datetime.now().isoformat()
+        })
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get messages in chronological order, optionally only the most recent `limit`."""
+        messages_ref = self._messages_ref(session_id)
+        if limit:
+            docs = list(messages_ref.order_by("seq", direction="DESCENDING").limit(limit).stream())
+            docs.reverse()
+        else:
+            docs = messages_ref.order_by("seq").stream()
+        return [doc.to_dict() for doc in docs]
+
+    def get_unsummarized_messages(self, session: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Get messages not yet folded into the rolling summary, in chronological order."""
+        docs = self._messages_ref(session["id"]).where("seq", ">", session.get("summarized_through", -1)).order_by("seq").stream()
+        return [doc.to_dict() for doc in docs]
+
+    def append_turn(self, session: Dict[str, Any], user_message: str, assistant_message: str, tokens_used: int) -> int:
+        """
+        Store a user/assistant exchange and bump the session counters in one
+        transaction, numbering the messages from the stored message count.
+
+        Returns:
+            The session's new message count; the exchange's seqs are the two before it
+
+        Raises:
+            KeyError: If the session was deleted
+        """
+        return _append_in_transaction(
+            self.db.transaction(), self._sessions_ref().document(session["id"]), self._messages_ref(session["id"]),
+            [("user", user_message), ("assistant", assistant_message)], tokens_used
+        )
+
+    def update_rolling_summary(self, session_id: str, rolling_summary: str, summarized_through: int,
+                               expected_through: int) -> bool:
+        """
+        Store a new rolling summary covering all messages up to `summarized_through`,
+        unless another fold has moved the session on from `expected_through` since
+        the summary was built.
+
+        Returns:
+            True if the summary was stored
+        """
+        return _update_summary_in_transaction(
+            self.db.transaction(), self._sessions_ref().document(session_id),
+            rolling_summary, summarized_through, expected_through
+        )
+
+    def delete_session(self, session_id: str) -> None:
+        """Delete a session and all of its messages."""
+        messages_ref = self._messages_ref(session_id)
+        while True:
+            docs = list(messages_ref.limit(400).stream())
+            if not docs:
+                break
+            batch = self.db.batch()
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+        self._sessions_ref().document(session_id).delete()
+
+
+def messages_to_fold(unsummarized: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Pick the messages that should be folded into the rolling summary.
+
+    Messages are folded in batches so the summarization call is amortized over
+    several turns; the most recent CHAT_HISTORY_WINDOW messages are always kept verbatim.
+    """
+    aged_out = len(unsummarized) - CHAT_HISTORY_WINDOW
+    if aged_out < SUMMARY_BATCH_SIZE:
+        return []
+    return unsummarized[:aged_out]
@@ -9,6 +9,13 @@ from collections import defaultdict
 import statistics
 import calendar
 
+from exercise_catalog import get_catalog
+from rollups import read_daily_totals
+from profiling import traced
+
+# Used for exercises missing from the bundled catalog
+FALLBACK_COMPOUND_NAMES = ['Deadlift', 'Squat', 'Bench Press']
+
 
 class FitnessDataAnalyzer:
     """Processes fitness data from Firestore and builds rolling summaries."""
@@ -41,6 +48,11 @@ class FitnessDataAnalyzer:
         docs = collection_ref.where("date", ">=", start_date).where("date", "<=", end_date).stream()
         return [{"id": doc.id, **doc.to_dict()} for doc in docs]
 
+    def _fetch_daily_nutrition(self, start_date: str, end_date: str) -> List[Dict]:
+        """Fetch per-date nutrition totals within date range."""
+        return read_daily_totals(self.db, self.user_id, start_date, end_date)
+
+    @traced("analyzer.build_training_summary")
     def build_training_summary(self, year: int, month: int) -> Dict[str, Any]:
         """Build training metrics summary for a specific month."""
         start_date, end_date = self._get_month_date_range(year, month)
@@ -60,6 +72,7 @@ class FitnessDataAnalyzer:
         total_sets = 0
         total_reps = 0
         compound_movements = {}
+        catalog = get_catalog()
 
         for workout in workouts:
             exercises = workout.get('exercises', [])
@@ -68,9 +81,15 @@ class FitnessDataAnalyzer:
                 total_sets += len(sets)
                 total_reps += sum(s.get('reps', 0) for s in sets)
 
-                # Track compound lifts
+                # Track compound lifts, grouping aliases under the catalog name
                 ex_name = exercise.get('exercise_name', '')
-                if any(compound in ex_name for compound in ['Deadlift', 'Squat', 'Bench Press']):
+                catalog_entry = catalog.lookup(ex_name)
+                if catalog_entry:
+                    is_compound = catalog_entry['mechanics'] == 'compound'
+                    ex_name = catalog_entry['name']
+                else:
+                    is_compound = any(compound in ex_name for compound in FALLBACK_COMPOUND_NAMES)
+                if is_compound:
                     if ex_name not in compound_movements:
                         compound_movements[ex_name] = []
 
@@ -115,19 +134,21 @@ class FitnessDataAnalyzer:
             "compound_lifts": compound_movements
         }
 
+    @traced("analyzer.build_nutrition_summary")
     def build_nutrition_summary(self, year: int, month: int) -> Dict[str, Any]:
         """Build nutrition metrics summary for a specific month."""
         start_date, end_date = self._get_month_date_range(year, month)
         month_name = calendar.month_name[month]
-        macros = self._fetch_collection_data('macros', start_date, end_date)
+        # One rollup per day, summing every meal logged that date
+        days = self._fetch_daily_nutrition(start_date, end_date)
 
-        if not macros:
+        if not days:
             return {"error": "No nutrition data available"}
 
-        calories = [m.get('total_calories', 0) for m in macros if m.get('total_calories')]
-        protein = [m.get('total_protein', 0) for m in macros if m.get('total_protein')]
-        carbs = [m.get('total_carbs', 0) for m in macros if m.get('total_carbs')]
-        fats = [m.get('total_fats', 0) for m in macros if m.get('total_fats')]
+        calories = [d.get('total_calories', 0) for d in days if d.get('total_calories')]
+        protein = [d.get('total_protein', 0) for d in days if d.get('total_protein')]
+        carbs = [d.get('total_carbs', 0) for d in days if d.get('total_carbs')]
+        fats = [d.get('total_fats', 0) for d in days if d.get('total_fats')]
 
         if not calories:
             return {"error": "No nutrition data available"}
@@ -137,7 +158,7 @@ class FitnessDataAnalyzer:
 
         return {
             "time_window": f"{month_name} {year}",
-            "days_logged": len(macros),
+            "days_logged": len(days),
             "avg_calories": round(statistics.mean(calories)),
             "calories_range": [min(calories), max(calories)],
             "avg_protein": round(statistics.mean(protein)) if protein else 0,
@@ -147,6 +168,7 @@ class FitnessDataAnalyzer:
             "protein_ratio": round((statistics.mean(protein) * 4 / statistics.mean(calories)) * 100, 1) if protein and calories else 0
         }
 
+    @traced("analyzer.build_recovery_summary")
     def build_recovery_summary(self, year: int, month: int) -> Dict[str, Any]:
         """Build recovery metrics summary for a specific month."""
         start_date, end_date = self._get_month_date_range(year, month)
@@ -203,6 +225,7 @@ class FitnessDataAnalyzer:
             "avg_body_aches": round(statistics.mean(body_aches), 1) if body_aches else 0
         }
 
+    @traced("analyzer.build_lifestyle_summary")
     def build_lifestyle_summary(self, year: int, month: int) -> Dict[str, Any]:
         """Build lifestyle metrics summary for a specific month."""
         start_date, end_date = self._get_month_date_range(year, month)
@@ -224,6 +247,7 @@ class FitnessDataAnalyzer:
             "active_days": sum(1 for s in steps if s > 5000)
         }
 
+    @traced("analyzer.build_complete_summary")
     def build_complete_summary(self, year: int, month: int) -> Dict[str, Any]:
         """Build complete summary for AI analysis for a specific month."""
         month_name = calendar.month_name[month]
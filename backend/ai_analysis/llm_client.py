@@ -0,0 +1,95 @@
+"""
+LLM Client Registry
+Application-scoped OpenAI clients that share one keep-alive connection pool,
+so requests reuse open TLS connections instead of creating a client per call.
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+
+import httpx
+from openai import OpenAI
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class LLMClientRegistry:
+    """Creates one pooled OpenAI client per API key and hands it out to every request."""
+
+    def __init__(self):
+        self._clients: Dict[str, OpenAI] = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key: Optional[str] = None) -> Optional[OpenAI]:
+        """
+        Get the shared client for an API key.
+
+        Args:
+            api_key: OpenAI API key (default: OPENAI_API_KEY env var)
+
+        Returns:
+            Shared OpenAI client, or None if no API key is configured
+        """
+        if os.getenv("LLM_BACKEND", "openai").lower() == "stub":
+            # Offline benchmarks and local runs: canned completions, no API key needed
+            api_key = "stub"
+        else:
+            api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            return None
+
+        client = self._clients.get(api_key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(api_key)
+                if client is None:
+                    client = self._create_client(api_key)
+                    self._clients[api_key] = client
+        return client
+
+    def _create_client(self, api_key: str) -> OpenAI:
+        if api_key == "stub":
+            from .stub_client import StubCompletionClient
+            return StubCompletionClient()
+        timeout = httpx.Timeout(
+            _env_float("OPENAI_TIMEOUT_SECONDS", 60.0),
+            connect=_env_float("OPENAI_CONNECT_TIMEOUT_SECONDS", 5.0)
+        )
+        http_client = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=_env_int("OPENAI_MAX_CONNECTIONS", 100),
+                max_keepalive_connections=_env_int("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 20),
+                keepalive_expiry=_env_float("OPENAI_KEEPALIVE_EXPIRY_SECONDS", 120.0)
+            )
+        )
+        return OpenAI(
+            api_key=api_key,
+            http_client=http_client,
+            timeout=timeout,
+            max_retries=_env_int("OPENAI_MAX_RETRIES", 2)
+        )
+
+    def close(self) -> None:
+        """Close all clients and their connection pools."""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+llm_clients = LLMClientRegistry()
+
+
+def get_llm_client(api_key: Optional[str] = None) -> Optional[OpenAI]:
+    """Get the application-wide shared OpenAI client."""
+    return llm_clients.get(api_key)
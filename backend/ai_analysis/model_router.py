@@ -0,0 +1,162 @@
+"""
+Model Router
+Picks the model for each kind of coach call from configuration, tracks rolling
+latency and error rate per model, and fails over to a secondary model when the
+primary times out, errors or is currently unhealthy.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+# Errors worth retrying on another model; anything else (bad request, auth) would fail there too
+FAILOVER_ERRORS = (APITimeoutError, APIConnectionError, InternalServerError, RateLimitError)
+
+# call type -> (primary model, fallback model, timeout seconds)
+DEFAULT_ROUTES = {
+    "analysis": ("gpt-4o", "gpt-4o-mini", 60.0),
+    "chat": ("gpt-4o-mini", "gpt-4o", 20.0),
+    "summary": ("gpt-4o-mini", "gpt-4o", 20.0),
+}
+
+# Only the last few minutes of calls count towards a model's health
+STATS_WINDOW_SECONDS = 5 * 60
+
+# A model is skipped as primary once it has this many recent calls and
+# its error rate or p95 latency exceeds the thresholds below
+MIN_SAMPLES = 5
+MAX_ERROR_RATE = 0.5
+MAX_P95_TIMEOUT_FRACTION = 0.9
+
+
+class ModelRoute:
+    """Primary/fallback models and timeout for one call type."""
+
+    def __init__(self, primary: str, fallback: Optional[str], timeout: float):
+        self.primary = primary
+        self.fallback = fallback if fallback and fallback != primary else None
+        self.timeout = timeout
+
+
+class ModelStats:
+    """Rolling latency and error samples for one model."""
+
+    def __init__(self, max_samples: int = 500):
+        self.samples: deque = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            self.samples.append((time.monotonic(), latency, ok))
+
+    def _recent(self) -> List[tuple]:
+        # Copy under the lock: threadpool threads append while requests read
+        with self._lock:
+            samples = list(self.samples)
+        cutoff = time.monotonic() - STATS_WINDOW_SECONDS
+        return [s for s in samples if s[0] >= cutoff]
+
+    def snapshot(self) -> Dict:
+        recent = self._recent()
+        latencies = sorted(s[1] for s in recent if s[2])
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, math.ceil(p * len(latencies)) - 1)], 3)
+
+        return {
+            "calls": len(recent),
+            "errors": sum(1 for s in recent if not s[2]),
+            "error_rate": round(sum(1 for s in recent if not s[2]) / len(recent), 3) if recent else 0.0,
+            "p50_seconds": percentile(0.5),
+            "p95_seconds": percentile(0.95)
+        }
+
+
+class ModelRouter:
+    """Chooses models per call type and records how they perform."""
+
+    def __init__(self, routes: Dict[str, ModelRoute]):
+        self.routes = routes
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """
+        Build routes from LLM_MODEL_<TYPE>, LLM_FALLBACK_MODEL_<TYPE> and
+        LLM_TIMEOUT_<TYPE>_SECONDS environment variables (e.g. LLM_MODEL_CHAT).
+        """
+        routes = {}
+        for call_type, (primary, fallback, timeout) in DEFAULT_ROUTES.items():
+            key = call_type.upper()
+            routes[call_type] = ModelRoute(
+                primary=os.getenv(f"LLM_MODEL_{key}", primary),
+                fallback=os.getenv(f"LLM_FALLBACK_MODEL_{key}", fallback),
+                timeout=float(os.getenv(f"LLM_TIMEOUT_{key}_SECONDS", timeout))
+            )
+        return cls(routes)
+
+    def _model_stats(self, model: str) -> ModelStats:
+        with self._lock:
+            if model not in self._stats:
+                self._stats[model] = ModelStats()
+            return self._stats[model]
+
+    def is_healthy(self, model: str, timeout: float) -> bool:
+        """Check a model's recent error rate and p95 latency against the thresholds."""
+        snapshot = self._model_stats(model).snapshot()
+        if snapshot["calls"] < MIN_SAMPLES:
+            return True
+        if snapshot["error_rate"] > MAX_ERROR_RATE:
+            return False
+        p95 = snapshot["p95_seconds"]
+        return p95 is None or p95 < timeout * MAX_P95_TIMEOUT_FRACTION
+
+    def candidates(self, call_type: str, model_override: Optional[str] = None) -> List[str]:
+        """
+        Models to try for a call, in order.
+
+        Args:
+            call_type: One of DEFAULT_ROUTES' keys
+            model_override: Force this model as primary (fallback still applies)
+
+        Returns:
+            Primary then fallback, swapped if the primary is currently unhealthy
+        """
+        route = self.routes[call_type]
+        primary = model_override or route.primary
+        fallback = route.fallback if route.fallback != primary else None
+        if not fallback:
+            return [primary]
+        if not self.is_healthy(primary, route.timeout) and self.is_healthy(fallback, route.timeout):
+            return [fallback, primary]
+        return [primary, fallback]
+
+    def timeout(self, call_type: str) -> float:
+        return self.routes[call_type].timeout
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        """Record the outcome of a call."""
+        self._model_stats(model).record(latency, ok)
+
+    def stats(self) -> Dict:
+        """Configured routes and rolling per-model latency/error metrics."""
+        with self._lock:
+            models = list(self._stats.items())
+        return {
+            "routes": {
+                call_type: {"primary": r.primary, "fallback": r.fallback, "timeout_seconds": r.timeout}
+                for call_type, r in self.routes.items()
+            },
+            "models": {model: stats.snapshot() for model, stats in models}
+        }
+
+
+model_router = ModelRouter.from_env()
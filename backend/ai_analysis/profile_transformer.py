@@ -3,7 +3,19 @@ User Profile Transformer
 Converts UserProfile data from Firestore into AI-friendly format.
 """
 
-from typing import Dict, Any, Optional, List
+import hashlib
+import json
+import logging
+from typing import Dict, Any, Optional, List, Tuple
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Profiles change rarely; the TTL bounds staleness on workers that did not handle the write
+PROFILE_CACHE_TTL_SECONDS = 10 * 60
+
+_profile_cache = TTLCache("user_profile", max_size=4096, ttl_seconds=PROFILE_CACHE_TTL_SECONDS)
 
 
 def safe_str(value):
@@ -206,27 +218,61 @@ def transform_user_profile(profile_data: Optional[Dict[str, Any]]) -> Dict[str,
     return profile
 
 
-def get_user_profile_for_ai(db, user_id: str) -> Dict[str, Any]:
+def profile_hash(profile: Dict[str, Any]) -> str:
+    """Stable short hash of a transformed profile, used to key prompt caching."""
+    canonical = json.dumps(profile, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def get_cached_user_profile(db, user_id: str) -> Tuple[Dict[str, Any], str]:
     """
-    Fetch user profile from Firestore and transform it for AI analysis.
+    Fetch and transform a user's profile, served from the per-user cache when possible.
 
     Args:
         db: Firestore database client
         user_id: User ID
 
     Returns:
-        Transformed user profile ready for AI prompts
+        Tuple of (transformed profile, profile hash)
     """
+    cached = _profile_cache.get(user_id)
+    if cached is not None:
+        return cached
+
     try:
         doc_ref = db.collection("users").document(user_id).collection("user_profile").document("profile")
         doc = doc_ref.get()
 
         if doc.exists:
-            profile_data = doc.to_dict()
-            return transform_user_profile(profile_data)
+            profile = transform_user_profile(doc.to_dict())
         else:
             # Return default profile if user hasn't filled it out yet
-            return transform_user_profile(None)
+            profile = transform_user_profile(None)
     except Exception as e:
-        print(f"Error fetching user profile: {e}")
-        return transform_user_profile(None)
+        # Don't cache the fallback so the next request retries Firestore
+        logger.error("Error fetching user profile: %s", e)
+        profile = transform_user_profile(None)
+        return profile, profile_hash(profile)
+
+    entry = (profile, profile_hash(profile))
+    _profile_cache.set(user_id, entry)
+    return entry
+
+
+def get_user_profile_for_ai(db, user_id: str) -> Dict[str, Any]:
+    """
+    Fetch user profile from Firestore and transform it for AI analysis.
+
+    Args:
+        db: Firestore database client
+        user_id: User ID
+
+    Returns:
+        Transformed user profile ready for AI prompts
+    """
+    return get_cached_user_profile(db, user_id)[0]
+
+
+def invalidate_user_profile(user_id: str) -> None:
+    """Drop a user's cached profile; call after the profile is written."""
+    _profile_cache.invalidate(user_id)
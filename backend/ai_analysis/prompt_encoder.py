@@ -0,0 +1,147 @@
+"""
+Prompt Encoder
+Compact, token-efficient text encoding of monthly summaries and user profiles
+for AI prompts. Replaces indented JSON: one `key=value` line per section,
+rounded numbers, and downsampled compound lift series.
+"""
+
+from typing import Dict, Any, List, Optional
+
+# Maximum points kept per compound lift series (first, last and best are always kept)
+MAX_LIFT_POINTS = 6
+
+SUMMARY_SECTIONS = ["training", "nutrition", "recovery", "lifestyle"]
+
+# Fields repeated in every section or already shown in the header
+_SKIPPED_FIELDS = {"time_window", "start_date", "end_date", "compound_lifts"}
+
+# Two-element lists under keys with this suffix are [min, max] and rendered as `min-max`
+_RANGE_SUFFIX = "_range"
+
+
+def _fmt_number(value: float) -> str:
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, float):
+        value = round(value, 1)
+        if value == int(value):
+            return str(int(value))
+    return str(value)
+
+
+def _is_range(key: Optional[str], value: list) -> bool:
+    return (bool(key) and key.endswith(_RANGE_SUFFIX) and len(value) == 2
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value))
+
+
+def _fmt_value(value: Any, key: Optional[str] = None) -> str:
+    if isinstance(value, (int, float)):
+        return _fmt_number(value)
+    if isinstance(value, list):
+        if _is_range(key, value):
+            low, high = (_fmt_number(v) for v in value)
+            # A dash between negative numbers would read as a minus sign
+            return f"{low}-{high}" if min(value) >= 0 else f"{low} to {high}"
+        return ",".join(_fmt_value(v) for v in value)
+    if isinstance(value, dict):
+        return ", ".join(f"{k}={_fmt_value(v, k)}" for k, v in value.items())
+    if value is None:
+        return "n/a"
+    return str(value)
+
+
+def downsample_series(points: List[Dict[str, Any]], max_points: int = MAX_LIFT_POINTS) -> List[Dict[str, Any]]:
+    """
+    Reduce a chronological series to at most `max_points` points.
+
+    Always keeps the first, last and heaviest points and fills the rest evenly.
+    """
+    if len(points) <= max_points:
+        return points
+
+    best = max(range(len(points)), key=lambda i: points[i].get("max_weight") or 0)
+    keep = {0, len(points) - 1, best}
+    step = (len(points) - 1) / (max_points - 1)
+    i = 0
+    while len(keep) < max_points and i < max_points:
+        keep.add(round(i * step))
+        i += 1
+    return [points[i] for i in sorted(keep)]
+
+
+def _encode_lifts(compound_lifts: Dict[str, List[Dict[str, Any]]]) -> List[str]:
+    lines = []
+    for name, sessions in compound_lifts.items():
+        if not sessions:
+            continue
+        sessions = sorted(sessions, key=lambda s: s.get("date") or "")
+        weights = [s.get("max_weight") or 0 for s in sessions]
+        series = " ".join(
+            f"{(s.get('date') or '')[5:]}:{_fmt_number(s.get('max_weight') or 0)}x{s.get('total_reps', 0)}"
+            for s in downsample_series(sessions)
+        )
+        lines.append(
+            f"  {name}: n={len(sessions)} best={_fmt_number(max(weights))} "
+            f"change={_fmt_number(weights[-1] - weights[0])} | {series}"
+        )
+    return lines
+
+
+def encode_summary(summary: Dict[str, Any]) -> str:
+    """
+    Encode a `build_complete_summary` result for a prompt.
+
+    Args:
+        summary: Complete monthly summary
+
+    Returns:
+        Compact multi-line text
+    """
+    lines = [f"period: {summary.get('analysis_period', '')}"]
+
+    for section in SUMMARY_SECTIONS:
+        data = summary.get(section)
+        if not data:
+            continue
+        if "error" in data:
+            lines.append(f"[{section}] {data['error']}")
+            continue
+
+        fields = " ".join(
+            f"{key}={_fmt_value(value, key)}"
+            for key, value in data.items()
+            if key not in _SKIPPED_FIELDS and not isinstance(value, dict)
+        )
+        lines.append(f"[{section}] {fields}")
+
+        for key, value in data.items():
+            if isinstance(value, dict) and key not in _SKIPPED_FIELDS and value:
+                lines.append(f"  {key}: {_fmt_value(value)}")
+
+        if data.get("compound_lifts"):
+            lines.append("  compound_lifts (MM-DD:max_weight x reps):")
+            lines.extend(_encode_lifts(data["compound_lifts"]))
+
+    return "\n".join(lines)
+
+
+def encode_profile(profile: Dict[str, Any]) -> str:
+    """
+    Encode a `transform_user_profile` result for a prompt.
+
+    Args:
+        profile: Transformed user profile
+
+    Returns:
+        One `key: value` line per field
+    """
+    lines = []
+    for key, value in profile.items():
+        if isinstance(value, list):
+            value = "; ".join(str(v) for v in value)
+        elif isinstance(value, dict):
+            value = "; ".join(f"{k}={_fmt_value(v, k)}" for k, v in value.items())
+        else:
+            value = _fmt_value(value, key)
+        lines.append(f"{key}: {value}")
+    return "\n".join(lines)
@@ -0,0 +1,276 @@
+"""
+LLM Rate Limiter
+Token-bucket limits on completion requests and estimated tokens, shared by all
+coach calls in the process. Waiting callers are served round-robin per user from
+a bounded queue, so one user's burst cannot starve everyone else.
+
+Coach calls run in the shared threadpool, and both in-flight calls and queued
+callers hold a thread while they wait. Concurrency plus queue length is capped
+well below the threadpool size so an AI burst cannot starve the other sync
+dependencies (including authentication) of threads.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Threads the limiter may hold (calls in flight plus waiting callers); half of
+# the 40 threads in the default anyio pool that runs sync endpoints and dependencies
+MAX_LIMITER_THREADS = 20
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a completion call cannot be scheduled within the limiter's bounds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int) -> int:
+    """Rough token estimate for a completion call (~4 characters per token plus the reply budget)."""
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return prompt_chars // 4 + 4 * len(messages) + max_tokens
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def available(self, now: float) -> float:
+        """Tokens currently in the bucket."""
+        self._refill(now)
+        return self.tokens
+
+    def consume(self, amount: float, now: float) -> None:
+        """Take tokens; the balance may go negative when correcting an underestimate."""
+        self._refill(now)
+        self.tokens -= amount
+
+
+class _Waiter:
+    __slots__ = ("user_id", "tokens", "enqueued_at")
+
+    def __init__(self, user_id: str, tokens: int):
+        self.user_id = user_id
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class _Grant:
+    """Handle for an admitted call; set `actual_tokens` to reconcile the estimate."""
+
+    __slots__ = ("estimated_tokens", "actual_tokens")
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+
+
+class LLMRateLimiter:
+    """Global request/token limiter with per-user fair queuing."""
+
+    def __init__(self, requests_per_minute: float = 500, tokens_per_minute: float = 90000,
+                 max_concurrent: int = 12, max_queue: int = 8, max_queue_per_user: int = 2,
+                 max_wait_seconds: float = 20.0, max_threads: int = MAX_LIMITER_THREADS):
+        """
+        Initialize limiter.
+
+        Args:
+            requests_per_minute: Completion calls allowed per minute
+            tokens_per_minute: Estimated tokens (prompt + reply budget) allowed per minute
+            max_concurrent: Maximum completion calls in flight at once
+            max_queue: Maximum callers waiting across all users
+            max_queue_per_user: Maximum callers waiting for a single user
+            max_wait_seconds: Longest a caller waits before being rejected
+            max_threads: Cap on max_concurrent + max_queue; the queue is shortened
+                (then concurrency lowered) to fit
+        """
+        if max_concurrent + max_queue > max_threads:
+            # Every caller passes through the queue, so it needs at least one place
+            capped_concurrent = max(1, min(max_concurrent, max_threads - 1))
+            capped_queue = max(1, min(max_queue, max_threads - capped_concurrent))
+            logger.warning("LLM limiter would hold up to %d threads; capping to %d in flight and %d queued",
+                           max_concurrent + max_queue, capped_concurrent, capped_queue)
+            max_concurrent, max_queue = capped_concurrent, capped_queue
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.max_wait_seconds = max_wait_seconds
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, deque] = {}
+        self._rotation: deque = deque()
+        self._queue_depth = 0
+        self._in_flight = 0
+
+        self._granted = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        self._wait_times: deque = deque(maxlen=1000)
+
+    @classmethod
+    def from_env(cls) -> "LLMRateLimiter":
+        """Build a limiter configured from LLM_* environment variables."""
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", 500)),
+            tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", 90000)),
+            max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", 12)),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", 8)),
+            max_queue_per_user=int(os.getenv("LLM_MAX_QUEUE_PER_USER", 2)),
+            max_wait_seconds=float(os.getenv("LLM_MAX_WAIT_SECONDS", 20)),
+            max_threads=int(os.getenv("LLM_MAX_THREADS", MAX_LIMITER_THREADS))
+        )
+
+    def _estimated_retry_after(self) -> float:
+        # Time for the current queue to drain at the request rate
+        return max(1.0, (self._queue_depth + 1) / self.request_bucket.rate)
+
+    def _is_next(self, waiter: _Waiter) -> bool:
+        return bool(self._rotation) and self._queues[self._rotation[0]][0] is waiter
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues[waiter.user_id]
+        queue.remove(waiter)
+        self._queue_depth -= 1
+        if not queue:
+            del self._queues[waiter.user_id]
+            self._rotation.remove(waiter.user_id)
+
+    def _admit(self, waiter: _Waiter, now: float) -> None:
+        self._queues[waiter.user_id].popleft()
+        self._queue_depth -= 1
+        # Served users go to the back of the rotation so others get the next slot
+        self._rotation.popleft()
+        if self._queues[waiter.user_id]:
+            self._rotation.append(waiter.user_id)
+        else:
+            del self._queues[waiter.user_id]
+
+        self.request_bucket.consume(1, now)
+        self.token_bucket.consume(waiter.tokens, now)
+        self._in_flight += 1
+        self._granted += 1
+        self._wait_times.append(now - waiter.enqueued_at)
+
+    def _wait_for_slot(self, user_id: str, estimated_tokens: int) -> None:
+        with self._cond:
+            if self._queue_depth >= self.max_queue or len(self._queues.get(user_id, ())) >= self.max_queue_per_user:
+                self._rejected_queue_full += 1
+                raise RateLimitExceeded("AI coach is busy, please retry shortly", self._estimated_retry_after())
+
+            waiter = _Waiter(user_id, estimated_tokens)
+            if user_id not in self._queues:
+                self._queues[user_id] = deque()
+                self._rotation.append(user_id)
+            self._queues[user_id].append(waiter)
+            self._queue_depth += 1
+            deadline = waiter.enqueued_at + self.max_wait_seconds
+
+            while True:
+                now = time.monotonic()
+                wait = None
+                if self._is_next(waiter) and self._in_flight < self.max_concurrent:
+                    wait = max(self.request_bucket.time_until(1, now),
+                               self.token_bucket.time_until(waiter.tokens, now))
+                    if wait <= 0:
+                        self._admit(waiter, now)
+                        self._cond.notify_all()
+                        return
+
+                remaining = deadline - now
+                if remaining <= 0 or (wait is not None and wait > remaining):
+                    self._remove(waiter)
+                    self._rejected_timeout += 1
+                    self._cond.notify_all()
+                    raise RateLimitExceeded("AI coach is busy, please retry shortly",
+                                            wait if wait is not None else self._estimated_retry_after())
+
+                self._cond.wait(timeout=min(wait, remaining) if wait is not None else remaining)
+
+    def _release(self, grant: _Grant) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if grant.actual_tokens is not None:
+                # Correct the bucket for the difference between estimated and actual usage
+                self.token_bucket.consume(grant.actual_tokens - grant.estimated_tokens, time.monotonic())
+            self._cond.notify_all()
+
+    @contextmanager
+    def acquire(self, user_id: Optional[str], estimated_tokens: int):
+        """
+        Block until a completion call may run, then hold a concurrency slot for its duration.
+
+        Args:
+            user_id: User the call is made for (fairness key)
+            estimated_tokens: Estimated prompt + completion tokens
+
+        Raises:
+            RateLimitExceeded: If the wait queue is full or the call cannot start within max_wait_seconds
+        """
+        self._wait_for_slot(user_id or "anonymous", estimated_tokens)
+        grant = _Grant(estimated_tokens)
+        try:
+            yield grant
+        finally:
+            self._release(grant)
+
+    def stats(self) -> Dict:
+        """Queue depth, concurrency and wait-time metrics."""
+        with self._cond:
+            waits = sorted(self._wait_times)
+            now = time.monotonic()
+
+            def percentile(p: float) -> float:
+                if not waits:
+                    return 0.0
+                return round(waits[min(len(waits) - 1, math.ceil(p * len(waits)) - 1)], 3)
+
+            return {
+                "queue_depth": self._queue_depth,
+                "users_waiting": len(self._queues),
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "max_concurrent": self.max_concurrent,
+                "available_requests": round(self.request_bucket.available(now), 1),
+                "available_tokens": round(self.token_bucket.available(now)),
+                "granted": self._granted,
+                "rejected_queue_full": self._rejected_queue_full,
+                "rejected_timeout": self._rejected_timeout,
+                "wait_seconds": {
+                    "samples": len(waits),
+                    "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    "p50": percentile(0.5),
+                    "p95": percentile(0.95),
+                    "max": round(waits[-1], 3) if waits else 0.0
+                }
+            }
+
+
+llm_limiter = LLMRateLimiter.from_env()
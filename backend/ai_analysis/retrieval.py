@@ -0,0 +1,277 @@
+"""
+Notes Retrieval Index
+Per-user in-memory BM25 index over free-text log fields (sleep notes, body
+feelings, stress descriptions, workout notes, activity descriptions) and past
+AI analyses. Used to ground chat replies in the entries relevant to each message.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+# Collection -> fields holding free text
+NOTE_SOURCES = {
+    "sleep": ["notes"],
+    "body_feelings": ["description"],
+    "stress": ["description"],
+    "workout_sessions": ["notes", "exercises"],
+    "physical_activities": ["activity_type", "description"],
+    "ai_analyses": ["analysis"],
+}
+
+# Maximum number of user indexes kept in memory
+MAX_INDEXED_USERS = 256
+
+# Pick up writes made by other workers at most this often
+INCREMENTAL_SYNC_SECONDS = 60
+
+# Rebuild from scratch at most this often (catches deletes made by other workers)
+FULL_REBUILD_SECONDS = 60 * 60
+
+# Long texts (analyses) are split into chunks of about this many characters
+CHUNK_CHARS = 500
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "did", "do", "does", "for", "from", "had", "has",
+    "have", "how", "i", "if", "in", "into", "is", "it", "its", "me", "my", "of", "on", "or", "so", "that",
+    "the", "their", "then", "there", "this", "to", "was", "were", "what", "when", "where", "which", "who",
+    "why", "will", "with", "you", "your"
+}
+
+
+def _stem(token: str) -> str:
+    """Very light suffix stripping so 'hurting', 'hurts' and 'hurt' match."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    for suffix in ("ing", "ed"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            token = token[:-len(suffix)]
+            if len(token) > 2 and token[-1] == token[-2] and token[-1] not in "aeiouls":
+                token = token[:-1]
+            return token
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords and stem."""
+    return [_stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _chunk(text: str) -> List[str]:
+    if len(text) <= CHUNK_CHARS:
+        return [text]
+    chunks, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) > CHUNK_CHARS:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{paragraph}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def extract_snippets(collection: str, data: Dict[str, Any]) -> List[str]:
+    """Pull the indexable free-text snippets out of a document."""
+    texts = []
+    for field in NOTE_SOURCES.get(collection, []):
+        value = data.get(field)
+        if field == "exercises" and isinstance(value, list):
+            for exercise in value:
+                if isinstance(exercise, dict) and exercise.get("notes"):
+                    texts.append(f"{exercise.get('exercise_name', 'Exercise')}: {exercise['notes']}")
+        elif isinstance(value, str) and value.strip():
+            texts.append(value.strip())
+
+    if collection == "ai_analyses":
+        return [chunk for text in texts for chunk in _chunk(text)]
+    if collection == "physical_activities" and texts:
+        return [" - ".join(texts)]
+    return texts
+
+
+def _entry_date(collection: str, data: Dict[str, Any]) -> str:
+    if collection == "ai_analyses" and data.get("year") and data.get("month"):
+        return f"{data['year']}-{int(data['month']):02d}"
+    return str(data.get("date", ""))
+
+
+class UserNotesIndex:
+    """BM25 index over one user's snippets. Keys are `collection/doc_id#chunk`."""
+
+    def __init__(self):
+        self.snippets: Dict[str, Dict[str, str]] = {}
+        self.doc_keys: Dict[Tuple[str, str], List[str]] = {}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.lengths: Dict[str, int] = {}
+        self.key_terms: Dict[str, set] = {}
+        self.total_length = 0
+        self.lock = threading.Lock()
+        self.built_at = 0.0
+        self.synced_at = 0.0
+        self.watermark = ""
+
+    def _remove(self, collection: str, doc_id: str) -> None:
+        for key in self.doc_keys.pop((collection, doc_id), []):
+            self.snippets.pop(key, None)
+            self.total_length -= self.lengths.pop(key, 0)
+            for term in self.key_terms.pop(key, ()):
+                postings = self.postings.get(term)
+                if postings:
+                    postings.pop(key, None)
+                    if not postings:
+                        del self.postings[term]
+
+    def upsert(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        """Add or replace all snippets of a document."""
+        with self.lock:
+            self._remove(collection, doc_id)
+
+            date = _entry_date(collection, data)
+            keys = []
+            for i, text in enumerate(extract_snippets(collection, data)):
+                key = f"{collection}/{doc_id}#{i}"
+                terms = tokenize(text)
+                if not terms:
+                    continue
+                self.snippets[key] = {"collection": collection, "date": date, "text": text}
+                self.lengths[key] = len(terms)
+                self.key_terms[key] = set(terms)
+                self.total_length += len(terms)
+                for term in terms:
+                    self.postings[term][key] = self.postings[term].get(key, 0) + 1
+                keys.append(key)
+            if keys:
+                self.doc_keys[(collection, doc_id)] = keys
+
+    def remove(self, collection: str, doc_id: str) -> None:
+        """Remove all snippets of a document."""
+        with self.lock:
+            self._remove(collection, doc_id)
+
+    def search(self, query: str, k: int = 5, token_budget: int = 400) -> List[Dict[str, Any]]:
+        """
+        Rank snippets against a query with BM25.
+
+        Args:
+            query: Free-text query (the user's chat message)
+            k: Maximum number of snippets
+            token_budget: Approximate token budget for the returned snippets
+
+        Returns:
+            Matching snippets in chronological order, each with collection, date, text and score
+        """
+        with self.lock:
+            n = len(self.snippets)
+            if not n:
+                return []
+            avg_length = self.total_length / n
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, tf in postings.items():
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[key] / avg_length)
+                    scores[key] += idf * tf * (BM25_K1 + 1) / norm
+
+            results, used = [], 0
+            for key, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                snippet = self.snippets[key]
+                cost = len(snippet["text"]) // 4 + 8
+                if used + cost > token_budget:
+                    continue
+                results.append({**snippet, "score": round(score, 3)})
+                used += cost
+                if len(results) >= k:
+                    break
+
+        return sorted(results, key=lambda r: r["date"])
+
+    def __len__(self) -> int:
+        return len(self.snippets)
+
+
+class NotesIndexRegistry:
+    """Keeps an LRU set of per-user indexes, built lazily and kept current by router writes."""
+
+    def __init__(self, max_users: int = MAX_INDEXED_USERS):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, UserNotesIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, db, user_id: str, index: UserNotesIndex, since: Optional[str] = None) -> None:
+        user_ref = db.collection("users").document(user_id)
+        newest = index.watermark
+        for collection, fields in NOTE_SOURCES.items():
+            collection_ref = user_ref.collection(collection).select(fields + ["date", "year", "month", "created_at", "updated_at"])
+            if since:
+                queries = [collection_ref.where("created_at", ">", since), collection_ref.where("updated_at", ">", since)]
+            else:
+                queries = [collection_ref]
+            for query in queries:
+                for doc in query.stream():
+                    data = doc.to_dict()
+                    index.upsert(collection, doc.id, data)
+                    newest = max(newest, data.get("updated_at") or "", data.get("created_at") or "")
+        index.watermark = newest
+
+    def get(self, db, user_id: str) -> UserNotesIndex:
+        """Get a user's index, building or refreshing it as needed."""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+
+        now = time.monotonic()
+        if index is None or now - index.built_at > FULL_REBUILD_SECONDS:
+            index = UserNotesIndex()
+            index.watermark = datetime.now().isoformat()
+            self._load(db, user_id, index)
+            index.built_at = index.synced_at = now
+            with self._lock:
+                self._indexes[user_id] = index
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+        elif now - index.synced_at > INCREMENTAL_SYNC_SECONDS:
+            self._load(db, user_id, index, since=index.watermark)
+            index.synced_at = now
+        return index
+
+    def search(self, db, user_id: str, query: str, k: int = 5, token_budget: int = 400) -> List[Dict[str, Any]]:
+        """Retrieve the top snippets for a query from the user's index."""
+        return self.get(db, user_id).search(query, k=k, token_budget=token_budget)
+
+    def on_write(self, user_id: str, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        """Apply a created/updated document to the user's index if it is loaded."""
+        index = self._indexes.get(user_id)
+        if index is not None and collection in NOTE_SOURCES:
+            index.upsert(collection, doc_id, data)
+
+    def on_delete(self, user_id: str, collection: str, doc_id: str) -> None:
+        """Remove a deleted document from the user's index if it is loaded."""
+        index = self._indexes.get(user_id)
+        if index is not None and collection in NOTE_SOURCES:
+            index.remove(collection, doc_id)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a user's index so it is rebuilt on next use."""
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+
+notes_index = NotesIndexRegistry()
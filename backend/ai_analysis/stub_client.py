@@ -0,0 +1,82 @@
+"""
+Stub Completion Client
+Offline stand-in for the OpenAI client (LLM_BACKEND=stub) used by benchmarks
+and local runs: returns canned replies with plausible token usage after a
+configurable delay, so FitnessAICoach runs end to end without network calls.
+"""
+
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+
+STUB_REPLY = ("Solid month overall. Training volume rose steadily and protein intake met your target on most days. "
+              "Sleep dipped mid-month alongside higher stress, so keep the deload week planned and aim for "
+              "consistent bedtimes. Next month: add one set to your main lifts and keep logging hydration.")
+
+
+class _Completions:
+    def __init__(self, client: "StubCompletionClient"):
+        self._client = client
+
+    def create(self, model: str, messages: List[Dict[str, Any]], max_tokens: int = 256, **kwargs) -> ChatCompletion:
+        self._client._wait()
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // 4 + 4 * len(messages)
+        completion_tokens = min(max_tokens, len(STUB_REPLY) // 4)
+        with self._client._lock:
+            self._client.calls += 1
+        return ChatCompletion(
+            id=f"stub-{uuid.uuid4().hex}",
+            object="chat.completion",
+            created=int(time.time()),
+            model=model,
+            choices=[Choice(
+                index=0,
+                finish_reason="stop",
+                message=ChatCompletionMessage(role="assistant", content=STUB_REPLY[:completion_tokens * 4])
+            )],
+            usage=CompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            )
+        )
+
+
+class _Chat:
+    def __init__(self, client: "StubCompletionClient"):
+        self.completions = _Completions(client)
+
+
+class StubCompletionClient:
+    """
+    Mimics the parts of `openai.OpenAI` the coach uses: chat.completions.create,
+    with_options and max_retries.
+
+    Args:
+        latency_ms: Simulated completion time (default: STUB_LLM_LATENCY_MS env var, or 0)
+    """
+
+    def __init__(self, latency_ms: float = None):
+        if latency_ms is None:
+            latency_ms = float(os.getenv("STUB_LLM_LATENCY_MS", "0"))
+        self.latency_ms = latency_ms
+        self.max_retries = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = _Chat(self)
+
+    def _wait(self) -> None:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+
+    def with_options(self, **kwargs) -> "StubCompletionClient":
+        return self
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,121 @@
+"""
+LLM Usage Ledger
+Append-only JSON Lines log of every coach completion call (user, endpoint,
+model, tokens, latency, cache hits, retries) with day/user/model aggregation.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEDGER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "var", "llm_usage.jsonl")
+
+GROUP_FIELDS = {"day", "user_id", "model", "endpoint", "call_type"}
+
+
+class UsageLedger:
+    """Appends usage records to a local file shared by all workers on the host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> int:
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # O_APPEND makes each single write land whole at the end, even across processes
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """Append one record. Failures are reported but never break the calling request."""
+        entry = {"ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"), **entry}
+        line = (json.dumps(entry, separators=(",", ":"), default=str) + "\n").encode()
+        try:
+            with self._lock:
+                os.write(self._open(), line)
+        except OSError as e:
+            logger.warning("Could not write LLM usage record: %s", e)
+
+    def read(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream records whose day falls within [start, end].
+
+        Args:
+            start: First day to include (YYYY-MM-DD)
+            end: Last day to include (YYYY-MM-DD)
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A partially written last line from a crashed worker
+                    continue
+                day = entry.get("ts", "")[:10]
+                if (start and day < start) or (end and day > end):
+                    continue
+                entry["day"] = day
+                yield entry
+
+    def aggregate(self, group_by: List[str], start: Optional[str] = None, end: Optional[str] = None,
+                  user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Sum usage per group.
+
+        Args:
+            group_by: Fields to group by (subset of GROUP_FIELDS)
+            start: First day to include (YYYY-MM-DD)
+            end: Last day to include (YYYY-MM-DD)
+            user_id: Only include this user's calls
+
+        Returns:
+            One row per group with call counts, token sums and latency stats
+        """
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        latencies: Dict[tuple, List[float]] = defaultdict(list)
+
+        for entry in self.read(start, end):
+            if user_id and entry.get("user_id") != user_id:
+                continue
+            key = tuple(entry.get(field) for field in group_by)
+            row = groups.get(key)
+            if row is None:
+                row = groups[key] = {
+                    **dict(zip(group_by, key)),
+                    "calls": 0, "errors": 0, "rate_limited": 0, "retries": 0, "cache_hits": 0,
+                    "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0
+                }
+            row["calls"] += 1
+            if entry.get("status") == "rate_limited":
+                row["rate_limited"] += 1
+            elif entry.get("status") != "success":
+                row["errors"] += 1
+            row["retries"] += entry.get("retries") or 0
+            row["cache_hits"] += 1 if entry.get("cache_hit") else 0
+            for field in ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens"):
+                row[field] += entry.get(field) or 0
+            if entry.get("latency_ms") is not None:
+                latencies[key].append(entry["latency_ms"])
+
+        rows = []
+        for key, row in groups.items():
+            values = sorted(latencies[key])
+            row["avg_latency_ms"] = round(sum(values) / len(values)) if values else None
+            row["p95_latency_ms"] = values[min(len(values) - 1, math.ceil(0.95 * len(values)) - 1)] if values else None
+            rows.append(row)
+        rows.sort(key=lambda r: tuple(str(r.get(field) or "") for field in group_by))
+        return rows
+
+
+usage_ledger = UsageLedger(os.getenv("LLM_USAGE_LEDGER_PATH", DEFAULT_LEDGER_PATH))
@@ -1,27 +1,72 @@
-from fastapi import HTTPException, Depends
+import logging
+import os
+import time
+from typing import Optional
+from fastapi import HTTPException, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth
 
+from metrics import AUTH_VERIFY_SECONDS
+
+logger = logging.getLogger(__name__)
+
 security = HTTPBearer()
 
-async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def _decode_token(token: str) -> dict:
     try:
-        token = credentials.credentials
         if not token:
             raise HTTPException(status_code=401, detail="No token provided")
-        decoded_token = auth.verify_id_token(token)
+        started = time.perf_counter()
+        result = "rejected"
+        try:
+            decoded_token = auth.verify_id_token(token)
+            result = "ok"
+        finally:
+            AUTH_VERIFY_SECONDS.labels(result).observe(time.perf_counter() - started)
         return decoded_token
-    except ValueError as e:
-        import traceback
-        print(f"Token verification error: {str(e)}")
-        print(traceback.format_exc())
+    except HTTPException:
+        raise
+    except (ValueError, auth.InvalidIdTokenError, auth.UserDisabledError) as e:
+        # Expired, revoked or malformed tokens are routine; no traceback
+        logger.warning("Token verification failed: %s", e, extra={"error": type(e).__name__})
         raise HTTPException(status_code=401, detail=f"Token verification failed: {str(e)}")
     except Exception as e:
-        import traceback
-        print(f"Auth error: {str(e)}")
-        print(traceback.format_exc())
+        logger.error("Auth error: %s", e, exc_info=True)
         raise HTTPException(status_code=401, detail=f"Invalid authentication token: {str(e)}")
 
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return _decode_token(credentials.credentials)
+
 def get_user_id(decoded_token: dict = Depends(verify_token)) -> str:
     return decoded_token.get("uid")
 
+
+optional_security = HTTPBearer(auto_error=False)
+
+def get_stream_user_id(
+    access_token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> str:
+    # Browsers' EventSource cannot set headers, so streams also accept ?access_token=
+    token = credentials.credentials if credentials else access_token
+    return _decode_token(token).get("uid")
+
+
+def is_admin(decoded_token: dict) -> bool:
+    # Admins carry an `admin` custom claim or are listed in ADMIN_USER_IDS
+    admin_ids = {uid.strip() for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip()}
+    return bool(decoded_token.get("admin")) or decoded_token.get("uid") in admin_ids
+
+
+def require_admin(decoded_token: dict = Depends(verify_token)) -> str:
+    if not is_admin(decoded_token):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return decoded_token.get("uid")
+
+
+def verify_admin_token(token: str) -> str:
+    """Verify a raw ID token outside of a route (e.g. in middleware) and return the admin's uid."""
+    decoded_token = _decode_token(token)
+    if not is_admin(decoded_token):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return decoded_token.get("uid")
@@ -0,0 +1,190 @@
+"""
+Analyzer Micro-benchmarks
+Times each FitnessDataAnalyzer.build_*_summary method, transform_user_profile
+and prompt building on synthetic data of growing size, reporting time and peak
+traced memory per call and the fitted growth exponent (time ~ size^k) so
+super-linear behaviour in the analytics path stands out.
+
+Usage (from backend/):
+    python -m benchmarks.analyzer [--densities 1,2,4,8,16] [--years 1,2,5] [--only training,prompt]
+                                  [--json results.json] [--max-exponent 1.3]
+
+Density d logs every day with 5 exercises of 5*d sets per session, 3*d meals
+and d stress, activity and hydration entries. The history series summarizes
+every month of 1..N years of the "dense" scenario. With --max-exponent the run
+exits non-zero when any target grows faster than that.
+"""
+
+import argparse
+import calendar
+import json
+import math
+import sys
+import time
+import tracemalloc
+from datetime import date
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from ai_analysis import FitnessAICoach, transform_user_profile
+from ai_analysis.prompt_encoder import encode_summary
+from ai_analysis.stub_client import StubCompletionClient
+from benchmarks.synthetic import MONTH, PROFILE, SCENARIOS, YEAR, Scale, SyntheticAnalyzer, generate_user_data, generate_years
+
+# Minimum wall time per timing sample; fast calls are repeated until they reach it
+MIN_SAMPLE_SECONDS = 0.05
+SAMPLES = 3
+
+PREVIOUS_ANALYSIS = "TRAINING: Four sessions a week with steady volume. " * 40
+
+
+class Case(NamedTuple):
+    target: str
+    size: int
+    call: Callable[[], Any]
+
+
+def density_scale(density: int) -> Scale:
+    return Scale(sessions_per_week=7, exercises_per_session=5, sets_per_exercise=5 * density, log_rate=1.0,
+                 meals_per_day=3 * density, entries_per_day=density)
+
+
+def month_size(data: Dict[str, List[Dict[str, Any]]]) -> int:
+    """Documents plus workout sets, the unit the analyzer iterates over."""
+    sets = sum(len(exercise["sets"]) for session in data["workout_sessions"] for exercise in session["exercises"])
+    return sum(len(docs) for docs in data.values()) + sets
+
+
+def scaled_profile(factor: int) -> Dict[str, Any]:
+    """PROFILE with list fields and free text repeated `factor` times."""
+    profile = dict(PROFILE)
+    for field, value in PROFILE.items():
+        if isinstance(value, list):
+            profile[field] = [f"{item} {index}" for index in range(factor) for item in value]
+        elif field.endswith("_notes"):
+            profile[field] = " ".join([value] * factor)
+    return profile
+
+
+def density_cases(densities: List[int]) -> List[Case]:
+    cases = []
+    coach = FitnessAICoach(client=StubCompletionClient(latency_ms=0), user_profile=transform_user_profile(PROFILE))
+    for density in densities:
+        last_day = calendar.monthrange(YEAR, MONTH)[1]
+        data = generate_user_data(density_scale(density), date(YEAR, MONTH, 1), date(YEAR, MONTH, last_day), seed=density)
+        analyzer = SyntheticAnalyzer(data)
+        size = month_size(data)
+        summary = analyzer.build_complete_summary(YEAR, MONTH)
+        previous = [PREVIOUS_ANALYSIS] * density
+        cases += [
+            Case("build_training_summary", size, lambda a=analyzer: a.build_training_summary(YEAR, MONTH)),
+            Case("build_nutrition_summary", size, lambda a=analyzer: a.build_nutrition_summary(YEAR, MONTH)),
+            Case("build_recovery_summary", size, lambda a=analyzer: a.build_recovery_summary(YEAR, MONTH)),
+            Case("build_lifestyle_summary", size, lambda a=analyzer: a.build_lifestyle_summary(YEAR, MONTH)),
+            Case("build_complete_summary", size, lambda a=analyzer: a.build_complete_summary(YEAR, MONTH)),
+            Case("encode_summary", size, lambda s=summary: encode_summary(s)),
+            # Size is the number of previous analyses in the prompt
+            Case("build_general_analysis_prompt", density,
+                 lambda s=summary, p=previous: coach._build_general_analysis_prompt(s, p)),
+            # Size is the repetition factor of list and free-text profile fields
+            Case("transform_user_profile", density, lambda p=scaled_profile(density): transform_user_profile(p)),
+        ]
+    return cases
+
+
+def history_cases(years_list: List[int]) -> List[Case]:
+    cases = []
+    for years in years_list:
+        data = generate_years(SCENARIOS["dense"], years, end=date(YEAR, 12, 31), seed=years)
+        analyzer = SyntheticAnalyzer(data)
+        months = [(YEAR - offset // 12, 12 - offset % 12) for offset in range(12 * years)]
+
+        def summarize_all(a=analyzer, m=months):
+            for year, month in m:
+                a.build_complete_summary(year, month)
+
+        cases.append(Case("complete_summary_all_months", month_size(data), summarize_all))
+    return cases
+
+
+def measure(call: Callable[[], Any]) -> Dict[str, float]:
+    """Best per-call time over SAMPLES samples, and peak traced memory of one call."""
+    call()
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_SAMPLE_SECONDS or number >= 1 << 16:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(SAMPLES - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        best = min(best, (time.perf_counter() - started) / number)
+
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"ms": best * 1000, "peak_kib": peak / 1024}
+
+
+def growth_exponent(points: List[Dict[str, Any]]) -> Optional[float]:
+    """Least-squares slope of log(time) against log(size); 1.0 is linear."""
+    points = [point for point in points if point["size"] > 0 and point["ms"] > 0]
+    if len({point["size"] for point in points}) < 2:
+        return None
+    xs = [math.log(point["size"]) for point in points]
+    ys = [math.log(point["ms"]) for point in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+
+
+def run(densities: List[int], years: List[int], only: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    cases = density_cases(densities) + history_cases(years)
+    if only:
+        cases = [case for case in cases if any(part in case.target for part in only)]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'target':<32}{'size':>9}{'ms/call':>12}{'peak KiB':>11}")
+    for case in cases:
+        point = {"size": case.size, **measure(case.call)}
+        results.setdefault(case.target, {"points": []})["points"].append(point)
+        print(f"{case.target:<32}{case.size:>9}{point['ms']:>12.4f}{point['peak_kib']:>11.1f}")
+
+    print(f"\n{'target':<32}{'exponent':>9}")
+    for target, result in results.items():
+        result["exponent"] = growth_exponent(result["points"])
+        shown = "-" if result["exponent"] is None else f"{result['exponent']:.2f}"
+        print(f"{target:<32}{shown:>9}")
+    return results
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--densities", type=_int_list, default=[1, 2, 4, 8, 16])
+    parser.add_argument("--years", type=_int_list, default=[1, 2, 5])
+    parser.add_argument("--only", help="Comma-separated substrings of target names to include")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this file")
+    parser.add_argument("--max-exponent", type=float, help="Fail if any target's growth exponent exceeds this")
+    args = parser.parse_args()
+
+    results = run(args.densities, args.years, [part.strip() for part in args.only.split(",")] if args.only else None)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"densities": args.densities, "years": args.years, "targets": results}, f, indent=2)
+    if args.max_exponent is not None:
+        slow = [target for target, result in results.items()
+                if result["exponent"] is not None and result["exponent"] > args.max_exponent]
+        if slow:
+            print(f"Super-linear (exponent > {args.max_exponent}): {', '.join(slow)}")
+            sys.exit(1)
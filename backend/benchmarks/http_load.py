@@ -0,0 +1,264 @@
+"""
+HTTP Load Benchmark
+Drives every router in-process under concurrent load, against the in-memory
+Firestore (DB_BACKEND=memory) and the stub completion client (LLM_BACKEND=stub),
+and reports throughput and p50/p95/p99 latency per endpoint. Runs offline.
+
+Usage (from backend/):
+    python -m benchmarks.http_load [--users 20] [--concurrency 32] [--duration 10]
+                                   [--db-latency-ms 5] [--llm-latency-ms 300]
+                                   [--only macros,sleep] [--json results.json]
+
+Requests go through the full ASGI stack (routing, validation, dependencies)
+but not a socket. Authentication is replaced by "Bearer <user id>" tokens.
+The SSE stream is long-lived and not load tested.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+YEAR, MONTH = 2024, 5
+
+ADMIN_USER = "bench-admin"
+
+
+class Endpoint(NamedTuple):
+    name: str
+    method: str
+    # Path for a user; may depend on the user's seeded ids
+    path: Callable[[str, random.Random], str]
+    # Relative share of the request mix
+    weight: float = 1.0
+    body: Optional[Callable[[str, random.Random], Dict[str, Any]]] = None
+    files: Optional[Callable[[str, random.Random], Dict[str, Any]]] = None
+
+
+def _day(rng: random.Random) -> str:
+    return f"{YEAR}-{MONTH:02d}-{rng.randint(1, 28):02d}"
+
+
+def _static(path: str) -> Callable[[str, random.Random], str]:
+    return lambda user_id, rng: path
+
+
+ENDPOINTS: List[Endpoint] = [
+    Endpoint("GET /exercises", "GET", _static("/api/exercises"), 2),
+    Endpoint("POST /exercises", "POST", _static("/api/exercises"), 0.5,
+             lambda u, rng: {"name": f"Cable Fly {rng.randint(1, 999)}", "type": "strength", "muscle_group": "chest"}),
+    Endpoint("GET /exercises/search", "GET", lambda u, rng: f"/api/exercises/search?query={rng.choice(['ben', 'squ', 'dedlift', 'row'])}", 3),
+    Endpoint("GET /exercises/catalog", "GET", _static("/api/exercises/catalog"), 0.5),
+    Endpoint("GET /splits", "GET", _static("/api/splits"), 1),
+    Endpoint("POST /splits", "POST", _static("/api/splits"), 0.2,
+             lambda u, rng: {"name": "PPL", "days": ["Push", "Pull", "Legs"]}),
+    Endpoint("GET /workout-sessions", "GET", _static("/api/workout-sessions"), 2),
+    Endpoint("POST /workout-sessions", "POST", _static("/api/workout-sessions"), 1,
+             lambda u, rng: {"date": _day(rng), "split_name": "Push", "exercises": [
+                 {"exercise_name": "Bench Press", "sets": [{"reps": 8, "weight": 185}] * 4}]}),
+    Endpoint("GET /physical-activities", "GET", _static("/api/physical-activities"), 1),
+    Endpoint("POST /physical-activities", "POST", _static("/api/physical-activities"), 0.5,
+             lambda u, rng: {"date": _day(rng), "steps": rng.randint(3000, 14000), "is_whole_day": True}),
+    Endpoint("GET /macros", "GET", lambda u, rng: f"/api/macros?date_filter={_day(rng)}", 3),
+    Endpoint("POST /macros", "POST", _static("/api/macros"), 2,
+             lambda u, rng: {"date": _day(rng), "food_items": [{"food_id": "chicken_breast_raw", "servings": 1.5},
+                                                                {"name": "Rice", "calories": 200, "protein": 4}]}),
+    Endpoint("GET /macros/daily", "GET", _static(f"/api/macros/daily?from={YEAR}-{MONTH:02d}-01&to={YEAR}-{MONTH:02d}-31"), 2),
+    Endpoint("GET /stress", "GET", _static("/api/stress"), 0.5),
+    Endpoint("POST /stress", "POST", _static("/api/stress"), 0.5, lambda u, rng: {"date": _day(rng), "level": rng.randint(1, 10)}),
+    Endpoint("GET /body-feelings", "GET", _static("/api/body-feelings"), 0.5),
+    Endpoint("POST /body-feelings", "POST", _static("/api/body-feelings"), 0.3,
+             lambda u, rng: {"date": _day(rng), "description": "Tight hamstrings after squats"}),
+    Endpoint("GET /wellness-survey", "GET", _static("/api/wellness-survey"), 0.5),
+    Endpoint("POST /wellness-survey", "POST", _static("/api/wellness-survey"), 0.3,
+             lambda u, rng: {"date": _day(rng), "fatigue": rng.randint(1, 10), "body_aches": rng.randint(1, 10)}),
+    Endpoint("GET /sleep", "GET", _static("/api/sleep"), 1),
+    Endpoint("POST /sleep", "POST", _static("/api/sleep"), 0.5,
+             lambda u, rng: {"date": _day(rng), "hours_slept": round(rng.uniform(5, 9), 1)}),
+    Endpoint("GET /hydration/daily", "GET", _static(f"/api/hydration/daily?from={YEAR}-{MONTH:02d}-01&to={YEAR}-{MONTH:02d}-31"), 1),
+    Endpoint("POST /hydration/increment", "POST", _static("/api/hydration/increment"), 3,
+             lambda u, rng: {"date": _day(rng), "amount_cups": 1}),
+    Endpoint("POST /hydration", "POST", _static("/api/hydration"), 0.5, lambda u, rng: {"date": _day(rng), "amount_cups": 2}),
+    Endpoint("GET /user-profile", "GET", _static("/api/user-profile"), 1),
+    Endpoint("PUT /user-profile", "PUT", _static("/api/user-profile"), 0.2,
+             lambda u, rng: {"weight": rng.randint(150, 200), "primary_goal": "Build muscle"}),
+    Endpoint("GET /foods/search", "GET", lambda u, rng: f"/api/foods/search?query={rng.choice(['chick', 'oat', 'banan', 'yogrt'])}", 3),
+    Endpoint("GET /foods/{id}", "GET", _static("/api/foods/chicken_breast_raw?servings=2"), 1),
+    Endpoint("GET /sync", "GET", _static("/api/sync?limit=500"), 0.5),
+    Endpoint("GET /export", "GET", _static("/api/export"), 0.1),
+    Endpoint("POST /import", "POST", lambda u, rng: "/api/import?kind=sleep", 0.05,
+             files=lambda u, rng: {"file": ("sleep.csv", f"date,hours\n{_day(rng)},7.5\n{_day(rng)},6\n")}),
+    Endpoint("GET /ai-analysis/summary", "GET", _static(f"/api/ai-analysis/summary?year={YEAR}&month={MONTH}"), 1),
+    Endpoint("POST /ai-analysis/generate", "POST", _static("/api/ai-analysis/generate"), 0.2,
+             lambda u, rng: {"year": YEAR, "month": MONTH}),
+    Endpoint("POST /ai-analysis/chat", "POST", _static("/api/ai-analysis/chat"), 0.3,
+             lambda u, rng: {"message": "How was my sleep this month?", "year": YEAR, "month": MONTH}),
+    Endpoint("GET /ai-analysis/analyses", "GET", _static("/api/ai-analysis/analyses"), 0.5),
+    Endpoint("GET /admin/caches", "GET", _static("/api/admin/caches"), 0.05),
+]
+
+
+def seed(db, user_ids: List[str]) -> None:
+    """Give every user a month of synthetic history, their rollups and a profile."""
+    from benchmarks.synthetic import PROFILE, SCENARIOS, generate_month
+    from rollups import mark_backfilled, rebuild_daily_totals, rebuild_hydration_daily
+
+    scenarios = list(SCENARIOS)
+    now = f"{YEAR}-{MONTH:02d}-01T00:00:00"
+    for index, user_id in enumerate(user_ids):
+        user_ref = db.collection("users").document(user_id)
+        batch = db.batch()
+        for collection, docs in generate_month(scenarios[index % len(scenarios)], seed=index, year=YEAR, month=MONTH).items():
+            for doc in docs:
+                batch.set(user_ref.collection(collection).document(), {**doc, "created_at": now, "updated_at": now})
+        batch.set(user_ref.collection("user_profile").document("profile"), PROFILE)
+        batch.commit()
+        rebuild_daily_totals(db, user_id)
+        rebuild_hydration_daily(db, user_id)
+    mark_backfilled(db, "nutrition_daily")
+    mark_backfilled(db, "hydration_daily")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+async def drive(app, endpoints: List[Endpoint], user_ids: List[str], concurrency: int, duration: float,
+                seed_value: int = 0) -> Dict[str, Dict[str, Any]]:
+    """
+    Send a weighted mix of requests from `concurrency` workers for `duration` seconds.
+
+    Returns:
+        Per-endpoint latencies (seconds) and error counts
+    """
+    import httpx
+
+    results: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"latencies": [], "errors": 0, "statuses": defaultdict(int)})
+    weights = [endpoint.weight for endpoint in endpoints]
+    deadline = time.perf_counter() + duration
+
+    async def worker(number: int, client) -> None:
+        rng = random.Random(seed_value * 1000 + number)
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            user_id = ADMIN_USER if endpoint.path(user_ids[0], rng).startswith("/api/admin") else rng.choice(user_ids)
+            kwargs: Dict[str, Any] = {"headers": {"Authorization": f"Bearer {user_id}"}}
+            if endpoint.body:
+                kwargs["json"] = endpoint.body(user_id, rng)
+            if endpoint.files:
+                kwargs["files"] = endpoint.files(user_id, rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(endpoint.method, endpoint.path(user_id, rng), **kwargs)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            stats = results[endpoint.name]
+            stats["latencies"].append(time.perf_counter() - started)
+            stats["statuses"][status] += 1
+            if not isinstance(status, int) or status >= 400:
+                stats["errors"] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await asyncio.gather(*(worker(number, client) for number in range(concurrency)))
+    return results
+
+
+def report(results: Dict[str, Dict[str, Any]], duration: float) -> List[Dict[str, Any]]:
+    rows = []
+    for name, stats in sorted(results.items()):
+        latencies = sorted(stats["latencies"])
+        rows.append({
+            "endpoint": name,
+            "requests": len(latencies),
+            "errors": stats["errors"],
+            "rps": round(len(latencies) / duration, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "statuses": {str(status): count for status, count in stats["statuses"].items()}
+        })
+
+    print(f"{'endpoint':<32}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for row in rows:
+        print(f"{row['endpoint']:<32}{row['requests']:>9}{row['errors']:>8}{row['rps']:>9}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}")
+    all_latencies = sorted(latency for stats in results.values() for latency in stats["latencies"])
+    total_errors = sum(stats["errors"] for stats in results.values())
+    print(f"{'total':<32}{len(all_latencies):>9}{total_errors:>8}{len(all_latencies) / duration:>9.1f}"
+          f"{percentile(all_latencies, 0.50) * 1000:>9.2f}{percentile(all_latencies, 0.95) * 1000:>9.2f}"
+          f"{percentile(all_latencies, 0.99) * 1000:>9.2f}")
+    return rows
+
+
+def run(users: int, concurrency: int, duration: float, db_latency_ms: float, llm_latency_ms: float,
+        only: Optional[List[str]] = None, json_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    # Backends are chosen when db and the LLM registry are first imported
+    os.environ["DB_BACKEND"] = "memory"
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["MEMORY_DB_LATENCY_MS"] = str(db_latency_ms)
+    os.environ["STUB_LLM_LATENCY_MS"] = str(llm_latency_ms)
+    os.environ.setdefault("ADMIN_USER_IDS", ADMIN_USER)
+
+    from fastapi import Request
+    import auth
+    import main
+    from db import db
+
+    if type(db).__name__ != "MemoryClient":
+        raise SystemExit("db was already imported with a real backend; run this benchmark in its own process")
+
+    async def bearer_user(request: Request) -> dict:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        return {"uid": token or "bench-anonymous"}
+
+    main.app.dependency_overrides[auth.verify_token] = bearer_user
+
+    user_ids = [f"bench-user-{index}" for index in range(users)]
+    latency, db.latency_ms = db.latency_ms, 0
+    seed(db, user_ids)
+    db.latency_ms = latency
+
+    endpoints = [endpoint for endpoint in ENDPOINTS
+                 if not only or any(part in endpoint.name for part in only)]
+    if not endpoints:
+        raise SystemExit("No endpoints match --only")
+
+    print(f"{len(endpoints)} endpoints, {users} users, concurrency {concurrency}, {duration:g}s, "
+          f"db latency {db_latency_ms:g} ms, llm latency {llm_latency_ms:g} ms")
+    started = time.perf_counter()
+    results = asyncio.run(drive(main.app, endpoints, user_ids, concurrency, duration))
+    rows = report(results, time.perf_counter() - started)
+    main.hydration.hydration_writes.flush_all()
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({
+                "config": {"users": users, "concurrency": concurrency, "duration": duration,
+                           "db_latency_ms": db_latency_ms, "llm_latency_ms": llm_latency_ms},
+                "endpoints": rows
+            }, f, indent=2)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Simulated Firestore round trip")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="Simulated completion time")
+    parser.add_argument("--only", help="Comma-separated substrings of endpoint names to include")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this file")
+    args = parser.parse_args()
+    run(args.users, args.concurrency, args.duration, args.db_latency_ms, args.llm_latency_ms,
+        [part.strip() for part in args.only.split(",")] if args.only else None, args.json_path)
@@ -0,0 +1,48 @@
+"""
+Prompt Token Benchmark
+Compares prompt size of indented JSON against the compact prompt encoder for
+synthetic users with light, typical and heavy logging.
+
+Usage (from backend/):
+    python -m benchmarks.prompt_tokens
+
+Token counts use tiktoken's o200k_base encoding (gpt-4o) when installed and
+fall back to a ~4 characters per token estimate otherwise.
+"""
+
+import json
+from typing import Callable
+
+from ai_analysis import transform_user_profile
+from ai_analysis.prompt_encoder import encode_summary, encode_profile
+from benchmarks.synthetic import MONTH, PROFILE, SCENARIOS, YEAR, SyntheticAnalyzer, generate_month
+
+
+def token_counter() -> Callable[[str], int]:
+    """Return the best available token counting function."""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text))
+    except Exception:
+        return lambda text: max(1, len(text) // 4)
+
+
+def run() -> None:
+    count = token_counter()
+    profile = transform_user_profile(PROFILE)
+    profile_before = count(json.dumps(profile, indent=2, default=str))
+    profile_after = count(encode_profile(profile))
+
+    print(f"{'scenario':<10}{'part':<10}{'json':>8}{'compact':>10}{'saved':>8}")
+    print(f"{'-':<10}{'profile':<10}{profile_before:>8}{profile_after:>10}{1 - profile_after / profile_before:>8.0%}")
+
+    for scenario in SCENARIOS:
+        summary = SyntheticAnalyzer(generate_month(scenario)).build_complete_summary(YEAR, MONTH)
+        before = count(json.dumps(summary, indent=2, default=str))
+        after = count(encode_summary(summary))
+        print(f"{scenario:<10}{'summary':<10}{before:>8}{after:>10}{1 - after / before:>8.0%}")
+
+
+if __name__ == "__main__":
+    run()
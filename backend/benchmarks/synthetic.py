@@ -0,0 +1,199 @@
+"""
+Synthetic User Data
+Deterministic, seedable generator of realistic per-user documents for every
+collection, from a single month up to years of dense daily logging, plus an
+analyzer that reads them instead of Firestore. Shared by the benchmarks.
+
+Training follows a progressive overload cycle with a deload every fifth week,
+sleep and stress follow weekly and seasonal rhythms, and meals are built from
+food items whose totals add up the way the macros router stores them.
+"""
+
+import calendar
+import math
+import random
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from typing import Any, Dict, List, NamedTuple
+
+from ai_analysis import FitnessDataAnalyzer
+from rollups import group_entries_by_date
+
+EXERCISES = ["Bench Press", "Squat", "Deadlift", "Overhead Press", "Barbell Row", "Lat Pulldown",
+             "Incline Bench Press", "Front Squat", "Romanian Deadlift", "Bicep Curl", "Tricep Pushdown"]
+
+# Starting working weight per exercise (lbs); everything else starts at 60
+START_WEIGHTS = {"Bench Press": 155, "Squat": 205, "Deadlift": 245, "Overhead Press": 95, "Barbell Row": 135,
+                 "Incline Bench Press": 135, "Front Squat": 155, "Romanian Deadlift": 185}
+
+SPLITS = {
+    "Push": ["Bench Press", "Overhead Press", "Incline Bench Press", "Tricep Pushdown"],
+    "Pull": ["Deadlift", "Barbell Row", "Lat Pulldown", "Bicep Curl"],
+    "Legs": ["Squat", "Front Squat", "Romanian Deadlift"],
+}
+
+# name -> (calories, protein, carbs, fats, sodium) per serving
+FOODS = {
+    "Chicken Breast": (180, 34, 0, 4, 70), "Rice": (205, 4, 45, 0.4, 2), "Oatmeal": (150, 5, 27, 3, 2),
+    "Eggs": (155, 13, 1, 11, 124), "Greek Yogurt": (100, 17, 6, 0.7, 36), "Banana": (105, 1, 27, 0.4, 1),
+    "Salmon": (280, 30, 0, 17, 75), "Broccoli": (55, 4, 11, 0.6, 33), "Protein Shake": (120, 24, 3, 1.5, 150),
+    "Pasta": (220, 8, 43, 1.3, 1), "Peanut Butter": (190, 7, 7, 16, 140), "Avocado": (240, 3, 13, 22, 11),
+}
+
+BODY_FEELINGS = ["Tight hamstrings", "Sore chest from bench", "Lower back a bit stiff", "Feeling fresh",
+                 "Shoulders achy", "Quads sore after squats", "Slight knee discomfort"]
+
+PROFILE = {
+    "height_cm": 180, "weight": 175, "age": 25, "gender": "Male",
+    "primary_goal": "Build muscle", "secondary_goals": ["Increase strength", "Improve endurance"],
+    "time_horizon": "6 months", "experience_level": "intermediate",
+    "training_history_style": ["PPL", "Upper/Lower"], "training_history_notes": "Been training for 2 years consistently",
+    "work_school_hours": 8, "busy_level": 6, "typical_stress_level": 7, "stress_fluctuates": True,
+    "preferred_workout_time": "evening", "preferred_session_length": "45-60 min",
+    "preferred_workout_frequency": "4-5 days per week", "coaching_style_preference": "structured and analytical",
+    "dietary_preference": "No strict diet", "willingness_to_track": "Willing to track macros daily",
+    "progress_feeling": "Slow but steady", "biggest_blocker": "Inconsistent sleep"
+}
+
+COLLECTIONS = ["exercises", "splits", "workout_sessions", "macros", "sleep", "wellness_survey", "stress",
+               "physical_activities", "hydration", "body_feelings"]
+
+
+class Scale(NamedTuple):
+    sessions_per_week: float
+    exercises_per_session: int
+    sets_per_exercise: int
+    # Chance each day gets sleep, wellness, stress, activity and meal logs
+    log_rate: float
+    meals_per_day: int = 3
+    # Stress, activity and hydration entries on a logged day
+    entries_per_day: int = 1
+
+
+SCENARIOS = {
+    "light": Scale(2, 3, 3, 0.4, 2),
+    "typical": Scale(4, 5, 4, 0.8, 3),
+    "heavy": Scale(6, 7, 5, 1.0, 4, 2),
+    # Daily logging and 25 sets per session
+    "dense": Scale(7, 5, 5, 1.0, 5, 3),
+}
+
+YEAR, MONTH = 2024, 5
+
+
+def _days(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def _meal(rng: random.Random, day: str) -> Dict[str, Any]:
+    items = []
+    for name in rng.sample(list(FOODS), rng.randint(1, 4)):
+        servings = rng.choice([0.5, 1, 1, 1.5, 2])
+        calories, protein, carbs, fats, sodium = (value * servings for value in FOODS[name])
+        items.append({"name": name, "servings": servings, "calories": round(calories, 1), "protein": round(protein, 1),
+                      "carbs": round(carbs, 1), "fats": round(fats, 1), "sodium": round(sodium, 1)})
+    return {
+        "date": day,
+        "food_items": items,
+        "total_calories": round(sum(item["calories"] for item in items), 1),
+        "total_protein": round(sum(item["protein"] for item in items), 1),
+        "total_carbs": round(sum(item["carbs"] for item in items), 1),
+        "total_fats": round(sum(item["fats"] for item in items), 1),
+    }
+
+
+def _session(rng: random.Random, scale: Scale, day: str, week: int, split: str) -> Dict[str, Any]:
+    # +2.5% per week over a 4 week block, then a lighter deload week
+    block, week_in_block = divmod(week, 5)
+    intensity = 1 + 0.025 * (block * 4 + min(week_in_block, 3))
+    if week_in_block == 4:
+        intensity *= 0.85
+
+    names = SPLITS[split] + [name for name in EXERCISES if name not in SPLITS[split]]
+    exercises = []
+    for name in names[:scale.exercises_per_session]:
+        top = START_WEIGHTS.get(name, 60) * intensity
+        exercises.append({
+            "exercise_name": name,
+            "sets": [{"set_number": number + 1, "reps": rng.randint(5, 12),
+                      "weight": round(top * rng.uniform(0.9, 1.0) / 5) * 5}
+                     for number in range(scale.sets_per_exercise)]
+        })
+    return {"date": day, "split_name": split, "exercises": exercises}
+
+
+def generate_user_data(scale: Scale, start: date, end: date, seed: int = 42) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Generate documents for every collection between two dates (inclusive).
+
+    Args:
+        scale: Logging density
+        seed: Same seed and arguments always produce the same documents
+
+    Returns:
+        Collection name -> documents in date order (without ids or timestamps)
+    """
+    rng = random.Random(seed)
+    data: Dict[str, List[Dict[str, Any]]] = {name: [] for name in COLLECTIONS}
+    data["exercises"] = [{"name": name, "type": "strength", "is_custom": False} for name in EXERCISES]
+    data["splits"] = [{"name": "PPL", "days": list(SPLITS)}]
+
+    split_names = list(SPLITS)
+    session_count = 0
+    for current in _days(start, end):
+        day = current.isoformat()
+        week = (current - start).days // 7
+        # Weekends sleep longer and stress less; stress peaks around the turn of the year
+        weekend = current.weekday() >= 5
+        season = math.cos(2 * math.pi * (current.timetuple().tm_yday / 365))
+
+        if rng.random() < scale.sessions_per_week / 7:
+            data["workout_sessions"].append(_session(rng, scale, day, week, split_names[session_count % len(split_names)]))
+            session_count += 1
+
+        if rng.random() >= scale.log_rate:
+            continue
+        for _ in range(scale.meals_per_day):
+            data["macros"].append(_meal(rng, day))
+        hours = rng.gauss(8.0 if weekend else 6.9, 0.7)
+        data["sleep"].append({"date": day, "hours_slept": round(min(max(hours, 3.5), 11), 1),
+                              "quality": min(10, max(1, round(hours + rng.uniform(-2, 1))))})
+        fatigue = min(10, max(1, round(rng.gauss(5 - (hours - 7) * 1.5, 1.2))))
+        data["wellness_survey"].append({"date": day, "fatigue": fatigue, "body_aches": rng.randint(1, 6),
+                                        "energy": 11 - fatigue, "mood": rng.randint(4, 9)})
+        for _ in range(scale.entries_per_day):
+            data["stress"].append({"date": day, "level": min(10, max(1, round(rng.gauss(5 + season - weekend * 1.5, 1.5))))})
+            data["physical_activities"].append({"date": day, "steps": max(500, int(rng.gauss(11000 if weekend else 8000, 2500))),
+                                                "is_whole_day": True})
+            data["hydration"].append({"date": day, "amount_cups": rng.choice([1, 1, 2, 2, 3])})
+        if rng.random() < 0.15:
+            data["body_feelings"].append({"date": day, "description": rng.choice(BODY_FEELINGS)})
+    return data
+
+
+def generate_years(scale: Scale, years: int, end: date = date(YEAR, 12, 31), seed: int = 42) -> Dict[str, List[Dict[str, Any]]]:
+    """Generate `years` years of history ending on `end`."""
+    return generate_user_data(scale, date(end.year - years, end.month, end.day) + timedelta(days=1), end, seed)
+
+
+def generate_month(scenario: str, seed: int = 42, year: int = YEAR, month: int = MONTH) -> Dict[str, List[Dict[str, Any]]]:
+    """Generate one month of documents for a named scenario."""
+    last_day = calendar.monthrange(year, month)[1]
+    return generate_user_data(SCENARIOS[scenario], date(year, month, 1), date(year, month, last_day), seed)
+
+
+class SyntheticAnalyzer(FitnessDataAnalyzer):
+    """Analyzer that reads generated documents instead of Firestore."""
+
+    def __init__(self, data: Dict[str, List[Dict[str, Any]]], user_id: str = "benchmark-user"):
+        super().__init__(db=None, user_id=user_id)
+        # Date-sorted documents and their dates, so range reads cost what an indexed query would
+        self.data = {name: sorted(docs, key=lambda doc: doc.get("date", "")) for name, docs in data.items()}
+        self._dates = {name: [doc.get("date", "") for doc in docs] for name, docs in self.data.items()}
+
+    def _fetch_collection_data(self, collection_name: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+        dates = self._dates.get(collection_name, [])
+        return self.data.get(collection_name, [])[bisect_left(dates, start_date):bisect_right(dates, end_date)]
+
+    def _fetch_daily_nutrition(self, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+        return group_entries_by_date(self._fetch_collection_data("macros", start_date, end_date))
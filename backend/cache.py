@@ -0,0 +1,85 @@
+"""
+In-process caches
+Small thread-safe TTL + LRU cache with hit/miss counters, shared by modules
+that cache per-user derived data between requests.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from metrics import CACHE_EVICTIONS, CACHE_LOOKUPS
+
+_registry: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries expire `ttl_seconds` after being set."""
+
+    def __init__(self, name: str, max_size: int = 1024, ttl_seconds: float = 600):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._hit_counter = CACHE_LOOKUPS.labels(name, "hit")
+        self._miss_counter = CACHE_LOOKUPS.labels(name, "miss")
+        self._eviction_counter = CACHE_EVICTIONS.labels(name)
+        _registry[name] = self
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                self._hit_counter.inc()
+                return item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            self._miss_counter.inc()
+            return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+                self._eviction_counter.inc()
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every cache created in this process, keyed by name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
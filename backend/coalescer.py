@@ -0,0 +1,108 @@
+"""
+Write coalescing
+Merges rapid successive counter increments for the same key (e.g. one user's
+hydration on one date) into a single Firestore write per short window.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+# Give up on a key's pending amounts after this many failed flushes
+MAX_FLUSH_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+
+class WriteCoalescer:
+    """
+    Accumulates amounts per key and flushes them after `window_seconds`.
+
+    Amounts only live in this worker's memory until flushed, so at most one
+    window of increments is lost if the process dies; flush_all() runs on shutdown.
+    """
+
+    def __init__(self, window_seconds: float, flush: Callable[[Hashable, Dict[str, float]], None]):
+        self.window_seconds = window_seconds
+        self._flush_fn = flush
+        self._pending: Dict[Hashable, Dict[str, float]] = {}
+        self._attempts: Dict[Hashable, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.merged = 0
+
+    def add(self, key: Hashable, **amounts: float) -> Dict[str, float]:
+        """
+        Add amounts for a key, scheduling a flush if none is pending.
+        Must be called from the event loop.
+
+        Returns:
+            Amounts pending for the key, including this one
+        """
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = defaultdict(float)
+                schedule = True
+            else:
+                self.merged += 1
+                schedule = False
+            for name, amount in amounts.items():
+                pending[name] += amount
+            snapshot = dict(pending)
+
+        if self.window_seconds <= 0:
+            self._flush(key)
+        elif schedule:
+            loop = asyncio.get_running_loop()
+            loop.call_later(self.window_seconds, lambda: loop.run_in_executor(None, self._flush, key))
+        return snapshot
+
+    def pending(self, key: Hashable) -> Dict[str, float]:
+        """Amounts added for a key but not yet written."""
+        with self._lock:
+            return dict(self._pending.get(key) or {})
+
+    def pending_items(self) -> List[Tuple[Hashable, Dict[str, float]]]:
+        """All keys with amounts not yet written."""
+        with self._lock:
+            return [(key, dict(amounts)) for key, amounts in self._pending.items()]
+
+    def _flush(self, key: Hashable) -> None:
+        with self._lock:
+            amounts = self._pending.pop(key, None)
+        if not amounts:
+            return
+        try:
+            self._flush_fn(key, dict(amounts))
+            self.flushes += 1
+            self._attempts.pop(key, None)
+        except Exception as e:
+            self._attempts[key] += 1
+            if self._attempts[key] >= MAX_FLUSH_ATTEMPTS:
+                logger.error("Dropping coalesced write for %s after %d attempts: %s", key, self._attempts.pop(key), e)
+                return
+            logger.warning("Coalesced write for %s failed, retrying: %s", key, e)
+            with self._lock:
+                pending = self._pending.setdefault(key, defaultdict(float))
+                for name, amount in amounts.items():
+                    pending[name] += amount
+            threading.Timer(self.window_seconds, self._flush, args=(key,)).start()
+
+    def flush_all(self) -> None:
+        """Write everything pending now (called on shutdown)."""
+        with self._lock:
+            keys = list(self._pending)
+        for key in keys:
+            self._flush(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "window_seconds": self.window_seconds,
+                "pending_keys": len(self._pending),
+                "flushes": self.flushes,
+                "merged_increments": self.merged
+            }
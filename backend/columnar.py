@@ -0,0 +1,206 @@
+"""
+Columnar export
+Writes a user's collections as typed Parquet or Arrow IPC tables for analytics.
+Nested lists are flattened into their own tables (workout exercises and sets,
+macro food items) keyed by the parent document id. Documents are read page by
+page and written in record batches, so memory stays bounded. Requires pyarrow.
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from export import iter_pages
+from rollups import TOTAL_FIELDS
+
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.file", "arrow"),
+}
+
+# Rows buffered before a record batch (and Parquet row group) is written
+ROWS_PER_BATCH = 10000
+
+Row = Dict[str, Any]
+Column = Tuple[str, str]
+
+TIMESTAMPS: List[Column] = [("created_at", "string"), ("updated_at", "string")]
+FOOD_ITEM_FIELDS = ["calories", "protein", "carbs", "fats", "sodium", "servings", "grams"]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Columnar export requires the pyarrow package (pip install pyarrow)")
+    return pyarrow
+
+
+class Table(NamedTuple):
+    collection: str
+    columns: List[Column]
+    # Rows of this table for one source document; None for one row of its fields
+    rows: Optional[Callable[[str, Row], Iterator[Row]]] = None
+
+
+def _macro_items(entry_id: str, data: Row) -> Iterator[Row]:
+    for index, item in enumerate(data.get("food_items") or []):
+        yield {"entry_id": entry_id, "item_index": index, "date": data.get("date"), **item}
+
+
+def _macro_entry(entry_id: str, data: Row) -> Iterator[Row]:
+    yield {**data, "id": entry_id, "food_item_count": len(data.get("food_items") or [])}
+
+
+def _session(session_id: str, data: Row) -> Iterator[Row]:
+    exercises = data.get("exercises") or []
+    yield {
+        **data,
+        "id": session_id,
+        "exercise_count": len(exercises),
+        "set_count": sum(len(exercise.get("sets") or []) for exercise in exercises)
+    }
+
+
+def _session_exercises(session_id: str, data: Row) -> Iterator[Row]:
+    for index, exercise in enumerate(data.get("exercises") or []):
+        yield {
+            "session_id": session_id,
+            "exercise_index": index,
+            "date": data.get("date"),
+            "exercise_name": exercise.get("exercise_name"),
+            "set_count": len(exercise.get("sets") or [])
+        }
+
+
+def _session_sets(session_id: str, data: Row) -> Iterator[Row]:
+    for exercise_index, exercise in enumerate(data.get("exercises") or []):
+        for set_index, workout_set in enumerate(exercise.get("sets") or []):
+            yield {
+                **workout_set,
+                "session_id": session_id,
+                "exercise_index": exercise_index,
+                "set_index": set_index,
+                "date": data.get("date"),
+                "exercise_name": exercise.get("exercise_name")
+            }
+
+
+TABLES: Dict[str, Table] = {
+    "sleep": Table("sleep", [
+        ("id", "string"), ("date", "string"), ("hours_slept", "float64"), ("quality", "int64"),
+        ("bedtime", "string"), ("wake_time", "string"), ("notes", "string")] + TIMESTAMPS),
+    "stress": Table("stress", [
+        ("id", "string"), ("date", "string"), ("level", "int64"), ("description", "string")] + TIMESTAMPS),
+    "body_feelings": Table("body_feelings", [
+        ("id", "string"), ("date", "string"), ("description", "string")] + TIMESTAMPS),
+    "wellness_survey": Table("wellness_survey", [
+        ("id", "string"), ("date", "string"), ("fatigue", "int64"), ("body_aches", "int64"), ("energy", "int64"),
+        ("sleep_quality", "int64"), ("mood", "int64")] + TIMESTAMPS),
+    "physical_activities": Table("physical_activities", [
+        ("id", "string"), ("date", "string"), ("steps", "int64"), ("activity_type", "string"),
+        ("description", "string"), ("duration_minutes", "int64"), ("is_whole_day", "bool"),
+        ("intensity_level", "int64")] + TIMESTAMPS),
+    "hydration": Table("hydration", [
+        ("id", "string"), ("date", "string"), ("amount_cups", "float64"), ("notes", "string")] + TIMESTAMPS),
+    "hydration_daily": Table("hydration_daily", [
+        ("date", "string"), ("amount_cups", "float64"), ("tap_cups", "float64"), ("taps", "int64"),
+        ("updated_at", "string")]),
+    "nutrition_daily": Table("nutrition_daily", [("date", "string")] + [(field, "float64") for field in TOTAL_FIELDS] + [
+        ("entry_count", "int64"), ("updated_at", "string")]),
+    "macros": Table("macros", [("id", "string"), ("date", "string")] + [(field, "float64") for field in TOTAL_FIELDS] + [
+        ("food_item_count", "int64")] + TIMESTAMPS, _macro_entry),
+    "macro_food_items": Table("macros", [
+        ("entry_id", "string"), ("item_index", "int64"), ("date", "string"), ("name", "string"),
+        ("food_id", "string")] + [(field, "float64") for field in FOOD_ITEM_FIELDS], _macro_items),
+    "workout_sessions": Table("workout_sessions", [
+        ("id", "string"), ("date", "string"), ("split_name", "string"), ("notes", "string"),
+        ("exercise_count", "int64"), ("set_count", "int64")] + TIMESTAMPS, _session),
+    "workout_exercises": Table("workout_sessions", [
+        ("session_id", "string"), ("exercise_index", "int64"), ("date", "string"), ("exercise_name", "string"),
+        ("set_count", "int64")], _session_exercises),
+    "workout_sets": Table("workout_sessions", [
+        ("session_id", "string"), ("exercise_index", "int64"), ("set_index", "int64"), ("date", "string"),
+        ("exercise_name", "string"), ("reps", "int64"), ("weight", "float64"), ("distance", "float64"),
+        ("seconds", "float64"), ("rpe", "float64")], _session_sets),
+    "exercises": Table("exercises", [
+        ("id", "string"), ("name", "string"), ("type", "string"), ("muscle_group", "string"),
+        ("is_custom", "bool"), ("catalog_id", "string")] + TIMESTAMPS),
+    "ai_analyses": Table("ai_analyses", [
+        ("id", "string"), ("year", "int64"), ("month", "int64"), ("period", "int64"), ("status", "string"),
+        ("model", "string"), ("tokens_used", "int64"), ("previous_context_count", "int64"),
+        ("analysis", "string")] + TIMESTAMPS),
+}
+
+
+def _coerce(value: Any, kind: str) -> Any:
+    """Convert a stored value to the column type; values that do not fit become null."""
+    if value is None or value == "":
+        return None
+    try:
+        if kind == "int64":
+            return int(float(value))
+        if kind == "float64":
+            return float(value)
+        if kind == "bool":
+            return value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes")
+    except (TypeError, ValueError):
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def table_schema(name: str):
+    """Arrow schema of an export table."""
+    pa = _pyarrow()
+    return pa.schema([(column, pa.type_for_alias(kind)) for column, kind in TABLES[name].columns])
+
+
+def _record_batch(pa, schema, table: Table, rows: List[Row]):
+    columns = {
+        column: pa.array([_coerce(row.get(column), kind) for row in rows], type=pa.type_for_alias(kind))
+        for column, kind in table.columns
+    }
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def write_table(db, user_id: str, name: str, sink, file_format: str = "parquet",
+                rows_per_batch: int = ROWS_PER_BATCH) -> int:
+    """
+    Write one export table of a user to a file or file-like sink.
+
+    Args:
+        name: Key of TABLES
+        file_format: "parquet" or "arrow" (Arrow IPC file)
+
+    Returns:
+        Number of rows written
+
+    Raises:
+        RuntimeError: If pyarrow is not installed
+    """
+    pa = _pyarrow()
+    table = TABLES[name]
+    schema = table_schema(name)
+    if file_format == "parquet":
+        writer = pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(sink, schema)
+
+    collection_ref = db.collection("users").document(user_id).collection(table.collection)
+    rows: List[Row] = []
+    count = 0
+    try:
+        for docs in iter_pages(collection_ref):
+            for doc in docs:
+                data = doc.to_dict()
+                rows.extend(table.rows(doc.id, data) if table.rows else [{**data, "id": doc.id, "date": data.get("date", doc.id)}])
+            if len(rows) >= rows_per_batch:
+                writer.write_batch(_record_batch(pa, schema, table, rows))
+                count += len(rows)
+                rows = []
+        if rows or not count:
+            writer.write_batch(_record_batch(pa, schema, table, rows))
+            count += len(rows)
+    finally:
+        writer.close()
+    return count
@@ -3,11 +3,19 @@ from firebase_admin import credentials, firestore
 import os
 import json
 import base64
+import logging
 from dotenv import load_dotenv
 
+from metrics import instrument_firestore
+
 load_dotenv()
 
-if not firebase_admin._apps:
+logger = logging.getLogger(__name__)
+
+# DB_BACKEND=memory swaps Firestore for an in-process fake (benchmarks, offline runs); nothing is persisted
+DB_BACKEND = os.getenv("DB_BACKEND", "firestore").lower()
+
+if DB_BACKEND != "memory" and not firebase_admin._apps:
     firebase_json_b64 = os.getenv("FIREBASE_SERVICE_ACCOUNT_B64")
     google_app_creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
     
@@ -16,30 +24,41 @@ if not firebase_admin._apps:
             firebase_json = json.loads(base64.b64decode(firebase_json_b64).decode())
             cred = credentials.Certificate(firebase_json)
             firebase_admin.initialize_app(cred)
-            print("Firebase Admin initialized from base64 env var")
+            logger.info("Firebase Admin initialized from base64 env var")
         except Exception as e:
-            print(f"Error decoding base64 Firebase credentials: {e}")
+            logger.error("Error decoding base64 Firebase credentials: %s", e)
             firebase_admin.initialize_app()
     elif google_app_creds:
         try:
             if os.path.exists(google_app_creds):
                 cred = credentials.Certificate(google_app_creds)
                 firebase_admin.initialize_app(cred)
-                print(f"Firebase Admin initialized with service account file: {google_app_creds}")
+                logger.info("Firebase Admin initialized with service account file: %s", google_app_creds)
             else:
                 firebase_json = json.loads(google_app_creds)
                 cred = credentials.Certificate(firebase_json)
                 firebase_admin.initialize_app(cred)
-                print("Firebase Admin initialized from JSON string")
+                logger.info("Firebase Admin initialized from JSON string")
         except json.JSONDecodeError:
-            print(f"WARNING: GOOGLE_APPLICATION_CREDENTIALS is not a valid file path or JSON. Path: {google_app_creds}")
+            logger.warning("GOOGLE_APPLICATION_CREDENTIALS is not a valid file path or JSON. Path: %s", google_app_creds)
             firebase_admin.initialize_app()
         except Exception as e:
-            print(f"Error initializing Firebase: {e}")
+            logger.error("Error initializing Firebase: %s", e)
             firebase_admin.initialize_app()
     else:
-        print("WARNING: Firebase credentials not found. Using default initialization.")
+        logger.warning("Firebase credentials not found. Using default initialization.")
         firebase_admin.initialize_app()
 
-db = firestore.client()
+if DB_BACKEND == "memory":
+    from memory_firestore import MemoryClient
+
+    # Simulated round trip per read, query and commit
+    db = MemoryClient(
+        latency_ms=float(os.getenv("MEMORY_DB_LATENCY_MS", "0")),
+        jitter_ms=float(os.getenv("MEMORY_DB_JITTER_MS", "0"))
+    )
+else:
+    db = firestore.client()
+
+instrument_firestore(db)
 
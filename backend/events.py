@@ -0,0 +1,232 @@
+"""
+Change events
+Per-user pub/sub of entry-level change events (collection, document id,
+upsert/delete) published by the routers on every write and streamed to the
+user's connected devices. Delivery within a worker is in-process; a pluggable
+backend (Redis pub/sub) fans events out across workers.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+# Recent events kept per user so a reconnecting client can resume from Last-Event-ID
+REPLAY_BUFFER_SIZE = 256
+
+# Users whose recent events are kept in memory
+MAX_BUFFERED_USERS = 4096
+
+# Events queued for one connection before it is treated as too slow and closed
+SUBSCRIBER_QUEUE_SIZE = 128
+
+_sequence = itertools.count()
+
+logger = logging.getLogger(__name__)
+
+
+def _event_id() -> str:
+    """Sortable id: milliseconds, then a per-process sequence to break ties."""
+    return f"{int(time.time() * 1000)}-{next(_sequence)}"
+
+
+class Subscription:
+    """One connected stream: a bounded queue fed from any thread."""
+
+    def __init__(self, user_id: str, loop: asyncio.AbstractEventLoop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: stop queueing and tell it to catch up through /api/sync
+            self.overflowed = True
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        """Queue an event; safe to call from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._offer, event)
+        except RuntimeError:
+            # Event loop already closed
+            pass
+
+
+class LocalBackend:
+    """Delivers published events to this worker only."""
+
+    def start(self, deliver: Callable[[Dict[str, Any]], None]) -> None:
+        self._deliver = deliver
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        self._deliver(event)
+
+    def close(self) -> None:
+        pass
+
+
+class RedisBackend:
+    """Publishes events to a Redis channel that every worker listens on."""
+
+    CHANNEL = "gymai:changes"
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("EVENTS_BACKEND=redis requires the redis package (pip install redis)")
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, deliver: Callable[[Dict[str, Any]], None]) -> None:
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.CHANNEL: lambda message: deliver(json.loads(message["data"]))})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        self._redis.publish(self.CHANNEL, json.dumps(event, separators=(",", ":"), default=str))
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._thread.stop()
+        if self._pubsub is not None:
+            self._pubsub.close()
+
+
+class ChangeBroker:
+    """Fans change events out to subscribed streams and keeps a short replay buffer per user."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or LocalBackend()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._buffers: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._started = False
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    @classmethod
+    def from_env(cls) -> "ChangeBroker":
+        """EVENTS_BACKEND=redis (with REDIS_URL) shares events across workers; default is in-process."""
+        if os.getenv("EVENTS_BACKEND", "local").lower() == "redis":
+            return cls(RedisBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+        return cls()
+
+    def start(self) -> None:
+        if not self._started:
+            self.backend.start(self._deliver)
+            self._started = True
+
+    def close(self) -> None:
+        self.backend.close()
+        self._started = False
+
+    def publish(self, user_id: str, collection: str, doc_id: str, op: str = "upsert",
+                data: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Publish a change. Never raises: a failed publish only costs clients a
+        sync round trip, not the write that triggered it.
+
+        Args:
+            op: "upsert" or "delete"
+            data: The written document, or None if clients should refetch it
+        """
+        event = {
+            "id": _event_id(),
+            "user_id": user_id,
+            "collection": collection,
+            "doc_id": doc_id,
+            "op": op,
+            "data": data
+        }
+        try:
+            self.start()
+            self.backend.publish(event)
+            self.published += 1
+        except Exception as e:
+            logger.warning("Could not publish change event: %s", e)
+
+    def _deliver(self, event: Dict[str, Any]) -> None:
+        user_id = event["user_id"]
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            if buffer is None:
+                buffer = self._buffers[user_id] = deque(maxlen=REPLAY_BUFFER_SIZE)
+                while len(self._buffers) > MAX_BUFFERED_USERS:
+                    self._buffers.popitem(last=False)
+            else:
+                self._buffers.move_to_end(user_id)
+            buffer.append(event)
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.offer(event)
+
+    def subscribe(self, user_id: str, last_event_id: Optional[str] = None) -> tuple:
+        """
+        Register a stream. Must be called from the event loop serving it.
+
+        Returns:
+            (subscription, events to replay, resync) where resync is True if
+            last_event_id is no longer in the replay buffer and the client must
+            catch up through /api/sync
+        """
+        self.start()
+        subscription = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            buffered: List[Dict[str, Any]] = list(self._buffers.get(user_id, ()))
+
+        replay, resync = [], False
+        if last_event_id:
+            ids = [event["id"] for event in buffered]
+            if last_event_id in ids:
+                replay = buffered[ids.index(last_event_id) + 1:]
+            else:
+                # Evicted from the buffer, or seen by another worker without a shared backend
+                resync = True
+        return subscription, replay, resync
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+        if subscription.overflowed:
+            self.dropped_subscribers += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "subscribed_users": len(self._subscribers),
+                "subscriptions": sum(len(s) for s in self._subscribers.values()),
+                "buffered_users": len(self._buffers),
+                "published": self.published,
+                "dropped_slow_subscribers": self.dropped_subscribers
+            }
+
+
+change_broker = ChangeBroker.from_env()
+
+
+def publish_change(user_id: str, collection: str, doc_id: str, data: Optional[Dict[str, Any]] = None) -> None:
+    """Publish a created/updated document."""
+    change_broker.publish(user_id, collection, doc_id, "upsert", data)
+
+
+def publish_deletion(user_id: str, collection: str, doc_id: str) -> None:
+    """Publish a deleted document."""
+    change_broker.publish(user_id, collection, doc_id, "delete")
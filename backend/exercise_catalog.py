@@ -0,0 +1,114 @@
+"""
+Exercise catalog
+Bundled read-only catalog of common exercises (names, aliases, muscle groups,
+compound/isolation classification). Compiled from data/exercise_catalog.json
+into a memory-mapped packed table, with an in-process name/alias index for
+constant-time classification.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from exercise_index import normalize
+from packed_table import PackedTable, load_compiled
+
+BACKEND_DIR = os.path.dirname(__file__)
+CATALOG_SOURCE = os.path.join(BACKEND_DIR, "data", "exercise_catalog.json")
+CATALOG_COMPILED = os.path.join(BACKEND_DIR, "var", "exercise_catalog.bin")
+
+CATALOG_FIELDS = [
+    ("id", "str"),
+    ("name", "str"),
+    ("aliases", "str"),
+    ("muscle_group", "str"),
+    ("type", "str"),
+    ("equipment", "str"),
+    ("mechanics", "str"),
+]
+
+# Aliases are joined into one string field
+ALIAS_SEPARATOR = "|"
+
+
+def _compile_rows(source_path: str):
+    with open(source_path, "r") as f:
+        entries = json.load(f)
+    rows = [{**entry, "aliases": ALIAS_SEPARATOR.join(entry.get("aliases") or [])} for entry in entries]
+    return CATALOG_FIELDS, rows
+
+
+class ExerciseCatalog:
+    """Lookup over the compiled catalog."""
+
+    def __init__(self, table: PackedTable):
+        self.table = table
+        # Normalized name or alias -> row number; the only per-worker structure
+        self._lookup: Dict[str, int] = {}
+        self._ids: Dict[str, int] = {}
+        for index, row in enumerate(table):
+            self._ids[row["id"]] = index
+            for name in [row["name"]] + row["aliases"].split(ALIAS_SEPARATOR):
+                key = normalize(name)
+                if key:
+                    self._lookup.setdefault(key, index)
+        self._json: Optional[bytes] = None
+
+    @staticmethod
+    def _decode(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **row,
+            "aliases": row["aliases"].split(ALIAS_SEPARATOR) if row["aliases"] else [],
+            "mechanics": row["mechanics"] or None
+        }
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        """Find a catalog exercise by name or alias (case and punctuation insensitive)."""
+        index = self._lookup.get(normalize(name))
+        return self._decode(self.table.row(index)) if index is not None else None
+
+    def get(self, catalog_id: str) -> Optional[Dict[str, Any]]:
+        """Find a catalog exercise by id."""
+        index = self._ids.get(catalog_id)
+        return self._decode(self.table.row(index)) if index is not None else None
+
+    def mechanics(self, name: str) -> Optional[str]:
+        """'compound' or 'isolation' for a known strength exercise, otherwise None."""
+        index = self._lookup.get(normalize(name))
+        return (self.table.row(index)["mechanics"] or None) if index is not None else None
+
+    def is_compound(self, name: str) -> Optional[bool]:
+        """Whether an exercise is a compound movement, or None if it is not in the catalog."""
+        mechanics = self.mechanics(name)
+        return None if mechanics is None else mechanics == "compound"
+
+    def entries(self) -> List[Dict[str, Any]]:
+        return [self._decode(row) for row in self.table]
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.table.checksum}"'
+
+    def to_json(self) -> bytes:
+        """Serialized catalog, built once per worker."""
+        if self._json is None:
+            self._json = json.dumps(self.entries(), separators=(",", ":")).encode()
+        return self._json
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+_catalog: Optional[ExerciseCatalog] = None
+_lock = threading.Lock()
+
+
+def get_catalog() -> ExerciseCatalog:
+    """Load (compiling if needed) the catalog on first use."""
+    global _catalog
+    if _catalog is None:
+        with _lock:
+            if _catalog is None:
+                _catalog = ExerciseCatalog(load_compiled(CATALOG_SOURCE, CATALOG_COMPILED, _compile_rows))
+    return _catalog
@@ -0,0 +1,276 @@
+"""
+Exercise search index
+Per-user in-memory index over the exercise library: a prefix trie over name
+words for search-as-you-type, trigram matching for typos, and ranking by how
+often each exercise appears in the user's workout sessions.
+"""
+
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Maximum number of user indexes kept in memory
+MAX_INDEXED_USERS = 512
+
+# Rebuild from Firestore at most this often (catches writes made by other workers)
+FULL_REBUILD_SECONDS = 15 * 60
+
+# Minimum trigram similarity for a fuzzy match
+MIN_SIMILARITY = 0.3
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse punctuation/whitespace to single spaces."""
+    return " ".join(_WORD_RE.findall((text or "").lower()))
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of a normalized string, padded so short words still match."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(query_grams: List[Set[str]], name: str) -> float:
+    """Mean over query words of the best trigram Jaccard similarity to any word of the name."""
+    name_grams = [trigrams(word) for word in name.split()]
+    if not name_grams:
+        return 0.0
+    total = 0.0
+    for grams in query_grams:
+        total += max(len(grams & other) / len(grams | other) for other in name_grams)
+    return total / len(query_grams)
+
+
+def _usage_key(exercise: Dict[str, Any]) -> Optional[str]:
+    """Key a logged session exercise by id, falling back to its name."""
+    if exercise.get("exercise_id"):
+        return exercise["exercise_id"]
+    name = normalize(exercise.get("exercise_name", ""))
+    return f"name:{name}" if name else None
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: Set[str] = set()
+
+
+class UserExerciseIndex:
+    """Search index over one user's exercises."""
+
+    def __init__(self):
+        self.exercises: Dict[str, Dict[str, Any]] = {}
+        self.names: Dict[str, str] = {}
+        self.root = _TrieNode()
+        self.grams: Dict[str, Set[str]] = {}
+        self.usage: Counter = Counter()
+        self.lock = threading.Lock()
+        self.built_at = 0.0
+
+    def _trie_add(self, word: str, exercise_id: str) -> None:
+        node = self.root
+        for char in word:
+            node = node.children.setdefault(char, _TrieNode())
+            node.ids.add(exercise_id)
+
+    def _trie_remove(self, word: str, exercise_id: str) -> None:
+        path = [self.root]
+        for char in word:
+            node = path[-1].children.get(char)
+            if node is None:
+                break
+            node.ids.discard(exercise_id)
+            path.append(node)
+        # Prune branches no exercise passes through any more
+        for parent, char in zip(reversed(path[:-1]), reversed(word[:len(path) - 1])):
+            child = parent.children[char]
+            if child.ids:
+                break
+            del parent.children[char]
+
+    def _trie_lookup(self, prefix: str) -> Set[str]:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.ids
+
+    def _remove(self, exercise_id: str) -> None:
+        name = self.names.pop(exercise_id, None)
+        self.exercises.pop(exercise_id, None)
+        if name is None:
+            return
+        for word in set(name.split()):
+            self._trie_remove(word, exercise_id)
+        for gram in set().union(*map(trigrams, name.split())):
+            ids = self.grams.get(gram)
+            if ids:
+                ids.discard(exercise_id)
+                if not ids:
+                    del self.grams[gram]
+
+    def upsert(self, exercise_id: str, data: Dict[str, Any]) -> None:
+        """Add or replace an exercise."""
+        with self.lock:
+            self._remove(exercise_id)
+            name = normalize(data.get("name", ""))
+            self.exercises[exercise_id] = data
+            self.names[exercise_id] = name
+            for word in set(name.split()):
+                self._trie_add(word, exercise_id)
+                for gram in trigrams(word):
+                    self.grams.setdefault(gram, set()).add(exercise_id)
+
+    def remove(self, exercise_id: str) -> None:
+        """Remove an exercise."""
+        with self.lock:
+            self._remove(exercise_id)
+
+    def add_usage(self, exercises: Iterable[Dict[str, Any]], delta: int = 1) -> None:
+        """Count (or with delta=-1, uncount) the exercises logged in a workout session."""
+        with self.lock:
+            for exercise in exercises or []:
+                key = _usage_key(exercise) if isinstance(exercise, dict) else None
+                if key:
+                    self.usage[key] += delta
+                    if self.usage[key] <= 0:
+                        del self.usage[key]
+
+    def usage_count(self, exercise_id: str) -> int:
+        return self.usage.get(exercise_id, 0) + self.usage.get(f"name:{self.names.get(exercise_id, '')}", 0)
+
+    def search(self, query: str, muscle_group: Optional[str] = None, workout_type: Optional[str] = None,
+               limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Find exercises matching a (partial) name.
+
+        Args:
+            query: Search box text; exercises where every word prefixes a word of
+                   the name come first, then names whose words are within trigram distance
+            muscle_group: Only exercises with this muscle group (case-insensitive)
+            workout_type: Only exercises of this WorkoutType value
+            limit: Maximum number of results
+
+        Returns:
+            Exercises ordered by match quality, then by how often the user logs them
+        """
+        query = normalize(query)
+        muscle_group = muscle_group.lower() if muscle_group else None
+
+        with self.lock:
+            def allowed(exercise_id: str) -> bool:
+                data = self.exercises[exercise_id]
+                if muscle_group and (data.get("muscle_group") or "").lower() != muscle_group:
+                    return False
+                return not workout_type or data.get("type") == workout_type
+
+            # exercise id -> (match tier, similarity)
+            matches: Dict[str, tuple] = {}
+            if not query:
+                matches = {exercise_id: (0, 0.0) for exercise_id in self.exercises}
+            else:
+                words = query.split()
+                ids = set(self._trie_lookup(words[0]))
+                for word in words[1:]:
+                    ids &= self._trie_lookup(word)
+                for exercise_id in ids:
+                    matches[exercise_id] = (2 if self.names[exercise_id].startswith(query) else 1, 1.0)
+
+                if len(matches) < limit:
+                    word_grams = [trigrams(word) for word in words]
+                    candidates: Set[str] = set()
+                    for grams in word_grams:
+                        for gram in grams:
+                            candidates.update(self.grams.get(gram, ()))
+                    for exercise_id in candidates - matches.keys():
+                        similarity = _similarity(word_grams, self.names[exercise_id])
+                        if similarity >= MIN_SIMILARITY:
+                            matches[exercise_id] = (0, similarity)
+
+            ranked = sorted(
+                (exercise_id for exercise_id in matches if allowed(exercise_id)),
+                key=lambda exercise_id: (
+                    -matches[exercise_id][0],
+                    -round(matches[exercise_id][1], 1),
+                    -self.usage_count(exercise_id),
+                    self.names[exercise_id]
+                )
+            )
+            return [{"id": exercise_id, **self.exercises[exercise_id]} for exercise_id in ranked[:limit]]
+
+    def __len__(self) -> int:
+        return len(self.exercises)
+
+
+class ExerciseIndexRegistry:
+    """Keeps an LRU set of per-user indexes, built lazily and kept current by router writes."""
+
+    def __init__(self, max_users: int = MAX_INDEXED_USERS):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, UserExerciseIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _build(self, db, user_id: str) -> UserExerciseIndex:
+        user_ref = db.collection("users").document(user_id)
+        index = UserExerciseIndex()
+        for doc in user_ref.collection("exercises").stream():
+            index.upsert(doc.id, doc.to_dict())
+        for doc in user_ref.collection("workout_sessions").select(["exercises"]).stream():
+            index.add_usage(doc.to_dict().get("exercises"))
+        index.built_at = time.monotonic()
+        return index
+
+    def get(self, db, user_id: str) -> UserExerciseIndex:
+        """Get a user's index, building it on first use or once it is stale."""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+
+        if index is None or time.monotonic() - index.built_at > FULL_REBUILD_SECONDS:
+            index = self._build(db, user_id)
+            with self._lock:
+                self._indexes[user_id] = index
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+        return index
+
+    def search(self, db, user_id: str, query: str, muscle_group: Optional[str] = None,
+               workout_type: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Search a user's exercises."""
+        return self.get(db, user_id).search(query, muscle_group=muscle_group, workout_type=workout_type, limit=limit)
+
+    def on_write(self, user_id: str, exercise_id: str, data: Dict[str, Any]) -> None:
+        """Apply a created/updated exercise to the user's index if it is loaded."""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.upsert(exercise_id, data)
+
+    def on_delete(self, user_id: str, exercise_id: str) -> None:
+        """Remove a deleted exercise from the user's index if it is loaded."""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.remove(exercise_id)
+
+    def on_session_change(self, user_id: str, old_exercises: Optional[List[Dict[str, Any]]] = None,
+                          new_exercises: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Move usage counts when a workout session is created, edited or deleted."""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.add_usage(old_exercises, delta=-1)
+            index.add_usage(new_exercises, delta=1)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a user's index so it is rebuilt on next use."""
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+
+exercise_index = ExerciseIndexRegistry()
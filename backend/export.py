@@ -0,0 +1,142 @@
+"""
+Account export
+Streams every document in a user's collections as newline-delimited JSON,
+reading one page at a time so memory stays constant however much data the
+user has. An interrupted export resumes after the last document received.
+
+Chat sessions are exported with their messages: each session's messages
+(collection "chat_sessions/{session_id}/messages") come right before the
+session's own line, so resuming after a session never skips its messages.
+"""
+
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sync import SYNC_COLLECTIONS
+
+EXPORT_COLLECTIONS = SYNC_COLLECTIONS + ["chat_sessions"]
+
+# Subcollection exported under every document of a collection
+EXPORT_SUBCOLLECTIONS = {"chat_sessions": "messages"}
+
+# Documents read per Firestore query; also the unit written to the response at once
+EXPORT_PAGE_SIZE = 500
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def _line(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, separators=(",", ":"), default=_json_default).encode() + b"\n"
+
+
+def iter_pages(collection_ref, after: Optional[str] = None, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[List[Any]]:
+    """
+    Yield a collection's documents in pages, ordered by id, one query per page.
+
+    Args:
+        after: Document id to start after
+    """
+    while True:
+        query = collection_ref.order_by("__name__")
+        if after:
+            query = query.start_after({"__name__": after})
+        docs = list(query.limit(page_size).stream())
+        if docs:
+            yield docs
+        if len(docs) < page_size:
+            return
+        after = docs[-1].id
+
+
+def parse_resume_collection(collection: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a resume collection into (exported collection, parent document id);
+    the id is set when resuming inside a subcollection, e.g. "chat_sessions/abc/messages".
+
+    Raises:
+        ValueError: If collection is not exported
+    """
+    parts = collection.split("/")
+    if len(parts) == 1 and collection in EXPORT_COLLECTIONS:
+        return collection, None
+    if len(parts) == 3 and parts[1] and EXPORT_SUBCOLLECTIONS.get(parts[0]) == parts[2]:
+        return parts[0], parts[1]
+    raise ValueError(f"Unknown collection: {collection}")
+
+
+def _document_line(collection: str, doc) -> bytes:
+    return _line({"type": "document", "collection": collection, "id": doc.id, "data": doc.to_dict()})
+
+
+def _subcollection_chunks(doc_ref, name: str, after: Optional[str], page_size: int) -> Iterator[Tuple[int, bytes]]:
+    """Yield (document count, chunk) for a document's exported subcollection, then (1, the document's line)."""
+    sub = EXPORT_SUBCOLLECTIONS[name]
+    path = f"{name}/{doc_ref.id}/{sub}"
+    for docs in iter_pages(doc_ref.collection(sub), after, page_size):
+        yield len(docs), b"".join(_document_line(path, doc) for doc in docs)
+    doc = doc_ref.get()
+    if doc.exists:
+        yield 1, _document_line(name, doc)
+
+
+def export_records(db, user_id: str, collection: Optional[str] = None, after: Optional[str] = None,
+                   page_size: int = EXPORT_PAGE_SIZE) -> Iterator[bytes]:
+    """
+    Yield the export as NDJSON, one chunk per page of documents.
+
+    Each document is a line {"type": "document", "collection", "id", "data"};
+    the last line is {"type": "end", "documents": count}, so a client can tell
+    a complete export from a dropped connection.
+
+    Args:
+        collection: Collection to start from (to resume), or a chat session's
+            messages path; defaults to the first
+        after: Document id in that collection to resume after
+
+    Raises:
+        ValueError: If collection is not exported
+    """
+    resume_collection, parent_id = parse_resume_collection(collection) if collection else (None, None)
+    start = EXPORT_COLLECTIONS.index(resume_collection) if resume_collection else 0
+    user_ref = db.collection("users").document(user_id)
+    count = 0
+
+    for name in EXPORT_COLLECTIONS[start:]:
+        collection_ref = user_ref.collection(name)
+        cursor = after if name == resume_collection else None
+        if name in EXPORT_SUBCOLLECTIONS:
+            if parent_id:
+                # Finish the session the export stopped in, then continue after it
+                for docs_count, chunk in _subcollection_chunks(collection_ref.document(parent_id), name, after, page_size):
+                    count += docs_count
+                    yield chunk
+                cursor, parent_id = parent_id, None
+            for docs in iter_pages(collection_ref.select([]), cursor, page_size):
+                for doc in docs:
+                    for docs_count, chunk in _subcollection_chunks(doc.reference, name, None, page_size):
+                        count += docs_count
+                        yield chunk
+            continue
+        for docs in iter_pages(collection_ref, cursor, page_size):
+            count += len(docs)
+            yield b"".join(_document_line(name, doc) for doc in docs)
+
+    yield _line({"type": "end", "documents": count})
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a stream of chunks on the fly, yielding compressed output as it is produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,229 @@
+"""
+Food database
+Bundled offline food database (per-100 g nutrients and a default serving per
+food). Compiled from data/foods.csv into a memory-mapped packed table, with a
+sorted key array for prefix autocomplete and a trigram index for typos.
+"""
+
+import csv
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from cache import TTLCache
+from exercise_index import normalize, trigrams
+from packed_table import PackedTable, load_compiled
+
+BACKEND_DIR = os.path.dirname(__file__)
+FOODS_SOURCE = os.path.join(BACKEND_DIR, "data", "foods.csv")
+FOODS_COMPILED = os.path.join(BACKEND_DIR, "var", "foods.bin")
+
+# Nutrients are stored per 100 g; sodium in mg
+NUTRIENT_FIELDS = ["calories", "protein", "carbs", "fats", "sodium"]
+
+FOOD_FIELDS = [
+    ("id", "str"),
+    ("name", "str"),
+    ("aliases", "str"),
+    ("category", "str"),
+    ("serving_g", "float"),
+    ("serving_label", "str"),
+] + [(field, "float") for field in NUTRIENT_FIELDS]
+
+ALIAS_SEPARATOR = ";"
+
+# Minimum trigram similarity for a fuzzy match
+MIN_SIMILARITY = 0.35
+
+# Shorter queries only get prefix matches
+MIN_FUZZY_LENGTH = 3
+
+# Key kinds, best first: the query prefixes the food name, an alias, or a later word
+_NAME_START, _ALIAS_START, _INNER_WORD = 0, 1, 2
+
+_search_cache = TTLCache("food_search", max_size=4096, ttl_seconds=60 * 60)
+
+
+def _compile_rows(source_path: str):
+    with open(source_path, "r", newline="") as f:
+        rows = []
+        for row in csv.DictReader(f):
+            for field, kind in FOOD_FIELDS:
+                if kind == "float":
+                    row[field] = float(row[field] or 0)
+            rows.append(row)
+    return FOOD_FIELDS, rows
+
+
+class FoodDatabase:
+    """Search and nutrient lookup over the compiled food table."""
+
+    def __init__(self, table: PackedTable):
+        self.table = table
+        self._ids: Dict[str, int] = {}
+        keys = []
+        grams: Dict[str, set] = {}
+        # Trigram sets of every distinct word in a food's name and aliases, for fuzzy scoring
+        self._word_grams: List[List[frozenset]] = []
+        for index, row in enumerate(table):
+            self._ids[row["id"]] = index
+            labels = [row["name"]] + [alias for alias in row["aliases"].split(ALIAS_SEPARATOR) if alias]
+            row_words = set()
+            for label_number, label in enumerate(labels):
+                words = normalize(label).split()
+                for position in range(len(words)):
+                    kind = _INNER_WORD if position else (_NAME_START if label_number == 0 else _ALIAS_START)
+                    keys.append((" ".join(words[position:]), kind, index))
+                row_words.update(words)
+            self._word_grams.append([frozenset(trigrams(word)) for word in sorted(row_words)])
+            for word_grams in self._word_grams[-1]:
+                for gram in word_grams:
+                    grams.setdefault(gram, set()).add(index)
+        keys.sort()
+        # Parallel arrays: sorted keys for bisect, then the kind and row of each key
+        self._keys: List[str] = [key for key, _, _ in keys]
+        self._key_kinds = array("B", (kind for _, kind, _ in keys))
+        self._key_rows = array("I", (index for _, _, index in keys))
+        self._grams: Dict[str, array] = {gram: array("I", sorted(rows)) for gram, rows in grams.items()}
+
+    def _similarity(self, query_grams: List[set], index: int) -> float:
+        """Mean over query words of the best trigram Jaccard similarity to any word of the food."""
+        total = 0.0
+        for grams in query_grams:
+            total += max(len(grams & other) / len(grams | other) for other in self._word_grams[index])
+        return total / len(query_grams)
+
+    @staticmethod
+    def _decode(row: Dict[str, Any]) -> Dict[str, Any]:
+        food = {**row, "aliases": [a for a in row["aliases"].split(ALIAS_SEPARATOR) if a]}
+        for field in ["serving_g"] + NUTRIENT_FIELDS:
+            food[field] = round(food[field], 1)
+        food["per_serving"] = _scale(row, row["serving_g"])
+        return food
+
+    def get(self, food_id: str) -> Optional[Dict[str, Any]]:
+        """Find a food by id."""
+        index = self._ids.get(food_id)
+        return self._decode(self.table.row(index)) if index is not None else None
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Autocomplete foods by name or alias.
+
+        Args:
+            query: Search box text; matched as a prefix of the name, an alias or
+                   any later word, with trigram matching as a fallback for typos
+            limit: Maximum number of results
+
+        Returns:
+            Foods, best match first
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        cached = _search_cache.get((query, limit))
+        if cached is not None:
+            return cached
+
+        # row -> (tier, similarity)
+        matches: Dict[int, tuple] = {}
+        position = bisect_left(self._keys, query)
+        while position < len(self._keys) and self._keys[position].startswith(query):
+            index = self._key_rows[position]
+            tier = self._key_kinds[position]
+            if index not in matches or tier < matches[index][0]:
+                matches[index] = (tier, 1.0)
+            position += 1
+
+        if len(matches) < limit and len(query) >= MIN_FUZZY_LENGTH:
+            word_grams = [trigrams(word) for word in query.split()]
+            shared: Counter = Counter()
+            for grams in word_grams:
+                for gram in grams:
+                    shared.update(self._grams.get(gram, ()))
+            # Foods sharing too few trigrams cannot reach the similarity threshold
+            min_shared = MIN_SIMILARITY * sum(len(grams) for grams in word_grams) / len(word_grams)
+            for index, count in shared.items():
+                if index in matches or count < min_shared:
+                    continue
+                similarity = self._similarity(word_grams, index)
+                if similarity >= MIN_SIMILARITY:
+                    matches[index] = (_INNER_WORD + 1, similarity)
+
+        rows = {index: self.table.row(index) for index in matches}
+        ranked = sorted(
+            matches,
+            key=lambda index: (matches[index][0], -round(matches[index][1], 1), len(rows[index]["name"]), rows[index]["name"])
+        )
+        results = [self._decode(rows[index]) for index in ranked[:limit]]
+        _search_cache.set((query, limit), results)
+        return results
+
+    def nutrients(self, food_id: str, servings: Optional[float] = None, grams: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Nutrients for an amount of a food.
+
+        Args:
+            food_id: Food id
+            servings: Number of default servings (used when grams is not given; defaults to 1)
+            grams: Amount in grams
+
+        Returns:
+            name, grams and the nutrient totals
+
+        Raises:
+            KeyError: If the food id is unknown
+        """
+        index = self._ids.get(food_id)
+        if index is None:
+            raise KeyError(food_id)
+        row = self.table.row(index)
+        if grams is None:
+            grams = row["serving_g"] * (servings if servings is not None else 1)
+        return {"name": row["name"], "grams": round(grams, 1), **_scale(row, grams)}
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+def _scale(row: Dict[str, Any], grams: float) -> Dict[str, float]:
+    return {field: round(row[field] * grams / 100, 1) for field in NUTRIENT_FIELDS}
+
+
+_foods: Optional[FoodDatabase] = None
+_lock = threading.Lock()
+
+
+def get_food_database() -> FoodDatabase:
+    """Load (compiling if needed) the food database on first use."""
+    global _foods
+    if _foods is None:
+        with _lock:
+            if _foods is None:
+                _foods = FoodDatabase(load_compiled(FOODS_SOURCE, FOODS_COMPILED, _compile_rows))
+    return _foods
+
+
+def resolve_food_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fill a logged FoodItem's nutrients from the database when it names a food_id.
+
+    Items without a food_id are returned unchanged; database values replace any
+    client-supplied nutrients otherwise.
+
+    Raises:
+        ValueError: If the food id is unknown or the amount is not positive
+    """
+    if not item.get("food_id"):
+        return item
+    servings, grams = item.get("servings"), item.get("grams")
+    if (servings is not None and servings <= 0) or (grams is not None and grams <= 0):
+        raise ValueError("servings and grams must be positive")
+    try:
+        resolved = get_food_database().nutrients(item["food_id"], servings=servings, grams=grams)
+    except KeyError:
+        raise ValueError(f"Unknown food_id: {item['food_id']}")
+    return {**item, **resolved, "name": item.get("name") or resolved["name"]}
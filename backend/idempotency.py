@@ -0,0 +1,165 @@
+"""
+Idempotent requests
+Lets clients retry a POST safely by sending an `Idempotency-Key` header. Creates
+derive their document id from the key, so a retry finds the document the first
+attempt wrote; endpoints without a single document to create (LLM calls, counter
+increments) store their response for a day and replay it.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Header, HTTPException
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
+
+IDEMPOTENCY_COLLECTION = "idempotency"
+
+MAX_KEY_LENGTH = 255
+
+# Stored responses are expired by a Firestore TTL policy on `expires_at`
+RESPONSE_TTL_HOURS = 24
+
+# A claim left pending this long belongs to a request that died mid-way and may be taken over
+PENDING_TIMEOUT_SECONDS = 5 * 60
+
+
+def idempotency_key_header(
+    idempotency_key: Optional[str] = Header(None, description="Client-generated key (e.g. a UUID) that makes retries of this request safe")
+) -> Optional[str]:
+    if idempotency_key is None:
+        return None
+    key = idempotency_key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+    return key
+
+
+def _hash(*parts: str) -> str:
+    return hashlib.sha256(":".join(parts).encode()).hexdigest()
+
+
+def idempotent_id(scope: str, key: Optional[str]) -> Optional[str]:
+    """
+    Document id for a create made with an idempotency key, or None without one.
+
+    Args:
+        scope: Collection (or endpoint) the key applies to, so one key can be reused across them
+        key: Idempotency-Key header value
+    """
+    return _hash(scope, key)[:20] if key else None
+
+
+def new_document(collection_ref, key: Optional[str]):
+    """Reference for a new document: keyed by the idempotency key if given, otherwise a random id."""
+    return collection_ref.document(idempotent_id(collection_ref.id, key))
+
+
+def create_document(doc_ref, data: Dict[str, Any], create: Optional[Callable[[], Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Create a document unless an earlier attempt already did.
+
+    Args:
+        create: Performs the write instead of doc_ref.create(data), e.g. a batch
+                that also updates rollups; must raise AlreadyExists if doc_ref exists
+
+    Returns:
+        None if this call created it, otherwise the stored document (a retry
+        returns it as-is even if the retried body differs)
+    """
+    try:
+        if create is None:
+            doc_ref.create(data)
+        else:
+            create()
+        return None
+    except AlreadyExists:
+        return doc_ref.get().to_dict()
+
+
+def _fingerprint(request_data: Any) -> str:
+    return _hash(json.dumps(request_data, sort_keys=True, default=str))
+
+
+def _response_ref(db, user_id: str, scope: str, key: str):
+    return db.collection("users").document(user_id).collection(IDEMPOTENCY_COLLECTION).document(_hash(scope, key))
+
+
+@firestore.transactional
+def _take_over_in_transaction(transaction, ref, claim: Dict[str, Any], fingerprint: str,
+                              stale_before: str) -> Optional[Dict[str, Any]]:
+    snapshot = ref.get(transaction=transaction)
+    if snapshot.exists:
+        stored = snapshot.to_dict() or {}
+        if stored.get("request_hash") != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if stored.get("status") == "completed":
+            return stored["response"]
+        if (stored.get("started_at") or "") > stale_before:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+    # Absent (the earlier attempt failed and released it) or stale; a concurrent taker makes this transaction retry
+    transaction.set(ref, claim)
+    return None
+
+
+def _claim(db, user_id: str, scope: str, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+    """
+    Claim a key before running the request.
+
+    Returns:
+        None if claimed, otherwise the stored response of the earlier request
+
+    Raises:
+        HTTPException: 409 if the earlier request is still running, 422 if it had a different body
+    """
+    ref = _response_ref(db, user_id, scope, key)
+    now = datetime.now()
+    claim = {
+        "scope": scope,
+        "request_hash": fingerprint,
+        "status": "pending",
+        "started_at": now.isoformat(),
+        "expires_at": now + timedelta(hours=RESPONSE_TTL_HOURS)
+    }
+    try:
+        ref.create(claim)
+        return None
+    except AlreadyExists:
+        pass
+    stale_before = (now - timedelta(seconds=PENDING_TIMEOUT_SECONDS)).isoformat()
+    return _take_over_in_transaction(db.transaction(), ref, claim, fingerprint, stale_before)
+
+
+async def run_once(db, user_id: str, scope: str, key: Optional[str], request_data: Any,
+                   handler: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Run a request handler at most once per idempotency key.
+
+    The first request with a key runs `handler` and stores its response; retries
+    with the same key and body get that response back without running it again.
+    Failed requests are not stored, so they can be retried.
+
+    Args:
+        scope: Endpoint name, so one key can be reused across endpoints
+        key: Idempotency-Key header value; without one the handler just runs
+        request_data: Request body, compared between the first request and retries
+        handler: Produces the response
+    """
+    if not key:
+        return await handler()
+
+    fingerprint = _fingerprint(request_data)
+    stored = _claim(db, user_id, scope, key, fingerprint)
+    if stored is not None:
+        return stored
+
+    ref = _response_ref(db, user_id, scope, key)
+    try:
+        response = await handler()
+    except BaseException:
+        ref.delete()
+        raise
+    ref.update({"status": "completed", "response": response, "completed_at": datetime.now().isoformat()})
+    return response
@@ -0,0 +1,381 @@
+"""
+Bulk import
+Imports history exported from other trackers (CSV, or NDJSON such as our own
+export) one row at a time: rows are parsed and validated against the API
+models as they are read, written in batched commits, and tracked in an import
+job document that clients poll for progress. Derived data (daily rollups,
+search indexes) is rebuilt once at the end instead of per row.
+"""
+
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from models import SleepEntry, MacroEntry, WorkoutSession, PhysicalActivity
+from foods import resolve_food_item
+from rollups import TOTAL_FIELDS, rebuild_daily_totals
+from exercise_index import exercise_index
+from ai_analysis.retrieval import notes_index
+
+logger = logging.getLogger(__name__)
+
+IMPORT_JOBS = "import_jobs"
+
+# Documents per batched commit (Firestore allows 500 writes per batch)
+BATCH_SIZE = 400
+
+# Row errors kept on the job document; later ones are only counted
+MAX_REPORTED_ERRORS = 50
+
+FORMATS = ["csv", "ndjson"]
+
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%d.%m.%Y", "%Y/%m/%d"]
+
+Row = Dict[str, Any]
+
+
+class RowError(Exception):
+    """A row that cannot be imported; the import continues with the next one."""
+
+
+def _column(name: str) -> str:
+    """Normalize a CSV header: "Weight (kg)" -> "weight_kg"."""
+    return re.sub(r"[^a-z0-9]+", "_", name.strip().lower()).strip("_")
+
+
+def _pick(row: Row, *names: str) -> Optional[str]:
+    for name in names:
+        if row.get(name) not in (None, ""):
+            return row[name]
+    return None
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        raise RowError(f"Not a number: {value!r}")
+
+
+def parse_date(value: Optional[str]) -> str:
+    """
+    Normalize a date (or datetime) from another app to YYYY-MM-DD.
+
+    Raises:
+        RowError: If the value is missing or in an unknown format
+    """
+    if not value:
+        raise RowError("Missing date")
+    value = value.strip()
+    if re.match(r"^\d{4}-\d{2}-\d{2}([T ].*)?$", value):
+        return value[:10]
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.split(" ")[0], date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise RowError(f"Unrecognized date: {value!r}")
+
+
+def _sleep_from_csv(row: Row) -> Row:
+    hours = _number(_pick(row, "hours_slept", "hours", "sleep_hours", "duration_hours"))
+    if hours is None:
+        minutes = _number(_pick(row, "minutes_asleep", "duration_minutes", "sleep_minutes"))
+        hours = round(minutes / 60, 2) if minutes is not None else None
+    return {
+        "date": parse_date(_pick(row, "date", "night", "start_date")),
+        "hours_slept": hours,
+        "quality": _pick(row, "quality", "sleep_quality"),
+        "bedtime": _pick(row, "bedtime", "start_time"),
+        "wake_time": _pick(row, "wake_time", "end_time"),
+        "notes": _pick(row, "notes")
+    }
+
+
+def _steps_from_csv(row: Row) -> Row:
+    return {
+        "date": parse_date(_pick(row, "date", "day")),
+        "steps": _number(_pick(row, "steps", "step_count")),
+        "activity_type": _pick(row, "activity_type", "activity") or "steps",
+        "duration_minutes": _number(_pick(row, "duration_minutes", "minutes")),
+        "is_whole_day": True
+    }
+
+
+def _macros_from_csv(row: Row) -> Row:
+    item = {
+        "name": _pick(row, "name", "food", "food_name", "meal") or "Imported entry",
+        "calories": _number(_pick(row, "calories", "energy_kcal", "kcal")),
+        "protein": _number(_pick(row, "protein", "protein_g")),
+        "carbs": _number(_pick(row, "carbs", "carbohydrates", "carbohydrates_g", "carbs_g")),
+        "fats": _number(_pick(row, "fats", "fat", "fat_g", "fats_g")),
+        "sodium": _number(_pick(row, "sodium", "sodium_mg"))
+    }
+    return {"date": parse_date(_pick(row, "date", "day")), "food_items": [item]}
+
+
+def _prepare_macros(entry: Row) -> Row:
+    """Resolve food_id items and fill missing totals, as the macros endpoint does."""
+    items = []
+    for item in entry.get("food_items") or []:
+        try:
+            item = resolve_food_item(item)
+        except ValueError as e:
+            raise RowError(str(e))
+        if not item.get("name") or item.get("calories") is None or item.get("protein") is None:
+            raise RowError("Food items need name, calories and protein, or a food_id")
+        items.append(item)
+    entry["food_items"] = items
+    for total, field in zip(TOTAL_FIELDS, ["calories", "protein", "carbs", "fats"]):
+        if not entry.get(total):
+            entry[total] = sum(item.get(field) or 0 for item in items)
+    return entry
+
+
+def _workouts_from_csv(rows: Iterator[Tuple[int, Row]]) -> Iterator[Tuple[int, Row]]:
+    """
+    Group one-row-per-set exports (Strong, Hevy, ...) into sessions.
+
+    Rows of a session must be adjacent, as these apps export them; only the
+    session being assembled is held in memory.
+    """
+    session: Optional[Row] = None
+    key = None
+    first_line = 0
+    for line, row in rows:
+        try:
+            started = _pick(row, "date", "start_time", "workout_date")
+            row_key = (started, _pick(row, "workout_name", "split_name", "workout", "title"))
+            if row_key != key:
+                if session is not None:
+                    yield first_line, session
+                key, first_line, session = row_key, line, None
+            if session is None:
+                session = {
+                    "date": parse_date(started),
+                    "split_name": row_key[1],
+                    "exercises": [],
+                    "notes": _pick(row, "workout_notes")
+                }
+            name = _pick(row, "exercise_name", "exercise")
+            if not name:
+                raise RowError("Missing exercise name")
+            weight = _number(_pick(row, "weight", "weight_kg", "weight_lbs"))
+            reps = _number(_pick(row, "reps"))
+            workout_set = {
+                "reps": int(reps) if reps is not None else 0,
+                "weight": weight if weight is not None else 0
+            }
+            for field in ("distance", "seconds", "rpe"):
+                value = _number(_pick(row, field))
+                if value is not None:
+                    workout_set[field] = value
+            exercises = session["exercises"]
+            if not exercises or exercises[-1]["exercise_name"] != name:
+                exercises.append({"exercise_name": name, "sets": []})
+            exercises[-1]["sets"].append(workout_set)
+        except RowError as e:
+            yield line, e
+    if session is not None:
+        yield first_line, session
+
+
+def _per_row(convert: Callable[[Row], Row]) -> Callable[[Iterator[Tuple[int, Row]]], Iterator[Tuple[int, Any]]]:
+    def records(rows):
+        for line, row in rows:
+            try:
+                yield line, convert(row)
+            except RowError as e:
+                yield line, e
+    return records
+
+
+class ImportKind(NamedTuple):
+    collection: str
+    model: Type[BaseModel]
+    # Turns parsed CSV rows into documents shaped like `model`
+    from_csv: Callable[[Iterator[Tuple[int, Row]]], Iterator[Tuple[int, Any]]]
+    # Extra checks and derived fields after model validation
+    prepare: Optional[Callable[[Row], Row]] = None
+
+
+IMPORT_KINDS: Dict[str, ImportKind] = {
+    "sleep": ImportKind("sleep", SleepEntry, _per_row(_sleep_from_csv)),
+    "macros": ImportKind("macros", MacroEntry, _per_row(_macros_from_csv), _prepare_macros),
+    "workouts": ImportKind("workout_sessions", WorkoutSession, _workouts_from_csv),
+    "steps": ImportKind("physical_activities", PhysicalActivity, _per_row(_steps_from_csv)),
+}
+
+
+def _open_text(path: str) -> io.TextIOBase:
+    """Open an upload as text, transparently un-gzipping it."""
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    raw = gzip.open(path, "rb") if gzipped else open(path, "rb")
+    return io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+
+
+def _csv_rows(f) -> Iterator[Tuple[int, Row]]:
+    reader = csv.reader(f)
+    header = [_column(name) for name in next(reader, [])]
+    for row in reader:
+        if any(value.strip() for value in row):
+            yield reader.line_num, {name: value.strip() for name, value in zip(header, row) if value.strip()}
+
+
+def _ndjson_records(f) -> Iterator[Tuple[int, Any]]:
+    for line_number, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, RowError("Invalid JSON")
+            continue
+        if not isinstance(record, dict):
+            yield line_number, RowError("Expected a JSON object")
+            continue
+        # Our own export wraps each document: {"type": "document", "data": {...}}
+        if record.get("type") == "end":
+            continue
+        if record.get("type") == "document":
+            record = record.get("data") or {}
+        yield line_number, record
+
+
+def read_documents(path: str, kind: str, file_format: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield (line number, validated document or RowError) for an uploaded file.
+
+    Args:
+        kind: Key of IMPORT_KINDS
+        file_format: "csv" or "ndjson"
+    """
+    spec = IMPORT_KINDS[kind]
+    with _open_text(path) as f:
+        records = spec.from_csv(_csv_rows(f)) if file_format == "csv" else _ndjson_records(f)
+        for line, record in records:
+            if isinstance(record, RowError):
+                yield line, record
+                continue
+            try:
+                document = spec.model(**{k: v for k, v in record.items() if v is not None}).dict(exclude={"id"})
+                if spec.prepare is not None:
+                    document = spec.prepare(document)
+            except ValidationError as e:
+                error = e.errors()[0]
+                yield line, RowError(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}")
+                continue
+            except RowError as e:
+                yield line, e
+                continue
+            yield line, document
+
+
+def _job_ref(db, user_id: str, job_id: str):
+    return db.collection("users").document(user_id).collection(IMPORT_JOBS).document(job_id)
+
+
+def create_job(db, user_id: str, kind: str, file_format: str, filename: Optional[str]) -> str:
+    """Create a queued import job document. Returns its id."""
+    now = datetime.now().isoformat()
+    ref = db.collection("users").document(user_id).collection(IMPORT_JOBS).document()
+    ref.set({
+        "kind": kind,
+        "format": file_format,
+        "filename": filename,
+        "status": "queued",
+        "processed": 0,
+        "imported": 0,
+        "failed": 0,
+        "errors": [],
+        "created_at": now,
+        "updated_at": now
+    })
+    return ref.id
+
+
+def get_job(db, user_id: str, job_id: str) -> Optional[Dict[str, Any]]:
+    doc = _job_ref(db, user_id, job_id).get()
+    return {"id": doc.id, **doc.to_dict()} if doc.exists else None
+
+
+def run_import(db, user_id: str, job_id: str, path: str, kind: str, file_format: str) -> None:
+    """
+    Import an uploaded file, updating the job document after every batch.
+    Deletes the file when done. Runs in a worker thread (background task).
+    """
+    job_ref = _job_ref(db, user_id, job_id)
+    collection_ref = db.collection("users").document(user_id).collection(IMPORT_KINDS[kind].collection)
+    progress = {"processed": 0, "imported": 0, "failed": 0}
+    errors = []
+    batch, pending = db.batch(), 0
+    committed = False
+    succeeded = False
+
+    def commit():
+        nonlocal committed
+        batch.commit()
+        committed = True
+        job_ref.update({**progress, "errors": errors, "updated_at": datetime.now().isoformat()})
+
+    try:
+        job_ref.update({"status": "running", "started_at": datetime.now().isoformat()})
+        for line, document in read_documents(path, kind, file_format):
+            progress["processed"] += 1
+            if isinstance(document, RowError):
+                progress["failed"] += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line, "error": str(document)})
+                continue
+            now = datetime.now().isoformat()
+            batch.set(collection_ref.document(), {**document, "created_at": now, "updated_at": now})
+            pending += 1
+            progress["imported"] += 1
+            if pending >= BATCH_SIZE:
+                commit()
+                batch, pending = db.batch(), 0
+        commit()
+        succeeded = True
+    except Exception as e:
+        logger.warning("Import %s failed: %s", job_id, e, exc_info=True)
+        job_ref.update({**progress, "errors": errors, "status": "failed", "error": str(e),
+                        "updated_at": datetime.now().isoformat()})
+    finally:
+        os.remove(path)
+        # Batches committed before a failure stay imported, so their rollups and indexes are refreshed too
+        if committed:
+            _refresh_derived(db, user_id, job_id, kind, job_ref if succeeded else None)
+
+
+def _refresh_derived(db, user_id: str, job_id: str, kind: str, job_ref=None) -> None:
+    """
+    Rebuild rollups and drop cached indexes after imported rows were committed.
+
+    Args:
+        job_ref: Job to move through rebuilding to completed (None if the import already failed)
+    """
+    try:
+        if job_ref is not None:
+            job_ref.update({"status": "rebuilding"})
+        if kind == "macros":
+            rebuild_daily_totals(db, user_id)
+        exercise_index.invalidate(user_id)
+        notes_index.invalidate(user_id)
+        if job_ref is not None:
+            job_ref.update({"status": "completed", "completed_at": datetime.now().isoformat()})
+    except Exception as e:
+        logger.warning("Refreshing derived data after import %s failed: %s", job_id, e, exc_info=True)
+        if job_ref is not None:
+            job_ref.update({"status": "failed", "error": str(e), "updated_at": datetime.now().isoformat()})
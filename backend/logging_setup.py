@@ -0,0 +1,247 @@
+"""
+Logging setup
+Structured JSON logs written off the request path: loggers hand records to a
+bounded in-process queue and a listener thread formats and writes them.
+Every record carries the id of the request it was logged in, repeated
+warnings and errors are sampled, and levels are configurable per module.
+
+Environment:
+    LOG_LEVEL: Root level (default INFO)
+    LOG_LEVELS: Per-logger levels, e.g. "auth=ERROR,routers.ai_analysis=DEBUG,uvicorn.access=INFO"
+    LOG_FORMAT: "json" (default) or "text" for local development
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+# Records waiting for the listener thread; further records are dropped and counted
+LOG_QUEUE_SIZE = 10000
+
+# Each distinct warning/error message is logged this many times per window, then sampled
+SAMPLE_BURST = 10
+SAMPLE_WINDOW_SECONDS = 60.0
+# After the burst, one in this many repeats is logged (with the number suppressed)
+SAMPLE_EVERY = 100
+# Distinct messages tracked for sampling
+MAX_SAMPLE_KEYS = 1000
+
+REQUEST_ID_HEADER = b"x-request-id"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Attributes every LogRecord has; anything else was passed with `extra=` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id while still on the logging thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass the first SAMPLE_BURST occurrences of each warning/error message
+    template per window, then one in SAMPLE_EVERY, noting how many were
+    suppressed in between.
+    """
+
+    def __init__(self, burst: int = SAMPLE_BURST, window_seconds: float = SAMPLE_WINDOW_SECONDS,
+                 every: int = SAMPLE_EVERY):
+        super().__init__()
+        self.burst = burst
+        self.window_seconds = window_seconds
+        self.every = every
+        # (logger, level, template) -> [window start, count in window, suppressed since last passed]
+        self._counts: Dict[Tuple[str, int, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._counts.get(key)
+            if state is None or now - state[0] >= self.window_seconds:
+                if state is None and len(self._counts) >= MAX_SAMPLE_KEYS:
+                    self._counts.clear()
+                suppressed = state[2] if state else 0
+                self._counts[key] = [now, 1, 0]
+            else:
+                state[1] += 1
+                if state[1] <= self.burst or (state[1] - self.burst) % self.every == 0:
+                    suppressed, state[2] = state[2], 0
+                else:
+                    state[2] += 1
+                    return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id and extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue records as they are; the queue stays in this process, so nothing has to be pickled."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message now, while its arguments still hold their current values;
+        # tracebacks are formatted later on the listener thread
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            note = logging.LogRecord(logger.name, logging.WARNING, __file__, 0,
+                                     "Dropped %d log records while the log queue was full", (dropped,), None)
+            try:
+                self.queue.put_nowait(self.prepare(note))
+            except queue.Full:
+                self.dropped += dropped
+
+
+def _parse_levels(value: str) -> Dict[str, str]:
+    levels = {}
+    for part in value.split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging() -> None:
+    """Route all logging through the queue handler. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    else:
+        stream.setFormatter(JsonFormatter())
+
+    handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    # uvicorn's own handlers would write unstructured lines; its access log is replaced by ours
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+
+    for name, level in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving every request an id, taken from a well-formed
+    X-Request-ID header or generated, echoed in the response and attached to
+    every record logged while handling it. Logs one access line per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                candidate = value.decode("latin-1")
+                request_id = candidate if _VALID_REQUEST_ID.match(candidate) else None
+                break
+        request_id = request_id or uuid.uuid4().hex
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (REQUEST_ID_HEADER, request_id.encode())]}
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if access_logger.isEnabledFor(logging.INFO):
+                access_logger.info("%s %s %d", scope["method"], scope["path"], status["code"], extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(scope.get("route"), "path", None),
+                    "status": status["code"],
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+                })
+            request_id_var.reset(token)
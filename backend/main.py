@@ -1,15 +1,28 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
-from routers import exercises, splits, workout_sessions, physical_activities, macros, stress, body_feelings, wellness_survey, sleep, hydration, ai_analysis, user_profile
-import db
 
 load_dotenv()
 
+from logging_setup import configure_logging, shutdown_logging, RequestIdMiddleware
+# Before the other imports, so messages logged while they load (Firebase init) are structured too
+configure_logging()
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from routers import exercises, splits, workout_sessions, physical_activities, macros, stress, body_feelings, wellness_survey, sleep, hydration, ai_analysis, user_profile, admin, foods, sync, events, export, imports, metrics as metrics_router
+from ai_analysis.llm_client import llm_clients
+from exercise_catalog import get_catalog
+from foods import get_food_database
+from events import change_broker
+from metrics import MetricsMiddleware, mark_worker_dead
+from profiling import ProfilingMiddleware
+import db
+
 app = FastAPI()
 
 cors_origins = os.getenv("CORS_ALLOWED_ORIGINS", "*").split(",")
+# Added first so it runs innermost, inside CORS
+app.add_middleware(ProfilingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -17,6 +30,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Outermost, so the request id is set for everything below
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(exercises.router)
 app.include_router(splits.router)
@@ -30,6 +46,46 @@ app.include_router(sleep.router)
 app.include_router(hydration.router)
 app.include_router(ai_analysis.router)
 app.include_router(user_profile.router)
+app.include_router(admin.router)
+app.include_router(foods.router)
+app.include_router(sync.router)
+app.include_router(events.router)
+app.include_router(export.router)
+app.include_router(imports.router)
+app.include_router(metrics_router.router)
+
+@app.on_event("startup")
+async def create_llm_clients():
+    # Build the shared OpenAI client once so requests reuse its connection pool
+    llm_clients.get()
+
+@app.on_event("startup")
+async def load_reference_data():
+    # Compile/map the bundled exercise catalog and food database before the first request needs them
+    get_catalog()
+    get_food_database()
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    llm_clients.close()
+
+@app.on_event("shutdown")
+async def flush_coalesced_writes():
+    # Write hydration taps still inside their coalescing window
+    hydration.hydration_writes.flush_all()
+
+@app.on_event("shutdown")
+async def close_change_broker():
+    change_broker.close()
+
+@app.on_event("shutdown")
+async def release_worker_metrics():
+    mark_worker_dead()
+
+@app.on_event("shutdown")
+async def flush_logs():
+    # Registered last, so records logged by the other shutdown handlers are written too
+    shutdown_logging()
 
 @app.get("/")
 async def root():
@@ -0,0 +1,501 @@
+"""
+In-memory Firestore
+A thread-safe stand-in for the Firestore client covering the API surface the
+backend uses (documents, collections, queries with where/order_by/limit/
+start_after/select, collection groups, batches, transactions, Increment), with
+optional per-call latency injection. Selected with DB_BACKEND=memory for
+offline benchmarks and local runs; nothing is persisted.
+"""
+
+import copy
+import functools
+import random
+import string
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from google.api_core.exceptions import AlreadyExists, Aborted, NotFound
+from google.cloud.firestore_v1.transforms import Increment, Sentinel, DELETE_FIELD, SERVER_TIMESTAMP
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+# Firestore orders values of different types by type first
+_TYPE_RANK = [(type(None), 0), (bool, 1), (int, 2), (float, 2), (str, 4), (bytes, 5), (list, 7), (dict, 8)]
+
+
+def _random_id() -> str:
+    return "".join(random.choices(_ID_ALPHABET, k=20))
+
+
+def _type_rank(value: Any) -> int:
+    for kind, rank in _TYPE_RANK:
+        if isinstance(value, kind):
+            return rank
+    return 3  # datetimes sort between numbers and strings
+
+
+def _compare(a: Any, b: Any) -> int:
+    rank_a, rank_b = _type_rank(a), _type_rank(b)
+    if rank_a != rank_b:
+        return -1 if rank_a < rank_b else 1
+    if a is None or a == b:
+        return 0
+    try:
+        return -1 if a < b else 1
+    except TypeError:
+        return -1 if str(a) < str(b) else 1
+
+
+_MISSING = object()
+
+
+def _get_field(data: Dict[str, Any], path: str) -> Any:
+    value: Any = data
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _apply_value(target: Dict[str, Any], key: str, value: Any) -> None:
+    if value is DELETE_FIELD:
+        target.pop(key, None)
+    elif isinstance(value, Increment):
+        current = target.get(key)
+        target[key] = (current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0) + value.value
+    elif value is SERVER_TIMESTAMP:
+        from datetime import datetime, timezone
+        target[key] = datetime.now(timezone.utc)
+    elif isinstance(value, Sentinel):
+        raise ValueError(f"Unsupported sentinel: {value}")
+    else:
+        target[key] = copy.deepcopy(value)
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]) -> None:
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        elif isinstance(value, dict):
+            target[key] = {}
+            _merge(target[key], value)
+        else:
+            _apply_value(target, key, value)
+
+
+def _set_path(target: Dict[str, Any], path: str, value: Any) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+    _apply_value(target, parts[-1], value)
+
+
+class DocumentSnapshot:
+    def __init__(self, reference: "DocumentReference", data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path: str) -> Any:
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class DocumentReference:
+    def __init__(self, client: "MemoryClient", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> "CollectionReference":
+        return CollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id: str) -> "CollectionReference":
+        return CollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths: Optional[List[str]] = None, transaction: Optional["Transaction"] = None) -> DocumentSnapshot:
+        self._client._rpc()
+        with self._client._lock:
+            data, version = self._client._read(self.path)
+        if transaction is not None:
+            transaction._reads[self.path] = version
+        if data is not None and field_paths is not None:
+            data = {field: data[field] for field in field_paths if field in data}
+        return DocumentSnapshot(self, data)
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False) -> None:
+        self._client._commit([("set", self, document_data, merge)])
+
+    def create(self, document_data: Dict[str, Any]) -> None:
+        self._client._commit([("create", self, document_data, False)])
+
+    def update(self, field_updates: Dict[str, Any]) -> None:
+        self._client._commit([("update", self, field_updates, False)])
+
+    def delete(self) -> None:
+        self._client._commit([("delete", self, None, False)])
+
+
+class Query:
+    def __init__(self, client: "MemoryClient", path: str, group: bool = False, filters=(), orders=(),
+                 limit: Optional[int] = None, cursor: Optional[Tuple[Any, bool]] = None, fields=None):
+        self._client = client
+        self._path = path
+        self._group = group
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **changes) -> "Query":
+        state = {
+            "group": self._group, "filters": self._filters, "orders": self._orders,
+            "limit": self._limit, "cursor": self._cursor, "fields": self._fields
+        }
+        state.update(changes)
+        return Query(self._client, self._path, **state)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None,
+              filter=None) -> "Query":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "Query":
+        return self._copy(orders=self._orders + [(field_path, direction == "DESCENDING")])
+
+    def limit(self, count: int) -> "Query":
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields_or_snapshot) -> "Query":
+        return self._copy(cursor=(document_fields_or_snapshot, False))
+
+    def start_at(self, document_fields_or_snapshot) -> "Query":
+        return self._copy(cursor=(document_fields_or_snapshot, True))
+
+    def select(self, field_paths: List[str]) -> "Query":
+        return self._copy(fields=list(field_paths))
+
+    @staticmethod
+    def _matches(data: Dict[str, Any], doc_id: str, field: str, op: str, value: Any) -> bool:
+        actual = doc_id if field == "__name__" else _get_field(data, field)
+        if op == "array_contains":
+            return isinstance(actual, list) and value in actual
+        if op == "array_contains_any":
+            return isinstance(actual, list) and any(item in actual for item in value)
+        if actual is _MISSING:
+            return False
+        if op == "==":
+            return _compare(actual, value) == 0
+        if op == "!=":
+            return actual is not None and _compare(actual, value) != 0
+        if op == "in":
+            return any(_compare(actual, item) == 0 for item in value)
+        if op == "not-in":
+            return actual is not None and all(_compare(actual, item) != 0 for item in value)
+        if _type_rank(actual) != _type_rank(value):
+            # Range filters only match values of the same type
+            return False
+        result = _compare(actual, value)
+        return {"<": result < 0, "<=": result <= 0, ">": result > 0, ">=": result >= 0}[op]
+
+    def _order_keys(self) -> List[Tuple[str, bool]]:
+        orders = list(self._orders)
+        if not any(field == "__name__" for field, _ in orders):
+            orders.append(("__name__", orders[-1][1] if orders else False))
+        return orders
+
+    def _cursor_values(self, orders: List[Tuple[str, bool]]) -> List[Any]:
+        cursor = self._cursor[0]
+        if isinstance(cursor, DocumentSnapshot):
+            data = cursor._data or {}
+            return [cursor.id if field == "__name__" else _get_field(data, field) for field, _ in orders]
+        values = []
+        for field, _ in orders:
+            if field not in cursor:
+                break
+            value = cursor[field]
+            values.append(value.rsplit("/", 1)[-1] if field == "__name__" and isinstance(value, str) else value)
+        return values
+
+    def stream(self, transaction: Optional["Transaction"] = None) -> Iterator[DocumentSnapshot]:
+        self._client._rpc()
+        with self._client._lock:
+            docs = [
+                (path, copy.deepcopy(data))
+                for path, data in self._client._scan(self._path, self._group)
+            ]
+
+        orders = self._order_keys()
+        results = []
+        for path, data in docs:
+            doc_id = path.rsplit("/", 1)[-1]
+            if not all(self._matches(data, doc_id, field, op, value) for field, op, value in self._filters):
+                continue
+            # Documents without an ordered field are left out, as in Firestore
+            if any(field != "__name__" and _get_field(data, field) is _MISSING for field, _ in orders):
+                continue
+            results.append((path, doc_id, data))
+
+        def key_values(item):
+            _, doc_id, data = item
+            return [doc_id if field == "__name__" else _get_field(data, field) for field, _ in orders]
+
+        def compare_values(a: List[Any], b: List[Any]) -> int:
+            for (_, descending), left, right in zip(orders, a, b):
+                result = _compare(left, right)
+                if result:
+                    return -result if descending else result
+            return 0
+
+        results.sort(key=functools.cmp_to_key(lambda a, b: compare_values(key_values(a), key_values(b))))
+        if self._cursor is not None:
+            cursor = self._cursor_values(orders)
+            inclusive = self._cursor[1]
+            results = [
+                item for item in results
+                if (lambda result: result >= 0 if inclusive else result > 0)(
+                    compare_values(key_values(item)[:len(cursor)], cursor))
+            ]
+        if self._limit is not None:
+            results = results[:self._limit]
+
+        for path, _, data in results:
+            if self._fields is not None:
+                projected: Dict[str, Any] = {}
+                for field in self._fields:
+                    value = _get_field(data, field)
+                    if value is not _MISSING:
+                        _set_path(projected, field, value)
+                data = projected
+            if transaction is not None:
+                transaction._reads[path] = self._client._versions.get(path, 0)
+            yield DocumentSnapshot(DocumentReference(self._client, path), data)
+
+    def get(self, transaction: Optional["Transaction"] = None) -> List[DocumentSnapshot]:
+        return list(self.stream(transaction=transaction))
+
+
+class CollectionReference(Query):
+    def __init__(self, client: "MemoryClient", path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> Optional[DocumentReference]:
+        return DocumentReference(self._client, self._path.rsplit("/", 1)[0]) if "/" in self._path else None
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._client, f"{self._path}/{document_id or _random_id()}")
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return time.time(), ref
+
+    def list_documents(self) -> Iterator[DocumentReference]:
+        """Documents in this collection, including ones that only have subcollections."""
+        self._client._rpc()
+        prefix = self._path + "/"
+        with self._client._lock:
+            ids = {
+                path[len(prefix):].split("/", 1)[0]
+                for path in self._client._docs if path.startswith(prefix)
+            }
+        for doc_id in sorted(ids):
+            yield self.document(doc_id)
+
+
+class WriteBatch:
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+        self._writes: List[tuple] = []
+
+    def set(self, reference: DocumentReference, document_data: Dict[str, Any], merge: bool = False) -> None:
+        self._writes.append(("set", reference, document_data, merge))
+
+    def create(self, reference: DocumentReference, document_data: Dict[str, Any]) -> None:
+        self._writes.append(("create", reference, document_data, False))
+
+    def update(self, reference: DocumentReference, field_updates: Dict[str, Any]) -> None:
+        self._writes.append(("update", reference, field_updates, False))
+
+    def delete(self, reference: DocumentReference) -> None:
+        self._writes.append(("delete", reference, None, False))
+
+    def commit(self) -> list:
+        writes, self._writes = self._writes, []
+        self._client._commit(writes)
+        return []
+
+
+class Transaction(WriteBatch):
+    """
+    Optimistic transaction: commit aborts if a document read in it changed since,
+    and `firestore.transactional` retries the function, as with the real client.
+    """
+
+    def __init__(self, client: "MemoryClient", max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._reads: Dict[str, int] = {}
+        self._id: Optional[bytes] = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _begin(self, retry_id: Optional[bytes] = None) -> None:
+        self._id = _random_id().encode()
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._reads = {}
+        self._id = None
+
+    def _rollback(self) -> None:
+        self._clean_up()
+
+    def _commit(self) -> list:
+        try:
+            self._client._commit(self._writes, expected_versions=self._reads)
+        finally:
+            self._clean_up()
+        return []
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, DocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        return ref_or_query.stream(transaction=self)
+
+
+class MemoryClient:
+    """
+    In-memory replacement for `firestore.Client`.
+
+    Args:
+        latency_ms: Delay added to every read, query and commit, to approximate network round trips
+        jitter_ms: Random extra delay, uniformly distributed up to this value
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._lock = threading.RLock()
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        # Collection path -> document ids, so queries don't scan the whole database
+        self._collections: Dict[str, set] = {}
+        self._versions: Dict[str, int] = {}
+        self.calls = 0
+
+    def _rpc(self) -> None:
+        self.calls += 1
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _read(self, path: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        data = self._docs.get(path)
+        return copy.deepcopy(data), self._versions.get(path, 0)
+
+    def _scan(self, path: str, group: bool) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        if group:
+            collections = [col for col in self._collections if col.rsplit("/", 1)[-1] == path]
+        else:
+            collections = [path]
+        for collection in collections:
+            for doc_id in self._collections.get(collection, ()):
+                doc_path = f"{collection}/{doc_id}"
+                yield doc_path, self._docs[doc_path]
+
+    def _store(self, path: str, data: Optional[Dict[str, Any]]) -> None:
+        collection, doc_id = path.rsplit("/", 1)
+        if data is None:
+            self._docs.pop(path, None)
+            ids = self._collections.get(collection)
+            if ids is not None:
+                ids.discard(doc_id)
+        else:
+            self._docs[path] = data
+            self._collections.setdefault(collection, set()).add(doc_id)
+        self._versions[path] = self._versions.get(path, 0) + 1
+
+    def _commit(self, writes: List[tuple], expected_versions: Optional[Dict[str, int]] = None) -> None:
+        """Apply writes atomically: validate all of them first, then store."""
+        self._rpc()
+        with self._lock:
+            for path, version in (expected_versions or {}).items():
+                if self._versions.get(path, 0) != version:
+                    raise Aborted(f"Transaction conflict on {path}")
+            staged: Dict[str, Optional[Dict[str, Any]]] = {}
+            for op, ref, data, merge in writes:
+                current = staged[ref.path] if ref.path in staged else self._docs.get(ref.path)
+                if op == "create":
+                    if current is not None:
+                        raise AlreadyExists(f"Document already exists: {ref.path}")
+                    new: Optional[Dict[str, Any]] = {}
+                    _merge(new, data)
+                elif op == "set":
+                    new = copy.deepcopy(current) if merge and current is not None else {}
+                    _merge(new, data)
+                elif op == "update":
+                    if current is None:
+                        raise NotFound(f"No document to update: {ref.path}")
+                    new = copy.deepcopy(current)
+                    for field, value in data.items():
+                        _set_path(new, field, value)
+                else:
+                    new = None
+                staged[ref.path] = new
+            for path, data in staged.items():
+                self._store(path, data)
+
+    def collection(self, collection_id: str) -> CollectionReference:
+        return CollectionReference(self, collection_id)
+
+    def collection_group(self, collection_id: str) -> Query:
+        return Query(self, collection_id, group=True)
+
+    def document(self, document_path: str) -> DocumentReference:
+        return DocumentReference(self, document_path)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> Transaction:
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references: List[DocumentReference], field_paths: Optional[List[str]] = None,
+                transaction: Optional[Transaction] = None) -> Iterator[DocumentSnapshot]:
+        self._rpc()
+        for reference in references:
+            with self._lock:
+                data, version = self._read(reference.path)
+            if transaction is not None:
+                transaction._reads[reference.path] = version
+            if data is not None and field_paths is not None:
+                data = {field: data[field] for field in field_paths if field in data}
+            yield DocumentSnapshot(reference, data)
+
+    def clear(self) -> None:
+        """Delete everything (between benchmark runs)."""
+        with self._lock:
+            self._docs.clear()
+            self._collections.clear()
+            self._versions.clear()
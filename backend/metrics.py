@@ -0,0 +1,256 @@
+"""
+Prometheus metrics
+Request latency by route and status, in-flight requests, Firestore operation
+latency by collection and operation, cache lookups, auth verification time and
+LLM call latency and tokens, exposed at /metrics.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory (wiped on every deploy) before starting the server: each worker then
+writes its samples to files there and /metrics aggregates all workers. It is
+read when prometheus_client is imported, so set it in the environment rather
+than in .env.
+"""
+
+import contextvars
+import os
+import time
+from typing import Any, Callable, Dict, Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+from profiling import span
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Seconds; Firestore and cache-backed routes are mostly under 100 ms, LLM routes take seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Batches writing more collections than this are labelled "mixed"
+MAX_BATCH_LABEL_COLLECTIONS = 3
+
+OPERATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled", ["method"], multiprocess_mode="livesum")
+
+FIRESTORE_OPERATION_SECONDS = Histogram(
+    "firestore_operation_duration_seconds", "Firestore reads, queries and commits by collection",
+    ["collection", "operation"], buckets=OPERATION_BUCKETS)
+FIRESTORE_ERRORS = Counter(
+    "firestore_operation_errors_total", "Firestore operations that raised", ["collection", "operation"])
+
+CACHE_LOOKUPS = Counter("cache_lookups_total", "In-process cache lookups", ["cache", "result"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "In-process cache LRU evictions", ["cache"])
+
+AUTH_VERIFY_SECONDS = Histogram(
+    "auth_verify_duration_seconds", "Firebase ID token verification time", ["result"], buckets=OPERATION_BUCKETS)
+
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds", "LLM completion latency including rate-limit queueing and failover",
+    ["model", "call_type", "status"], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens used", ["model", "call_type", "kind"])
+
+
+def render_metrics() -> tuple:
+    """
+    Serialize all metrics, aggregated across workers in multiprocess mode.
+
+    Returns:
+        Tuple of (body bytes, content type)
+    """
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead() -> None:
+    """Drop this worker's live gauges from the multiprocess files on shutdown."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request under its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        response = {"status": 500, "stream": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["stream"] = any(name == b"content-type" and value.startswith(b"text/event-stream")
+                                         for name, value in message.get("headers", ()))
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            # Event streams stay open for as long as the client is connected
+            if not response["stream"]:
+                HTTP_REQUEST_SECONDS.labels(method, getattr(route, "path", "unmatched"),
+                                            str(response["status"])).observe(time.perf_counter() - started)
+
+
+def observe_llm_call(entry: Dict[str, Any]) -> None:
+    """Record one usage-ledger entry of FitnessAICoach."""
+    model = entry.get("model") or "none"
+    call_type = entry.get("call_type") or "unknown"
+    LLM_REQUEST_SECONDS.labels(model, call_type, entry.get("status", "error")).observe(entry.get("latency_ms", 0) / 1000)
+    for kind in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+        if entry.get(kind):
+            LLM_TOKENS.labels(model, call_type, kind[:-len("_tokens")]).inc(entry[kind])
+
+
+# Set while an instrumented Firestore call runs, so the commit a document write makes internally is not counted twice
+_in_operation: contextvars.ContextVar[bool] = contextvars.ContextVar("firestore_operation", default=False)
+
+
+def _collection_of(path: str) -> str:
+    """Collection id of a document path ("users/u/macros/x" -> "macros")."""
+    parts = path.strip("/").split("/")
+    return parts[-2] if len(parts) >= 2 else parts[0]
+
+
+def _batch_label(collections: set) -> str:
+    # Bulk writes (imports, backfills) touch many collections; keep their label set bounded
+    if len(collections) > MAX_BATCH_LABEL_COLLECTIONS:
+        return "mixed"
+    return ",".join(sorted(collections)) or "none"
+
+
+def _timed(method: Callable, operation: str, collection: Callable[[Any], str]) -> Callable:
+    def wrapper(self, *args, **kwargs):
+        if _in_operation.get():
+            return method(self, *args, **kwargs)
+        token = _in_operation.set(True)
+        started = time.perf_counter()
+        label = collection(self)
+        try:
+            with span(f"firestore.{operation}", collection=label):
+                return method(self, *args, **kwargs)
+        except Exception:
+            FIRESTORE_ERRORS.labels(label, operation).inc()
+            raise
+        finally:
+            _in_operation.reset(token)
+            FIRESTORE_OPERATION_SECONDS.labels(label, operation).observe(time.perf_counter() - started)
+
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+class _TimedStream:
+    """Iterator over query results that records the query once it is consumed."""
+
+    def __init__(self, stream: Iterator, collection: str):
+        self._stream = stream
+        self._collection = collection
+        self._started = time.perf_counter()
+        self._done = False
+        self._span = span("firestore.query", collection=collection).__enter__()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except StopIteration:
+            self._finish()
+            raise
+        except Exception:
+            FIRESTORE_ERRORS.labels(self._collection, "query").inc()
+            self._finish()
+            raise
+
+    def _finish(self) -> None:
+        if not self._done:
+            self._done = True
+            self._span.__exit__(None, None, None)
+            FIRESTORE_OPERATION_SECONDS.labels(self._collection, "query").observe(time.perf_counter() - self._started)
+
+    def close(self) -> None:
+        self._finish()
+        close = getattr(self._stream, "close", None)
+        if close:
+            close()
+
+    def __getattr__(self, name: str) -> Any:
+        # e.g. get_explain_metrics() of the client library's StreamGenerator
+        return getattr(self._stream, name)
+
+
+def _timed_stream(method: Callable, collection: Callable[[Any], str]) -> Callable:
+    def wrapper(self, *args, **kwargs):
+        return _TimedStream(method(self, *args, **kwargs), collection(self))
+
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+def _patch(cls, name: str, wrapper: Callable) -> None:
+    if not hasattr(getattr(cls, name), "__wrapped__"):
+        setattr(cls, name, wrapper)
+
+
+def instrument_firestore(client) -> None:
+    """
+    Time the Firestore calls made through `client`'s document, query, batch and
+    transaction classes. Safe to call more than once.
+    """
+    if type(client).__module__ == "memory_firestore":
+        import memory_firestore as module
+
+        def document_collection(ref):
+            return _collection_of(ref.path)
+
+        def query_collection(query):
+            return query._path.rsplit("/", 1)[-1]
+
+        def batch_collection(batch):
+            return _batch_label({_collection_of(write[1].path) for write in batch._writes})
+    else:
+        from google.cloud.firestore_v1 import batch as batch_module, document, query, transaction
+
+        class module:
+            DocumentReference = document.DocumentReference
+            Query = query.Query
+            WriteBatch = batch_module.WriteBatch
+            Transaction = transaction.Transaction
+
+        def document_collection(ref):
+            return ref._path[-2]
+
+        def query_collection(query):
+            return query._parent.id
+
+        def batch_collection(batch):
+            names = {write.delete or write.update.name or write.transform.document for write in batch._write_pbs}
+            return _batch_label({_collection_of(name) for name in names})
+
+    for operation in ("get", "set", "create", "update", "delete"):
+        _patch(module.DocumentReference, operation,
+               _timed(getattr(module.DocumentReference, operation), operation, document_collection))
+    _patch(module.Query, "stream", _timed_stream(module.Query.stream, query_collection))
+    _patch(module.WriteBatch, "commit", _timed(module.WriteBatch.commit, "batch_commit", batch_collection))
+    _patch(module.Transaction, "_commit", _timed(module.Transaction._commit, "transaction_commit", batch_collection))
+
@@ -1,7 +1,10 @@
 from typing import Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from enum import Enum
 
+# Dates that key per-day documents (nutrition_daily/{date}, hydration_daily/{date})
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
 class WorkoutType(str, Enum):
     CARDIO = "cardio"
     STRENGTH = "strength"
@@ -13,6 +16,7 @@ class Exercise(BaseModel):
     type: WorkoutType
     muscle_group: Optional[str] = None
     is_custom: bool = False
+    catalog_id: Optional[str] = None
 
 class WorkoutSplit(BaseModel):
     id: Optional[str] = None
@@ -37,16 +41,21 @@ class PhysicalActivity(BaseModel):
     intensity_level: Optional[int] = None
 
 class FoodItem(BaseModel):
-    name: str
-    calories: float
-    protein: float
+    # name, calories and protein are required unless food_id is set, in which
+    # case the server fills nutrients from the food database
+    name: Optional[str] = None
+    calories: Optional[float] = None
+    protein: Optional[float] = None
     carbs: Optional[float] = None
     fats: Optional[float] = None
     sodium: Optional[float] = None
+    food_id: Optional[str] = None
+    servings: Optional[float] = None
+    grams: Optional[float] = None
 
 class MacroEntry(BaseModel):
     id: Optional[str] = None
-    date: str
+    date: str = Field(..., pattern=DATE_PATTERN)
     food_items: List[FoodItem]
     total_calories: Optional[float] = None
     total_protein: Optional[float] = None
@@ -84,15 +93,20 @@ class SleepEntry(BaseModel):
 
 class HydrationEntry(BaseModel):
     id: Optional[str] = None
-    date: str
+    date: str = Field(..., pattern=DATE_PATTERN)
     amount_cups: float
     notes: Optional[str] = None
 
+class HydrationIncrement(BaseModel):
+    date: str = Field(..., pattern=DATE_PATTERN)
+    amount_cups: float = Field(1.0, gt=0, le=20)
+
 class AIAnalysis(BaseModel):
     id: Optional[str] = None
     user_id: str
     year: int
     month: int
+    period: Optional[int] = None
     analysis: str
     model: Optional[str] = None
     tokens_used: Optional[int] = None
@@ -0,0 +1,143 @@
+"""
+Packed tables
+Read-only tables of bundled reference data compiled to a compact binary file
+(fixed-width rows plus a string heap) and memory-mapped, so every worker on a
+host shares one copy of the pages instead of holding its own Python objects.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PKT1"
+
+# Field type -> struct code. Strings are stored as (heap offset, byte length).
+FIELD_CODES = {"str": "IH", "int": "i", "float": "f", "bool": "?"}
+
+
+class PackedTable:
+    """Row-addressable view over a compiled table."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        if bytes(buffer[:4]) != MAGIC:
+            raise ValueError("Not a packed table")
+        header_length = struct.unpack_from("<I", buffer, 4)[0]
+        header = json.loads(bytes(buffer[8:8 + header_length]))
+        self.fields: List[Tuple[str, str]] = [tuple(field) for field in header["fields"]]
+        self.rows: int = header["rows"]
+        self.checksum: str = header["checksum"]
+        self._row = struct.Struct("<" + "".join(FIELD_CODES[kind] for _, kind in self.fields))
+        self._rows_start = 8 + header_length
+        self._heap_start = self._rows_start + self._row.size * self.rows
+
+    @classmethod
+    def open(cls, path: str) -> "PackedTable":
+        """Memory-map a compiled table file."""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """Decode one row into a dict."""
+        if not 0 <= index < self.rows:
+            raise IndexError(index)
+        values = iter(self._row.unpack_from(self._buffer, self._rows_start + index * self._row.size))
+        row = {}
+        for name, kind in self.fields:
+            if kind == "str":
+                offset, length = next(values), next(values)
+                start = self._heap_start + offset
+                row[name] = bytes(self._buffer[start:start + length]).decode()
+            else:
+                row[name] = next(values)
+        return row
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(self.rows):
+            yield self.row(index)
+
+    def __len__(self) -> int:
+        return self.rows
+
+
+def pack(fields: List[Tuple[str, str]], rows: Iterable[Dict[str, Any]]) -> bytes:
+    """
+    Serialize rows into the packed table format.
+
+    Args:
+        fields: (name, type) pairs; types are the keys of FIELD_CODES
+        rows: Dicts holding every field (missing strings become "", numbers 0)
+
+    Returns:
+        The compiled table
+    """
+    row_struct = struct.Struct("<" + "".join(FIELD_CODES[kind] for _, kind in fields))
+    heap = bytearray()
+    strings: Dict[bytes, int] = {}
+    packed_rows = bytearray()
+    count = 0
+    for row in rows:
+        values = []
+        for name, kind in fields:
+            value = row.get(name)
+            if kind == "str":
+                encoded = (value or "").encode()
+                # Repeated strings (muscle groups, categories) are stored once
+                if encoded not in strings:
+                    strings[encoded] = len(heap)
+                    heap.extend(encoded)
+                values.extend((strings[encoded], len(encoded)))
+            elif kind == "bool":
+                values.append(bool(value))
+            else:
+                values.append(value or 0)
+        packed_rows.extend(row_struct.pack(*values))
+        count += 1
+
+    body = bytes(packed_rows) + bytes(heap)
+    header = json.dumps({
+        "fields": fields,
+        "rows": count,
+        "checksum": hashlib.sha256(body).hexdigest()[:16]
+    }).encode()
+    return MAGIC + struct.pack("<I", len(header)) + header + body
+
+
+def load_compiled(source_path: str, compiled_path: str, compile_rows: Callable[[str], Tuple[list, Iterable]]) -> PackedTable:
+    """
+    Open a compiled table, (re)compiling it first if the source is newer.
+
+    Workers racing to compile each write a temp file and atomically rename it,
+    so readers always see a complete file. If the compiled path is not
+    writable the table is built in memory instead.
+
+    Args:
+        source_path: Bundled source data (JSON, CSV)
+        compiled_path: Where the compiled table is cached
+        compile_rows: Reads source_path and returns (fields, rows) for pack()
+    """
+    try:
+        if os.path.getmtime(compiled_path) >= os.path.getmtime(source_path):
+            return PackedTable.open(compiled_path)
+    except (OSError, ValueError):
+        pass
+
+    data = pack(*compile_rows(source_path))
+    try:
+        directory = os.path.dirname(compiled_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, compiled_path)
+        return PackedTable.open(compiled_path)
+    except OSError as e:
+        logger.warning("Could not write %s, keeping table in memory: %s", compiled_path, e)
+        return PackedTable(memoryview(data))
@@ -0,0 +1,362 @@
+"""
+Request profiling
+Runs a single request under a sampling profiler when an admin asks for it with
+an `X-Profile: 1` header or `?profile=1`. Records folded stacks (flamegraph.pl,
+speedscope) and a span breakdown of the request's Firestore calls, analyzer
+summaries, completion calls and response serialization, and stores them under
+var/profiles for retrieval through the admin API.
+
+Unprofiled requests pay one header scan in the middleware and one context
+variable lookup per span.
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(__file__), "var", "profiles")
+
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+# Profiles kept on disk; the oldest are deleted first
+MAX_STORED_PROFILES = 200
+
+# Spans recorded per profile; further spans are only counted
+MAX_SPANS = 5000
+
+# Stack depth kept per sample, counted from the innermost frame
+MAX_STACK_DEPTH = 128
+
+
+class RequestProfile:
+    """Spans and stack samples of one profiled request."""
+
+    def __init__(self, method: str, path: str, admin_id: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.admin_id = admin_id
+        self.created_at = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped_spans = 0
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        # Thread id -> number of open spans on it; only these threads are sampled
+        self.threads: Dict[int, int] = {}
+        self.loop_thread: Optional[int] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def enter_thread(self) -> int:
+        thread_id = threading.get_ident()
+        with self._lock:
+            depth = self.threads.get(thread_id, 0)
+            self.threads[thread_id] = depth + 1
+        return depth
+
+    def exit_thread(self) -> None:
+        thread_id = threading.get_ident()
+        with self._lock:
+            depth = self.threads.get(thread_id, 1) - 1
+            if depth:
+                self.threads[thread_id] = depth
+            else:
+                self.threads.pop(thread_id, None)
+
+    def add_span(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def sample(self, frames: Dict[int, Any]) -> None:
+        """Fold the current stack of every thread working on this request."""
+        with self._lock:
+            thread_ids = list(self.threads)
+        for thread_id in thread_ids:
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            # The event loop thread also runs other requests; only count it while this request's task runs
+            if thread_id == self.loop_thread and asyncio.current_task(self.loop) is not self.task:
+                continue
+            names = []
+            while frame is not None and len(names) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        """Stacks in the folded format: `root;...;leaf count` per line."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def to_dict(self, status: int, route: Optional[str]) -> Dict[str, Any]:
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        totals: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            if span["duration_ms"] is None:
+                span["duration_ms"] = round(duration_ms - span["start_ms"], 3)
+                span["unfinished"] = True
+            total = totals.setdefault(span["name"], {"count": 0, "total_ms": 0.0})
+            total["count"] += 1
+            total["total_ms"] = round(total["total_ms"] + span["duration_ms"], 3)
+        return {
+            "id": self.id,
+            "created_at": self.created_at,
+            "method": self.method,
+            "path": self.path,
+            "route": route,
+            "status": status,
+            "admin_id": self.admin_id,
+            "duration_ms": round(duration_ms, 3),
+            "interval_ms": PROFILE_INTERVAL * 1000,
+            "samples": self.samples,
+            "span_totals": dict(sorted(totals.items(), key=lambda item: -item[1]["total_ms"])),
+            "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+            "dropped_spans": self.dropped_spans
+        }
+
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("request_profile", default=None)
+
+
+class _Span:
+    def __init__(self, profile: RequestProfile, name: str, attrs: Dict[str, Any]):
+        self.profile = profile
+        self.record = {"name": name, "start_ms": None, "duration_ms": None, "thread": None, "depth": 0, **attrs}
+
+    def __enter__(self):
+        self.record["depth"] = self.profile.enter_thread()
+        self.record["thread"] = threading.current_thread().name
+        self._started = time.perf_counter()
+        self.record["start_ms"] = round((self._started - self.profile.started) * 1000, 3)
+        self.profile.add_span(self.record)
+        return self
+
+    def __exit__(self, *exc):
+        self.record["duration_ms"] = round((time.perf_counter() - self._started) * 1000, 3)
+        if exc[0] is not None:
+            self.record["error"] = exc[0].__name__
+        self.profile.exit_thread()
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attrs):
+    """
+    Context manager timing a section of the profiled request running in this
+    context; a shared no-op when the request is not profiled.
+    """
+    profile = _current.get()
+    if profile is None:
+        return _NO_SPAN
+    return _Span(profile, name, attrs)
+
+
+def traced(name: str) -> Callable:
+    """Decorator recording every call of the function as a span."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, profile: RequestProfile, interval: float):
+        super().__init__(name=f"profiler-{profile.id}", daemon=True)
+        self.profile = profile
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.profile.sample(sys._current_frames())
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class ProfileStore:
+    """Profiles as `{id}.json` plus `{id}.folded` files, shared by the workers on a host."""
+
+    def __init__(self, directory: str, max_profiles: int = MAX_STORED_PROFILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def _path(self, profile_id: str, extension: str) -> str:
+        if not profile_id.isalnum():
+            raise KeyError(profile_id)
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, data: Dict[str, Any], folded: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        for extension, content in (("folded", folded), ("json", json.dumps(data, default=str))):
+            path = self._path(data["id"], extension)
+            with open(path + ".tmp", "w") as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
+        self._prune()
+
+    def _prune(self) -> None:
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")]
+        if len(paths) <= self.max_profiles:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_profiles]:
+            for stale in (path, path[:-len("json")] + "folded"):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest profiles first, without their spans."""
+        if not os.path.isdir(self.directory):
+            return []
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        profiles = []
+        for path in paths[:limit]:
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            data.pop("spans", None)
+            profiles.append(data)
+        return profiles
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(profile_id, "json")) as f:
+                return json.load(f)
+        except (KeyError, OSError):
+            return None
+
+    def get_folded(self, profile_id: str) -> Optional[str]:
+        try:
+            with open(self._path(profile_id, "folded")) as f:
+                return f.read()
+        except (KeyError, OSError):
+            return None
+
+
+profile_store = ProfileStore(os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR))
+
+
+def _profile_requested(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.lower() in (b"1", b"true")
+    query = scope.get("query_string", b"")
+    return b"profile=" in query and parse_qs(query.decode("latin-1")).get("profile", [""])[0].lower() in ("1", "true")
+
+
+def _trace_serialization() -> None:
+    """Time FastAPI's response validation and JSON encoding as a span."""
+    import fastapi.routing
+
+    original = fastapi.routing.serialize_response
+    if hasattr(original, "__wrapped__"):
+        return
+
+    @functools.wraps(original)
+    async def serialize_response(*args, **kwargs):
+        with span("serialize_response"):
+            return await original(*args, **kwargs)
+
+    fastapi.routing.serialize_response = serialize_response
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests that ask for it. The Authorization token
+    (or an `X-Profile-Token` header, to profile a request made with a user's
+    token) must belong to an admin; the stored profile's id is returned in the
+    `X-Profile-Id` response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        _trace_serialization()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        from fastapi import HTTPException
+        from fastapi.concurrency import run_in_threadpool
+        from starlette.responses import JSONResponse
+        from auth import verify_admin_token
+
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        token = headers.get("x-profile-token") or headers.get("authorization", "").removeprefix("Bearer ").strip()
+        try:
+            admin_id = await run_in_threadpool(verify_admin_token, token)
+        except HTTPException as e:
+            await JSONResponse({"detail": f"Profiling: {e.detail}"}, status_code=e.status_code)(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], admin_id)
+        profile.loop_thread = threading.get_ident()
+        profile.loop = asyncio.get_running_loop()
+        profile.task = asyncio.current_task()
+        profile.enter_thread()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        token_reset = _current.set(profile)
+        sampler = _Sampler(profile, PROFILE_INTERVAL)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            _current.reset(token_reset)
+            profile.exit_thread()
+            route = getattr(scope.get("route"), "path", None)
+            try:
+                await run_in_threadpool(profile_store.save, profile.to_dict(status["code"], route), profile.folded())
+            except OSError as e:
+                logger.warning("Could not store profile %s: %s", profile.id, e)
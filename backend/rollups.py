@@ -0,0 +1,379 @@
+"""
+Daily rollups
+Per-user, per-date totals kept in users/{uid}/nutrition_daily/{date} and
+users/{uid}/hydration_daily/{date}, updated in the same atomic write as each
+entry create/update/delete so day statistics need one read per day instead of
+one per meal or glass.
+
+Rollups only cover writes made since they were deployed. Until the backfill
+scripts have rebuilt every user's rollups from their raw entries (and recorded
+that in meta/rollups), reads are computed from the raw entries instead.
+"""
+
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from firebase_admin import firestore
+
+from cache import TTLCache
+from sync import record_deletion
+
+TOTAL_FIELDS = ["total_calories", "total_protein", "total_carbs", "total_fats"]
+
+# Dates usable as rollup document ids; entries stored with other dates before
+# the API validated them are left out of the rollups
+_DAY_ID = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# How long a worker trusts its last read of the backfill markers
+BACKFILL_STATE_TTL_SECONDS = 60
+
+_backfill_state = TTLCache("rollup_backfill", max_size=8, ttl_seconds=BACKFILL_STATE_TTL_SECONDS)
+
+
+def _user_ref(db, user_id: str):
+    return db.collection("users").document(user_id)
+
+
+def is_day_id(date: Any) -> bool:
+    """Whether a date can key a per-day rollup document (YYYY-MM-DD)."""
+    return isinstance(date, str) and bool(_DAY_ID.match(date))
+
+
+def _meta_ref(db):
+    return db.collection("meta").document("rollups")
+
+
+def rollups_backfilled(db, collection: str) -> bool:
+    """Whether every user's `collection` rollups ("nutrition_daily" or "hydration_daily") have been backfilled."""
+    backfilled = _backfill_state.get(collection)
+    if backfilled is None:
+        snapshot = _meta_ref(db).get()
+        backfilled = bool(snapshot.exists and (snapshot.to_dict() or {}).get(f"{collection}_backfilled_at"))
+        _backfill_state.set(collection, backfilled)
+    return backfilled
+
+
+def mark_backfilled(db, collection: str) -> None:
+    """Record that every user's `collection` rollups were rebuilt, so reads can rely on them alone."""
+    _meta_ref(db).set({f"{collection}_backfilled_at": datetime.now().isoformat()}, merge=True)
+    _backfill_state.set(collection, True)
+
+
+def _entry_totals(entry: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    return {field: (entry or {}).get(field) or 0 for field in TOTAL_FIELDS}
+
+
+def _apply_delta(writer, db, user_id: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+    """
+    Queue increments moving an entry's totals from its old date to its new one.
+
+    Args:
+        writer: WriteBatch or Transaction the entry write is part of
+        old: Entry before the write (None on create)
+        new: Entry after the write (None on delete)
+    """
+    deltas: Dict[str, Dict[str, float]] = defaultdict(lambda: {**{field: 0 for field in TOTAL_FIELDS}, "entry_count": 0})
+    for entry, sign in ((old, -1), (new, 1)):
+        if entry and is_day_id(entry.get("date")):
+            day = deltas[entry["date"]]
+            for field, value in _entry_totals(entry).items():
+                day[field] += sign * value
+            day["entry_count"] += sign
+
+    now = datetime.now().isoformat()
+    daily_ref = _user_ref(db, user_id).collection("nutrition_daily")
+    for date, day in deltas.items():
+        if not any(day.values()):
+            continue
+        writer.set(daily_ref.document(date), {
+            "date": date,
+            **{field: firestore.Increment(value) for field, value in day.items()},
+            "updated_at": now
+        }, merge=True)
+
+
+def add_macro_entry(db, user_id: str, data: Dict[str, Any], entry_id: Optional[str] = None):
+    """
+    Create a macro entry and add it to its day's totals. Returns the new document reference.
+
+    Raises:
+        AlreadyExists: If entry_id is taken; the day's totals are left untouched
+    """
+    entry_ref = _user_ref(db, user_id).collection("macros").document(entry_id)
+    batch = db.batch()
+    batch.create(entry_ref, data)
+    _apply_delta(batch, db, user_id, None, data)
+    batch.commit()
+    return entry_ref
+
+
+@firestore.transactional
+def _replace_in_transaction(transaction, db, user_id: str, entry_ref, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    snapshot = entry_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    old = snapshot.to_dict()
+    transaction.update(entry_ref, data)
+    _apply_delta(transaction, db, user_id, old, {**old, **data})
+    return old
+
+
+@firestore.transactional
+def _remove_in_transaction(transaction, db, user_id: str, entry_ref) -> Optional[Dict[str, Any]]:
+    snapshot = entry_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    old = snapshot.to_dict()
+    transaction.delete(entry_ref)
+    record_deletion(db, user_id, "macros", entry_ref.id, writer=transaction)
+    _apply_delta(transaction, db, user_id, old, None)
+    return old
+
+
+def replace_macro_entry(db, user_id: str, entry_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Update a macro entry and move its totals between days. Returns the previous entry, or None if it does not exist."""
+    entry_ref = _user_ref(db, user_id).collection("macros").document(entry_id)
+    return _replace_in_transaction(db.transaction(), db, user_id, entry_ref, data)
+
+
+def remove_macro_entry(db, user_id: str, entry_id: str) -> Optional[Dict[str, Any]]:
+    """Delete a macro entry and subtract it from its day. Returns the deleted entry, or None if it does not exist."""
+    entry_ref = _user_ref(db, user_id).collection("macros").document(entry_id)
+    return _remove_in_transaction(db.transaction(), db, user_id, entry_ref)
+
+
+def group_entries_by_date(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sum raw macro entries into daily totals, for dates without a rollup."""
+    days: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        date = entry.get("date")
+        if not date:
+            continue
+        day = days.setdefault(date, {"date": date, **{field: 0 for field in TOTAL_FIELDS}, "entry_count": 0})
+        for field, value in _entry_totals(entry).items():
+            day[field] += value
+        day["entry_count"] += 1
+    return [days[date] for date in sorted(days)]
+
+
+def read_daily_totals(db, user_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    """
+    Daily nutrition totals for a date range, oldest first.
+
+    Reads the rollup documents once they have been backfilled; before that the
+    raw entries are grouped, since rollups miss entries logged before they existed.
+
+    Args:
+        start_date: First date (YYYY-MM-DD)
+        end_date: Last date (YYYY-MM-DD)
+    """
+    user_ref = _user_ref(db, user_id)
+    if rollups_backfilled(db, "nutrition_daily"):
+        docs = (
+            user_ref.collection("nutrition_daily")
+            .where("date", ">=", start_date).where("date", "<=", end_date)
+            .order_by("date").stream()
+        )
+        return [day for day in (doc.to_dict() for doc in docs) if (day.get("entry_count") or 0) > 0]
+
+    entries = (
+        user_ref.collection("macros")
+        .where("date", ">=", start_date).where("date", "<=", end_date)
+        .select(["date"] + TOTAL_FIELDS).stream()
+    )
+    return group_entries_by_date([doc.to_dict() for doc in entries])
+
+
+@firestore.transactional
+def _rebuild_day(transaction, db, user_id: str, date: str, now: str) -> bool:
+    user_ref = _user_ref(db, user_id)
+    day_ref = user_ref.collection("nutrition_daily").document(date)
+    # Reading the rollup makes a concurrent entry write (which increments it) retry this day
+    day_ref.get(transaction=transaction)
+    entries = (
+        user_ref.collection("macros").where("date", "==", date)
+        .select(["date"] + TOTAL_FIELDS).stream(transaction=transaction)
+    )
+    days = group_entries_by_date([doc.to_dict() for doc in entries])
+    if not days:
+        transaction.delete(day_ref)
+        record_deletion(db, user_id, "nutrition_daily", date, writer=transaction)
+        return False
+    transaction.set(day_ref, {**days[0], "updated_at": now})
+    return True
+
+
+def rebuild_daily_totals(db, user_id: str) -> int:
+    """
+    Recompute all of a user's rollups from their raw macro entries. Each day is
+    recomputed in its own transaction so entries written meanwhile are not lost.
+
+    Returns:
+        Number of days written
+    """
+    user_ref = _user_ref(db, user_id)
+    dates = {(doc.to_dict() or {}).get("date") for doc in user_ref.collection("macros").select(["date"]).stream()}
+    dates = {date for date in dates if is_day_id(date)}
+    dates |= {doc.id for doc in user_ref.collection("nutrition_daily").select([]).stream()}
+    now = datetime.now().isoformat()
+    return sum(_rebuild_day(db.transaction(), db, user_id, date, now) for date in sorted(dates))
+
+
+def _hydration_delta(writer, db, user_id: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+    """Queue increments moving a hydration entry's cups from its old date to its new one."""
+    deltas: Dict[str, float] = defaultdict(float)
+    for entry, sign in ((old, -1), (new, 1)):
+        if entry and is_day_id(entry.get("date")):
+            deltas[entry["date"]] += sign * (entry.get("amount_cups") or 0)
+
+    now = datetime.now().isoformat()
+    daily_ref = _user_ref(db, user_id).collection("hydration_daily")
+    for date, cups in deltas.items():
+        if cups:
+            writer.set(daily_ref.document(date), {
+                "date": date, "amount_cups": firestore.Increment(cups), "updated_at": now
+            }, merge=True)
+
+
+def add_hydration_entry(db, user_id: str, data: Dict[str, Any], entry_id: Optional[str] = None):
+    """
+    Create a hydration entry and add it to its day's counter. Returns the new document reference.
+
+    Raises:
+        AlreadyExists: If entry_id is taken; the day's counter is left untouched
+    """
+    entry_ref = _user_ref(db, user_id).collection("hydration").document(entry_id)
+    batch = db.batch()
+    batch.create(entry_ref, data)
+    _hydration_delta(batch, db, user_id, None, data)
+    batch.commit()
+    return entry_ref
+
+
+@firestore.transactional
+def _replace_hydration_in_transaction(transaction, db, user_id: str, entry_ref, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    snapshot = entry_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    old = snapshot.to_dict()
+    transaction.update(entry_ref, data)
+    _hydration_delta(transaction, db, user_id, old, {**old, **data})
+    return old
+
+
+@firestore.transactional
+def _remove_hydration_in_transaction(transaction, db, user_id: str, entry_ref) -> Optional[Dict[str, Any]]:
+    snapshot = entry_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    old = snapshot.to_dict()
+    transaction.delete(entry_ref)
+    record_deletion(db, user_id, "hydration", entry_ref.id, writer=transaction)
+    _hydration_delta(transaction, db, user_id, old, None)
+    return old
+
+
+def replace_hydration_entry(db, user_id: str, entry_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Update a hydration entry and its day counters. Returns the previous entry, or None if it does not exist."""
+    entry_ref = _user_ref(db, user_id).collection("hydration").document(entry_id)
+    return _replace_hydration_in_transaction(db.transaction(), db, user_id, entry_ref, data)
+
+
+def remove_hydration_entry(db, user_id: str, entry_id: str) -> Optional[Dict[str, Any]]:
+    """Delete a hydration entry and subtract it from its day. Returns the deleted entry, or None if it does not exist."""
+    entry_ref = _user_ref(db, user_id).collection("hydration").document(entry_id)
+    return _remove_hydration_in_transaction(db.transaction(), db, user_id, entry_ref)
+
+
+def increment_hydration(db, user_id: str, date: str, cups: float, taps: int = 1) -> None:
+    """
+    Atomically add quick-logged cups to a day's counter.
+
+    Args:
+        cups: Cups to add (the sum of `taps` coalesced increments)
+        taps: Number of increments merged into this write
+    """
+    _user_ref(db, user_id).collection("hydration_daily").document(date).set({
+        "date": date,
+        "amount_cups": firestore.Increment(cups),
+        "tap_cups": firestore.Increment(cups),
+        "taps": firestore.Increment(taps),
+        "updated_at": datetime.now().isoformat()
+    }, merge=True)
+
+
+def _sum_hydration_entries(query) -> Dict[str, float]:
+    totals: Dict[str, float] = defaultdict(float)
+    for doc in query.select(["date", "amount_cups"]).stream():
+        entry = doc.to_dict()
+        if is_day_id(entry.get("date")):
+            totals[entry["date"]] += entry.get("amount_cups") or 0
+    return totals
+
+
+def read_hydration_daily(db, user_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    """
+    Daily hydration totals for a date range, oldest first.
+
+    Reads the counters once they have been backfilled; before that each date's
+    raw entries are summed and only the counter's quick-logged cups are added,
+    since the counter misses entries logged before it existed.
+    """
+    user_ref = _user_ref(db, user_id)
+    docs = (
+        user_ref.collection("hydration_daily")
+        .where("date", ">=", start_date).where("date", "<=", end_date)
+        .order_by("date").stream()
+    )
+    days = [doc.to_dict() for doc in docs]
+    if rollups_backfilled(db, "hydration_daily"):
+        return days
+
+    totals = _sum_hydration_entries(
+        user_ref.collection("hydration").where("date", ">=", start_date).where("date", "<=", end_date)
+    )
+    merged = {date: {"date": date, "amount_cups": cups} for date, cups in totals.items()}
+    for day in days:
+        if day.get("tap_cups"):
+            merged[day["date"]] = {
+                **day, "amount_cups": totals.get(day["date"], 0) + day["tap_cups"]
+            }
+    return [merged[date] for date in sorted(merged)]
+
+
+@firestore.transactional
+def _rebuild_hydration_day(transaction, db, user_id: str, date: str, now: str) -> bool:
+    user_ref = _user_ref(db, user_id)
+    day_ref = user_ref.collection("hydration_daily").document(date)
+    snapshot = day_ref.get(transaction=transaction)
+    tap_cups = ((snapshot.to_dict() or {}).get("tap_cups") or 0) if snapshot.exists else 0
+    # Re-read in the transaction: a concurrent entry write increments the counter, so this day is retried
+    entries = (
+        user_ref.collection("hydration").where("date", "==", date)
+        .select(["amount_cups"]).stream(transaction=transaction)
+    )
+    entry_cups = sum((doc.to_dict() or {}).get("amount_cups") or 0 for doc in entries)
+    if not entry_cups and not tap_cups:
+        transaction.delete(day_ref)
+        record_deletion(db, user_id, "hydration_daily", date, writer=transaction)
+        return False
+    transaction.set(day_ref, {"date": date, "amount_cups": entry_cups + tap_cups, "updated_at": now}, merge=True)
+    return True
+
+
+def rebuild_hydration_daily(db, user_id: str) -> int:
+    """
+    Recompute a user's hydration counters from their raw entries, keeping the
+    quick-logged cups each counter holds. Each day is recomputed in its own
+    transaction so concurrent taps and entry writes are not lost.
+
+    Returns:
+        Number of days written
+    """
+    user_ref = _user_ref(db, user_id)
+    dates = set(_sum_hydration_entries(user_ref.collection("hydration")))
+    dates |= {doc.id for doc in user_ref.collection("hydration_daily").select([]).stream()}
+    now = datetime.now().isoformat()
+    return sum(_rebuild_hydration_day(db.transaction(), db, user_id, date, now) for date in sorted(dates))
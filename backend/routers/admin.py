@@ -0,0 +1,138 @@
+"""
+Admin Router
+Operational endpoints restricted to admin users.
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from auth import require_admin
+from cache import cache_stats
+from events import change_broker
+from profiling import profile_store
+from ai_analysis.model_router import model_router
+from ai_analysis.rate_limiter import llm_limiter
+from ai_analysis.usage_ledger import usage_ledger, GROUP_FIELDS
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+@router.get("/llm-usage")
+async def get_llm_usage(
+    start: Optional[str] = Query(None, alias="from", description="First day (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, alias="to", description="Last day (YYYY-MM-DD)"),
+    group_by: str = Query("day,user_id,model", description="Comma-separated: day, user_id, model, endpoint, call_type"),
+    user_id: Optional[str] = Query(None, description="Only include this user's calls"),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    Aggregate LLM usage from the ledger: calls, errors, retries, cache hits,
+    token sums and latency per group.
+    """
+    fields = [field.strip() for field in group_by.split(",") if field.strip()]
+    invalid = [field for field in fields if field not in GROUP_FIELDS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid group_by fields: {', '.join(invalid)}")
+
+    try:
+        rows = await run_in_threadpool(usage_ledger.aggregate, fields, start, end, user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading LLM usage: {str(e)}")
+
+    totals = {
+        field: sum(row[field] for row in rows)
+        for field in ("calls", "errors", "rate_limited", "retries", "cache_hits",
+                      "prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens")
+    }
+    return {
+        "status": "success",
+        "group_by": fields,
+        "totals": totals,
+        "rows": rows
+    }
+
+
+@router.get("/llm-limiter")
+async def get_limiter_stats(admin_id: str = Depends(require_admin)):
+    """
+    Get AI coach rate limiter metrics: queue depth, calls in flight and wait times.
+    """
+    return {
+        "status": "success",
+        "limiter": llm_limiter.stats()
+    }
+
+
+@router.get("/llm-models")
+async def get_model_stats(admin_id: str = Depends(require_admin)):
+    """
+    Get the model configured for each call type and rolling p50/p95 latency and error rate per model.
+    """
+    return {
+        "status": "success",
+        **model_router.stats()
+    }
+
+
+@router.get("/caches")
+async def get_cache_stats(admin_id: str = Depends(require_admin)):
+    """
+    Get size and hit/miss counters of this worker's in-process caches.
+    """
+    return {
+        "status": "success",
+        "caches": cache_stats()
+    }
+
+
+@router.get("/events")
+async def get_event_stats(admin_id: str = Depends(require_admin)):
+    """
+    Get this worker's change-stream subscriptions and publish counters.
+    """
+    return {
+        "status": "success",
+        "events": change_broker.stats()
+    }
+
+
+@router.get("/profiles")
+async def list_profiles(
+    limit: int = Query(50, ge=1, le=200),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    List stored request profiles, newest first, with their span totals.
+    Profile a request by sending it with an `X-Profile: 1` header or `?profile=1`.
+    """
+    return {
+        "status": "success",
+        "profiles": await run_in_threadpool(profile_store.list, limit)
+    }
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, admin_id: str = Depends(require_admin)):
+    """
+    Get one request profile with every recorded span.
+    """
+    profile = await run_in_threadpool(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {
+        "status": "success",
+        "profile": profile
+    }
+
+
+@router.get("/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+async def get_profile_stacks(profile_id: str, admin_id: str = Depends(require_admin)):
+    """
+    Get a profile's sampled stacks in the folded format read by flamegraph.pl and speedscope.
+    """
+    folded = await run_in_threadpool(profile_store.get_folded, profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(folded)
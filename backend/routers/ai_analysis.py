@@ -3,23 +3,55 @@ AI Analysis Router
 Endpoints for generating and retrieving AI-powered fitness insights.
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional, List
 from datetime import datetime
-from pydantic import BaseModel
-import os
+from pydantic import BaseModel, Field
+import math
+import logging
 
 from auth import get_user_id
+from idempotency import idempotency_key_header, run_once
 from db import db
-from ai_analysis import FitnessDataAnalyzer, FitnessAICoach, get_user_profile_for_ai
+from ai_analysis import FitnessDataAnalyzer, FitnessAICoach, ChatSessionStore, get_cached_user_profile
+from ai_analysis.chat_sessions import messages_to_fold
+from ai_analysis.llm_client import get_llm_client
+from ai_analysis.rate_limiter import RateLimitExceeded
+from ai_analysis.retrieval import notes_index
+from sync import record_deletion
+from events import publish_change, publish_deletion
 
 router = APIRouter(prefix="/api/ai-analysis", tags=["ai-analysis"])
 
+logger = logging.getLogger(__name__)
+
+
+def _rate_limited(error: RateLimitExceeded) -> HTTPException:
+    """Turn a limiter rejection into a 429 with Retry-After."""
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(math.ceil(error.retry_after))}
+    )
+
+
+def analysis_period(year: int, month: int) -> int:
+    """Sortable period key stored on analyses, e.g. 202401 for January 2024."""
+    return year * 100 + month
+
+
+def months_before(year: int, month: int, count: int) -> tuple:
+    """(year, month) `count` months before the given month."""
+    index = year * 12 + (month - 1) - count
+    return index // 12, index % 12 + 1
+
 
 class GenerateAnalysisRequest(BaseModel):
     year: int
     month: int
     include_previous_months: Optional[bool] = True
+    previous_months: Optional[int] = Field(3, ge=1, le=12)
 
 
 class ChatRequest(BaseModel):
@@ -29,6 +61,15 @@ class ChatRequest(BaseModel):
     conversation_history: Optional[List[dict]] = None
 
 
+class CreateChatSessionRequest(BaseModel):
+    year: Optional[int] = None
+    month: Optional[int] = None
+
+
+class ChatSessionMessageRequest(BaseModel):
+    message: str
+
+
 @router.get("/summary")
 async def get_monthly_summary(
     year: int = Query(..., description="Year (e.g., 2024)"),
@@ -53,16 +94,22 @@ async def get_monthly_summary(
 @router.post("/generate")
 async def generate_ai_analysis(
     request: GenerateAnalysisRequest,
-    user_id: str = Depends(get_user_id)
+    user_id: str = Depends(get_user_id),
+    idempotency_key: Optional[str] = Depends(idempotency_key_header)
 ):
     """
     Generate AI-powered analysis for a specific month.
-    Optionally includes context from previous months for trend analysis.
+    Optionally includes context from the previous `previous_months` months for trend analysis.
     """
+    return await run_once(db, user_id, "ai_analysis.generate", idempotency_key, request.dict(),
+                          lambda: _generate_ai_analysis(request, user_id))
+
+
+async def _generate_ai_analysis(request: GenerateAnalysisRequest, user_id: str):
     try:
-        # Get OpenAI API key
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not openai_api_key:
+        # Get shared OpenAI client
+        llm_client = get_llm_client()
+        if llm_client is None:
             raise HTTPException(status_code=500, detail="OpenAI API key not configured")
 
         # Build current month summary
@@ -70,14 +117,24 @@ async def generate_ai_analysis(
         summary = analyzer.build_complete_summary(request.year, request.month)
 
         # Get user profile for personalized analysis
-        user_profile = get_user_profile_for_ai(db, user_id)
+        user_profile, profile_hash = get_cached_user_profile(db, user_id)
 
         # Get previous analyses if requested
         previous_analyses = []
         if request.include_previous_months:
             try:
+                # One range query on the single-field period index covers the last N months across years,
+                # fetching only the fields the prompt needs
+                start_year, start_month = months_before(request.year, request.month, request.previous_months)
                 analyses_ref = db.collection("users").document(user_id).collection("ai_analyses")
-                analyses_docs = analyses_ref.where("year", "==", request.year).where("month", "<", request.month).order_by("month").stream()
+                analyses_docs = (
+                    analyses_ref
+                    .where("period", ">=", analysis_period(start_year, start_month))
+                    .where("period", "<", analysis_period(request.year, request.month))
+                    .order_by("period")
+                    .select(["period", "status", "analysis"])
+                    .stream()
+                )
 
                 for doc in analyses_docs:
                     doc_data = doc.to_dict()
@@ -86,14 +143,15 @@ async def generate_ai_analysis(
                         if analysis_text:
                             previous_analyses.append(analysis_text)
             except Exception as e:
-                print(f"Warning: Could not fetch previous analyses: {e}")
+                logger.warning("Could not fetch previous analyses: %s", e)
                 previous_analyses = []
 
         # Initialize AI Coach with user's actual profile
-        coach = FitnessAICoach(api_key=openai_api_key, user_profile=user_profile)
+        coach = FitnessAICoach(client=llm_client, user_profile=user_profile, profile_hash=profile_hash, user_id=user_id,
+                               endpoint="/generate")
 
         # Generate analysis
-        result = coach.generate_general_analysis(summary, previous_analyses if previous_analyses else None)
+        result = await run_in_threadpool(coach.generate_general_analysis, summary, previous_analyses if previous_analyses else None)
 
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=f"AI analysis failed: {result.get('error')}")
@@ -103,6 +161,7 @@ async def generate_ai_analysis(
             "user_id": user_id,
             "year": request.year,
             "month": request.month,
+            "period": analysis_period(request.year, request.month),
             "status": result["status"],
             "analysis": result["analysis"],
             "model": result["model"],
@@ -111,11 +170,14 @@ async def generate_ai_analysis(
             "created_at": datetime.now().isoformat(),
             "previous_context_count": len(previous_analyses)
         }
+        analysis_data["updated_at"] = analysis_data["created_at"]
 
         # Use year-month as document ID for easy retrieval
         doc_id = f"{request.year}-{request.month:02d}"
         analyses_ref = db.collection("users").document(user_id).collection("ai_analyses")
         analyses_ref.document(doc_id).set(analysis_data)
+        notes_index.on_write(user_id, "ai_analyses", doc_id, analysis_data)
+        publish_change(user_id, "ai_analyses", doc_id, analysis_data)
 
         return {
             "status": "success",
@@ -128,6 +190,8 @@ async def generate_ai_analysis(
 
     except HTTPException:
         raise
+    except RateLimitExceeded as e:
+        raise _rate_limited(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating analysis: {str(e)}")
 
@@ -227,15 +291,23 @@ async def get_analysis_by_id(
 @router.post("/chat")
 async def chat_with_ai(
     request: ChatRequest,
-    user_id: str = Depends(get_user_id)
+    user_id: str = Depends(get_user_id),
+    idempotency_key: Optional[str] = Depends(idempotency_key_header)
 ):
     """
     Chat with AI coach. Uses current month's data or specified month for context.
+    Stateless: only the most recent messages of conversation_history are used.
+    Prefer /chat/sessions, which keeps the history server-side.
     """
+    return await run_once(db, user_id, "ai_analysis.chat", idempotency_key, request.dict(),
+                          lambda: _chat_with_ai(request, user_id))
+
+
+async def _chat_with_ai(request: ChatRequest, user_id: str):
     try:
-        # Get OpenAI API key
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not openai_api_key:
+        # Get shared OpenAI client
+        llm_client = get_llm_client()
+        if llm_client is None:
             raise HTTPException(status_code=500, detail="OpenAI API key not configured")
 
         # Determine which month's data to use
@@ -248,16 +320,22 @@ async def chat_with_ai(
         summary = analyzer.build_complete_summary(year, month)
 
         # Get user profile for personalized responses
-        user_profile = get_user_profile_for_ai(db, user_id)
+        user_profile, profile_hash = get_cached_user_profile(db, user_id)
 
         # Initialize AI Coach with user's actual profile
-        coach = FitnessAICoach(api_key=openai_api_key, user_profile=user_profile)
+        coach = FitnessAICoach(client=llm_client, user_profile=user_profile, profile_hash=profile_hash, user_id=user_id,
+                               endpoint="/chat")
 
         # Get chat response
-        result = coach.chat(
+        # Retrieve log entries relevant to this message
+        relevant_notes = await run_in_threadpool(notes_index.search, db, user_id, request.message)
+
+        result = await run_in_threadpool(
+            coach.chat,
             user_message=request.message,
             summary=summary,
-            conversation_history=request.conversation_history
+            conversation_history=request.conversation_history,
+            relevant_notes=relevant_notes
         )
 
         if result["status"] == "error":
@@ -266,16 +344,238 @@ async def chat_with_ai(
         return {
             "status": "success",
             "response": result["response"],
+            "model": result["model"],
             "tokens_used": result["tokens_used"],
             "conversation_history": result["conversation_history"]
         }
 
     except HTTPException:
         raise
+    except RateLimitExceeded as e:
+        raise _rate_limited(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}")
 
 
+@router.post("/chat/sessions")
+async def create_chat_session(
+    request: CreateChatSessionRequest,
+    user_id: str = Depends(get_user_id),
+    idempotency_key: Optional[str] = Depends(idempotency_key_header)
+):
+    """
+    Start a server-side chat session. The month's summary is built once here and
+    cached on the session instead of being rebuilt for every message.
+    """
+    return await run_once(db, user_id, "ai_analysis.chat_sessions", idempotency_key, request.dict(),
+                          lambda: _create_chat_session(request, user_id))
+
+
+async def _create_chat_session(request: CreateChatSessionRequest, user_id: str):
+    try:
+        now = datetime.now()
+        year = request.year or now.year
+        month = request.month or now.month
+
+        analyzer = FitnessDataAnalyzer(db, user_id)
+        summary = analyzer.build_complete_summary(year, month)
+
+        store = ChatSessionStore(db, user_id)
+        session = store.create_session(year, month, summary)
+
+        return {
+            "status": "success",
+            "session_id": session["id"],
+            "year": year,
+            "month": month
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating chat session: {str(e)}")
+
+
+@router.get("/chat/sessions")
+async def get_chat_sessions(
+    limit: Optional[int] = Query(20, ge=1, le=100, description="Number of sessions to return"),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    List the user's chat sessions, most recently active first.
+    """
+    try:
+        sessions = ChatSessionStore(db, user_id).list_sessions(limit)
+        return {
+            "status": "success",
+            "count": len(sessions),
+            "sessions": sessions
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching chat sessions: {str(e)}")
+
+
+@router.get("/chat/sessions/{session_id}")
+async def get_chat_session(
+    session_id: str,
+    limit: Optional[int] = Query(50, ge=1, le=500, description="Number of most recent messages to return"),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Get a chat session with its most recent messages.
+    """
+    try:
+        store = ChatSessionStore(db, user_id)
+        session = store.get_session(session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Chat session not found")
+
+        session.pop("context_summary", None)
+        return {
+            "status": "success",
+            "session": session,
+            "messages": store.get_messages(session_id, limit)
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching chat session: {str(e)}")
+
+
+def _fold_chat_history(store: ChatSessionStore, coach: FitnessAICoach, session_id: str,
+                       previous_summary: Optional[str], summarized_through: int, messages: List[dict]):
+    """Fold aged-out messages into the session's rolling summary (runs after the response is sent)."""
+    try:
+        result = coach.summarize_conversation(previous_summary, messages)
+    except RateLimitExceeded:
+        # Leave the messages unsummarized; the next turn will try again
+        return
+    if result["status"] == "success":
+        # A concurrent fold of an overlapping batch may have stored its summary first; keep that one
+        if not store.update_rolling_summary(session_id, result["summary"], messages[-1]["seq"], summarized_through):
+            logger.info("Skipped stale summary for chat session %s", session_id)
+    else:
+        logger.warning("Could not summarize chat session %s: %s", session_id, result.get("error"))
+
+
+@router.post("/chat/sessions/{session_id}/messages")
+async def send_chat_session_message(
+    session_id: str,
+    request: ChatSessionMessageRequest,
+    background_tasks: BackgroundTasks,
+    user_id: str = Depends(get_user_id),
+    idempotency_key: Optional[str] = Depends(idempotency_key_header)
+):
+    """
+    Send a message in a chat session. The prompt is built from the rolling summary
+    of older turns plus the most recent messages, so only the new message is sent.
+    """
+    return await run_once(db, user_id, "ai_analysis.chat_session_messages", idempotency_key,
+                          {"session_id": session_id, **request.dict()},
+                          lambda: _send_chat_session_message(session_id, request, background_tasks, user_id))
+
+
+async def _send_chat_session_message(session_id: str, request: ChatSessionMessageRequest,
+                                     background_tasks: BackgroundTasks, user_id: str):
+    try:
+        llm_client = get_llm_client()
+        if llm_client is None:
+            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+
+        store = ChatSessionStore(db, user_id)
+        session = store.get_session(session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Chat session not found")
+
+        # Reuse the cached monthly summary unless it has expired
+        summary = session.get("context_summary")
+        if store.is_context_stale(session):
+            analyzer = FitnessDataAnalyzer(db, user_id)
+            summary = analyzer.build_complete_summary(session["year"], session["month"])
+            store.update_context(session_id, summary)
+
+        user_profile, profile_hash = get_cached_user_profile(db, user_id)
+        coach = FitnessAICoach(client=llm_client, user_profile=user_profile, profile_hash=profile_hash, user_id=user_id,
+                               endpoint="/chat/sessions/{session_id}/messages")
+
+        unsummarized = store.get_unsummarized_messages(session)
+        history = [{"role": m["role"], "content": m["content"]} for m in unsummarized]
+
+        relevant_notes = await run_in_threadpool(notes_index.search, db, user_id, request.message)
+
+        result = await run_in_threadpool(
+            coach.chat,
+            user_message=request.message,
+            summary=summary,
+            conversation_history=history,
+            conversation_summary=session.get("rolling_summary"),
+            history_window=None,
+            relevant_notes=relevant_notes
+        )
+
+        if result["status"] == "error":
+            raise HTTPException(status_code=500, detail=f"Chat failed: {result.get('error')}")
+
+        try:
+            message_count = store.append_turn(session, request.message, result["response"], result["tokens_used"])
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Chat session not found")
+
+        seq = message_count - 2
+        # Only fold when no other turn landed in between; otherwise `unsummarized` has gaps and the next turn folds
+        if seq == session.get("message_count", 0):
+            unsummarized += [
+                {"seq": seq, "role": "user", "content": request.message},
+                {"seq": seq + 1, "role": "assistant", "content": result["response"]}
+            ]
+            to_fold = messages_to_fold(unsummarized)
+            if to_fold:
+                background_tasks.add_task(_fold_chat_history, store, coach, session_id, session.get("rolling_summary"),
+                                          session.get("summarized_through", -1), to_fold)
+
+        return {
+            "status": "success",
+            "session_id": session_id,
+            "response": result["response"],
+            "model": result["model"],
+            "tokens_used": result["tokens_used"],
+            "message_count": message_count
+        }
+
+    except HTTPException:
+        raise
+    except RateLimitExceeded as e:
+        raise _rate_limited(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}")
+
+
+@router.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(
+    session_id: str,
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Delete a chat session and all of its messages.
+    """
+    try:
+        store = ChatSessionStore(db, user_id)
+        if not store.get_session(session_id):
+            raise HTTPException(status_code=404, detail="Chat session not found")
+
+        store.delete_session(session_id)
+
+        return {
+            "status": "success",
+            "message": "Chat session deleted successfully"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting chat session: {str(e)}")
+
+
 @router.delete("/analyses/{analysis_id}")
 async def delete_analysis(
     analysis_id: str,
@@ -292,6 +592,9 @@ async def delete_analysis(
             raise HTTPException(status_code=404, detail="Analysis not found")
 
         doc_ref.delete()
+        notes_index.on_delete(user_id, "ai_analyses", analysis_id)
+        record_deletion(db, user_id, "ai_analyses", analysis_id)
+        publish_deletion(user_id, "ai_analyses", analysis_id)
 
         return {
             "status": "success",
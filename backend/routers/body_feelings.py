@@ -3,7 +3,11 @@ from typing import Optional
 from datetime import datetime
 from models import BodyFeeling
 from auth import get_user_id
+from idempotency import idempotency_key_header, new_document, create_document
 from db import db
+from sync import record_deletion
+from events import publish_change, publish_deletion
+from ai_analysis.retrieval import notes_index
 
 router = APIRouter(prefix="/api/body-feelings", tags=["body-feelings"])
 
@@ -18,11 +22,17 @@ async def get_body_feelings(user_id: str = Depends(get_user_id), date_filter: Op
     return [{"id": feeling.id, **feeling.to_dict()} for feeling in feelings]
 
 @router.post("")
-async def create_body_feeling(feeling: BodyFeeling, user_id: str = Depends(get_user_id)):
+async def create_body_feeling(feeling: BodyFeeling, user_id: str = Depends(get_user_id),
+                              idempotency_key: Optional[str] = Depends(idempotency_key_header)):
     feeling_dict = feeling.dict(exclude={"id"})
     feeling_dict["created_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("body_feelings").document()
-    doc_ref.set(feeling_dict)
+    feeling_dict["updated_at"] = feeling_dict["created_at"]
+    doc_ref = new_document(db.collection("users").document(user_id).collection("body_feelings"), idempotency_key)
+    existing = create_document(doc_ref, feeling_dict)
+    if existing is not None:
+        return {"id": doc_ref.id, **existing}
+    publish_change(user_id, "body_feelings", doc_ref.id, feeling_dict)
+    notes_index.on_write(user_id, "body_feelings", doc_ref.id, feeling_dict)
     return {"id": doc_ref.id, **feeling_dict}
 
 @router.put("/{feeling_id}")
@@ -33,6 +43,8 @@ async def update_body_feeling(feeling_id: str, feeling: BodyFeeling, user_id: st
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Body feeling not found")
     doc_ref.update(feeling_dict)
+    publish_change(user_id, "body_feelings", feeling_id, feeling_dict)
+    notes_index.on_write(user_id, "body_feelings", feeling_id, feeling_dict)
     return {"id": feeling_id, **feeling_dict}
 
 @router.delete("/{feeling_id}")
@@ -41,5 +53,8 @@ async def delete_body_feeling(feeling_id: str, user_id: str = Depends(get_user_i
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Body feeling not found")
     doc_ref.delete()
+    record_deletion(db, user_id, "body_feelings", feeling_id)
+    publish_deletion(user_id, "body_feelings", feeling_id)
+    notes_index.on_delete(user_id, "body_feelings", feeling_id)
     return {"message": "Body feeling deleted"}
 
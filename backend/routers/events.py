@@ -0,0 +1,72 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from auth import get_stream_user_id
+from events import change_broker
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+# Comment line sent when idle so proxies and load balancers keep the connection open
+HEARTBEAT_SECONDS = 15
+
+# Client reconnect delay (ms) sent to EventSource
+RETRY_MS = 3000
+
+
+def _format(event: dict) -> str:
+    payload = {key: value for key, value in event.items() if key not in ("id", "user_id")}
+    return f"id: {event['id']}\nevent: change\ndata: {json.dumps(payload, separators=(',', ':'), default=str)}\n\n"
+
+
+def _resync(reason: str) -> str:
+    return f"event: resync\ndata: {json.dumps({'reason': reason})}\n\n"
+
+
+@router.get("")
+async def stream_changes(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    last_event: Optional[str] = Query(None, description="Last event id seen, for clients that cannot set Last-Event-ID"),
+    user_id: str = Depends(get_stream_user_id)
+):
+    """
+    Server-sent event stream of the user's document changes.
+
+    Each `change` event carries collection, doc_id, op (upsert/delete) and the
+    written data (null when the client should refetch the document). A `resync`
+    event means events were missed and the client should call /api/sync.
+    """
+    subscription, replay, resync = change_broker.subscribe(user_id, last_event_id or last_event)
+
+    async def events():
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if resync:
+                yield _resync("missed_events")
+            for event in replay:
+                yield _format(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield _format(event)
+                if subscription.overflowed and subscription.queue.empty():
+                    # Events were dropped while this client lagged; make it catch up and reconnect
+                    yield _resync("slow_consumer")
+                    break
+        finally:
+            change_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,23 +1,49 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from typing import Optional
 from datetime import datetime
-from models import Exercise
+from models import Exercise, WorkoutType
 from auth import get_user_id
+from idempotency import idempotency_key_header, new_document, create_document
 from db import db
+from sync import record_deletion
+from events import publish_change, publish_deletion
+from exercise_index import exercise_index
+from exercise_catalog import get_catalog
 
 router = APIRouter(prefix="/api/exercises", tags=["exercises"])
 
+CATALOG_CACHE_CONTROL = "public, max-age=86400"
+
 @router.get("")
 async def get_exercises(user_id: str = Depends(get_user_id)):
     exercises_ref = db.collection("users").document(user_id).collection("exercises")
     exercises = exercises_ref.stream()
     return [{"id": ex.id, **ex.to_dict()} for ex in exercises]
 
+@router.get("/catalog")
+async def get_exercise_catalog(request: Request):
+    """
+    Bundled exercise catalog. Public and identical for every user, so clients
+    and CDNs may cache it; revalidate with If-None-Match.
+    """
+    catalog = get_catalog()
+    headers = {"ETag": catalog.etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == catalog.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=catalog.to_json(), media_type="application/json", headers=headers)
+
 @router.post("")
-async def create_exercise(exercise: Exercise, user_id: str = Depends(get_user_id)):
+async def create_exercise(exercise: Exercise, user_id: str = Depends(get_user_id),
+                          idempotency_key: Optional[str] = Depends(idempotency_key_header)):
     exercise_dict = exercise.dict(exclude={"id"})
     exercise_dict["created_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("exercises").document()
-    doc_ref.set(exercise_dict)
+    exercise_dict["updated_at"] = exercise_dict["created_at"]
+    doc_ref = new_document(db.collection("users").document(user_id).collection("exercises"), idempotency_key)
+    existing = create_document(doc_ref, exercise_dict)
+    if existing is not None:
+        return {"id": doc_ref.id, **existing}
+    publish_change(user_id, "exercises", doc_ref.id, exercise_dict)
+    exercise_index.on_write(user_id, doc_ref.id, exercise_dict)
     return {"id": doc_ref.id, **exercise_dict}
 
 @router.put("/{exercise_id}")
@@ -25,9 +51,12 @@ async def update_exercise(exercise_id: str, exercise: Exercise, user_id: str = D
     exercise_dict = exercise.dict(exclude={"id"})
     exercise_dict["updated_at"] = datetime.now().isoformat()
     doc_ref = db.collection("users").document(user_id).collection("exercises").document(exercise_id)
-    if not doc_ref.get().exists:
+    existing = doc_ref.get()
+    if not existing.exists:
         raise HTTPException(status_code=404, detail="Exercise not found")
     doc_ref.update(exercise_dict)
+    publish_change(user_id, "exercises", exercise_id, exercise_dict)
+    exercise_index.on_write(user_id, exercise_id, {**(existing.to_dict() or {}), **exercise_dict})
     return {"id": exercise_id, **exercise_dict}
 
 @router.delete("/{exercise_id}")
@@ -36,17 +65,22 @@ async def delete_exercise(exercise_id: str, user_id: str = Depends(get_user_id))
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Exercise not found")
     doc_ref.delete()
+    record_deletion(db, user_id, "exercises", exercise_id)
+    publish_deletion(user_id, "exercises", exercise_id)
+    exercise_index.on_delete(user_id, exercise_id)
     return {"message": "Exercise deleted"}
 
 @router.get("/search")
-async def search_exercises(query: str = Query(...), user_id: str = Depends(get_user_id)):
-    exercises_ref = db.collection("users").document(user_id).collection("exercises")
-    exercises = exercises_ref.stream()
-    results = []
-    query_lower = query.lower()
-    for ex in exercises:
-        ex_data = ex.to_dict()
-        if query_lower in ex_data.get("name", "").lower():
-            results.append({"id": ex.id, **ex_data})
-    return results
-
+async def search_exercises(
+    query: str = Query(..., description="Search box text; matches word prefixes and tolerates typos"),
+    muscle_group: Optional[str] = Query(None),
+    type: Optional[WorkoutType] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    user_id: str = Depends(get_user_id)
+):
+    return exercise_index.search(
+        db, user_id, query,
+        muscle_group=muscle_group,
+        workout_type=type.value if type else None,
+        limit=limit
+    )
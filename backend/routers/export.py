@@ -0,0 +1,91 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+import tempfile
+from auth import get_user_id
+from db import db
+from export import export_records, gzip_chunks, parse_resume_collection
+from columnar import TABLES, FORMATS, write_table
+
+router = APIRouter(prefix="/api/export", tags=["export"])
+
+@router.get("")
+async def export_account(
+    compress: bool = Query(False, description="Gzip the export"),
+    collection: Optional[str] = Query(None, description="Resume: collection of the last document received"),
+    after: Optional[str] = Query(None, description="Resume: id of the last document received"),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Download all of the user's data as newline-delimited JSON. An interrupted
+    download resumes with the collection and id of the last complete line.
+    """
+    if after and not collection:
+        raise HTTPException(status_code=400, detail="'after' requires 'collection'")
+    if collection is not None:
+        try:
+            parse_resume_collection(collection)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # A sync generator: Starlette iterates it in the threadpool, so blocking Firestore reads don't stall the loop
+    chunks = export_records(db, user_id, collection, after)
+    filename = f"gymai-export-{datetime.now().strftime('%Y%m%d')}.ndjson"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+    return StreamingResponse(
+        chunks,
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+    )
+
+@router.get("/columnar")
+async def list_columnar_tables(user_id: str = Depends(get_user_id)):
+    """Tables available from /api/export/columnar/{table} and their column types."""
+    return {
+        name: [{"name": column, "type": kind} for column, kind in table.columns]
+        for name, table in TABLES.items()
+    }
+
+@router.get("/columnar/{table}")
+async def export_columnar_table(
+    table: str,
+    format: str = Query("parquet", description="parquet or arrow (Arrow IPC file)"),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Download one table of the user's data as Parquet or Arrow. Nested workout
+    sets and macro food items are available as their own flattened tables.
+    """
+    if table not in TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail="format must be parquet or arrow")
+
+    # Parquet writes its footer last, so the file is built (spilling to disk when large) before sending
+    buffer = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    try:
+        await run_in_threadpool(write_table, db, user_id, table, buffer, format)
+    except RuntimeError as e:
+        buffer.close()
+        raise HTTPException(status_code=501, detail=str(e))
+    buffer.seek(0)
+
+    def chunks():
+        with buffer:
+            while True:
+                chunk = buffer.read(1024 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+
+    media_type, extension = FORMATS[format]
+    filename = f"gymai-{table}-{datetime.now().strftime('%Y%m%d')}.{extension}"
+    return StreamingResponse(
+        chunks(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+    )
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import Optional
+from foods import get_food_database
+
+router = APIRouter(prefix="/api/foods", tags=["foods"])
+
+# The food database only changes on deploy, so results may be cached by clients and CDNs
+FOODS_CACHE_CONTROL = "public, max-age=3600"
+
+@router.get("/search")
+async def search_foods(
+    response: Response,
+    query: str = Query(..., description="Search box text; matches name/alias prefixes and tolerates typos"),
+    limit: int = Query(10, ge=1, le=50)
+):
+    response.headers["Cache-Control"] = FOODS_CACHE_CONTROL
+    return get_food_database().search(query, limit=limit)
+
+@router.get("/{food_id}")
+async def get_food(
+    food_id: str,
+    response: Response,
+    servings: Optional[float] = Query(None, gt=0),
+    grams: Optional[float] = Query(None, gt=0)
+):
+    foods = get_food_database()
+    food = foods.get(food_id)
+    if food is None:
+        raise HTTPException(status_code=404, detail="Food not found")
+    response.headers["Cache-Control"] = FOODS_CACHE_CONTROL
+    if servings is not None or grams is not None:
+        food["amount"] = foods.nutrients(food_id, servings=servings, grams=grams)
+    return food
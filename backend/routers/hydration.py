@@ -1,45 +1,127 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import Optional
 from datetime import datetime
-from models import HydrationEntry
+import os
+from models import HydrationEntry, HydrationIncrement
 from auth import get_user_id
+from idempotency import idempotency_key_header, new_document, create_document, run_once
 from db import db
+from coalescer import WriteCoalescer
+from events import publish_change, publish_deletion
+from rollups import (
+    add_hydration_entry, replace_hydration_entry, remove_hydration_entry,
+    increment_hydration, read_hydration_daily
+)
 
 router = APIRouter(prefix="/api/hydration", tags=["hydration"])
 
+# Rapid "+1 cup" taps from one user on one date are merged into a single counter write
+HYDRATION_COALESCE_SECONDS = float(os.getenv("HYDRATION_COALESCE_SECONDS", "2"))
+
+def _flush_increments(key: tuple, amounts: dict) -> None:
+    user_id, date = key
+    increment_hydration(db, user_id, date, amounts["cups"], int(amounts["taps"]))
+    publish_change(user_id, "hydration_daily", date)
+
+def _publish_days(user_id: str, *dates: Optional[str]) -> None:
+    """Tell clients the counters of these dates changed (they refetch them)."""
+    for date in {date for date in dates if date}:
+        publish_change(user_id, "hydration_daily", date)
+
+hydration_writes = WriteCoalescer(HYDRATION_COALESCE_SECONDS, _flush_increments)
+
+def _tap_entry(day: dict) -> dict:
+    """Quick-logged cups of one day, in the HydrationEntry shape used by the history list."""
+    return {
+        "id": f"taps-{day['date']}",
+        "date": day["date"],
+        "amount_cups": day["tap_cups"],
+        "notes": None,
+        "taps": day.get("taps", 0),
+        "source": "counter"
+    }
+
 @router.get("")
 async def get_hydration_entries(user_id: str = Depends(get_user_id), date_filter: Optional[str] = Query(None)):
-    hydration_ref = db.collection("users").document(user_id).collection("hydration")
+    user_ref = db.collection("users").document(user_id)
+    hydration_ref = user_ref.collection("hydration")
+    daily_ref = user_ref.collection("hydration_daily")
     if date_filter:
         hydration_entries = hydration_ref.where("date", "==", date_filter).stream()
+        counters = daily_ref.where("date", "==", date_filter).stream()
     else:
-        hydration_entries = list(hydration_ref.order_by("date").stream())
-        hydration_entries.reverse()
-    return [{"id": entry.id, **entry.to_dict()} for entry in hydration_entries]
+        hydration_entries = hydration_ref.order_by("date").stream()
+        counters = daily_ref.order_by("date").stream()
+    entries = [{"id": entry.id, **entry.to_dict()} for entry in hydration_entries]
+    entries += [_tap_entry(day) for day in (doc.to_dict() for doc in counters) if day.get("tap_cups")]
+    if not date_filter:
+        entries.sort(key=lambda entry: entry["date"], reverse=True)
+    return entries
+
+@router.get("/daily")
+async def get_daily_hydration(
+    start: str = Query(..., alias="from", description="First date (YYYY-MM-DD)"),
+    end: str = Query(..., alias="to", description="Last date (YYYY-MM-DD)"),
+    user_id: str = Depends(get_user_id)
+):
+    """Per-date cups, including taps this worker has not written yet."""
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    days = {day["date"]: day for day in read_hydration_daily(db, user_id, start, end)}
+    for (pending_user, date), amounts in hydration_writes.pending_items():
+        if pending_user == user_id and start <= date <= end:
+            day = days.setdefault(date, {"date": date, "amount_cups": 0})
+            day["amount_cups"] = (day.get("amount_cups") or 0) + amounts["cups"]
+    return [days[date] for date in sorted(days)]
+
+@router.post("/increment")
+async def increment_hydration_counter(increment: HydrationIncrement, user_id: str = Depends(get_user_id),
+                                     idempotency_key: Optional[str] = Depends(idempotency_key_header)):
+    """
+    Add cups to the day's counter. Increments arriving within the coalescing
+    window are merged into one write.
+    """
+    async def add_increment():
+        pending = hydration_writes.add((user_id, increment.date), cups=increment.amount_cups, taps=1)
+        return {
+            "date": increment.date,
+            "added_cups": increment.amount_cups,
+            "pending_cups": pending["cups"],
+            "pending_taps": int(pending["taps"])
+        }
+
+    return await run_once(db, user_id, "hydration.increment", idempotency_key, increment.dict(), add_increment)
 
 @router.post("")
-async def create_hydration_entry(hydration: HydrationEntry, user_id: str = Depends(get_user_id)):
+async def create_hydration_entry(hydration: HydrationEntry, user_id: str = Depends(get_user_id),
+                                 idempotency_key: Optional[str] = Depends(idempotency_key_header)):
     hydration_dict = hydration.dict(exclude={"id"})
     hydration_dict["created_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("hydration").document()
-    doc_ref.set(hydration_dict)
+    hydration_dict["updated_at"] = hydration_dict["created_at"]
+    doc_ref = new_document(db.collection("users").document(user_id).collection("hydration"), idempotency_key)
+    existing = create_document(doc_ref, hydration_dict, lambda: add_hydration_entry(db, user_id, hydration_dict, doc_ref.id))
+    if existing is not None:
+        return {"id": doc_ref.id, **existing}
+    publish_change(user_id, "hydration", doc_ref.id, hydration_dict)
+    _publish_days(user_id, hydration_dict["date"])
     return {"id": doc_ref.id, **hydration_dict}
 
 @router.put("/{hydration_id}")
 async def update_hydration_entry(hydration_id: str, hydration: HydrationEntry, user_id: str = Depends(get_user_id)):
     hydration_dict = hydration.dict(exclude={"id"})
     hydration_dict["updated_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("hydration").document(hydration_id)
-    if not doc_ref.get().exists:
+    previous = replace_hydration_entry(db, user_id, hydration_id, hydration_dict)
+    if previous is None:
         raise HTTPException(status_code=404, detail="Hydration entry not found")
-    doc_ref.update(hydration_dict)
+    publish_change(user_id, "hydration", hydration_id, hydration_dict)
+    _publish_days(user_id, previous.get("date"), hydration_dict["date"])
     return {"id": hydration_id, **hydration_dict}
 
 @router.delete("/{hydration_id}")
 async def delete_hydration_entry(hydration_id: str, user_id: str = Depends(get_user_id)):
-    doc_ref = db.collection("users").document(user_id).collection("hydration").document(hydration_id)
-    if not doc_ref.get().exists:
+    previous = remove_hydration_entry(db, user_id, hydration_id)
+    if previous is None:
         raise HTTPException(status_code=404, detail="Hydration entry not found")
-    doc_ref.delete()
+    publish_deletion(user_id, "hydration", hydration_id)
+    _publish_days(user_id, previous.get("date"))
     return {"message": "Hydration entry deleted"}
-
@@ -0,0 +1,90 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from typing import BinaryIO, Optional, Tuple
+import hashlib
+import os
+import tempfile
+from auth import get_user_id
+from db import db
+from idempotency import idempotency_key_header, run_once
+from importer import IMPORT_KINDS, FORMATS, create_job, get_job, run_import
+
+router = APIRouter(prefix="/api/import", tags=["import"])
+
+# Uploads larger than this are rejected (gzip them: they are decompressed while reading)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_IMPORT_BYTES", str(200 * 1024 * 1024)))
+
+def _guess_format(filename: Optional[str]) -> Optional[str]:
+    name = (filename or "").lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+def _save_upload(upload: BinaryIO) -> Tuple[str, int, str]:
+    """Copy an upload to a temporary file. Returns its path, size and SHA-256."""
+    fd, path = tempfile.mkstemp(prefix="gymai-import-")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := upload.read(1024 * 1024):
+                digest.update(chunk)
+                out.write(chunk)
+            return path, out.tell(), digest.hexdigest()
+    except Exception:
+        os.remove(path)
+        raise
+
+@router.post("", status_code=202)
+async def start_import(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    kind: str = Query(..., description=f"One of: {', '.join(IMPORT_KINDS)}"),
+    format: Optional[str] = Query(None, description="csv or ndjson; guessed from the file name if omitted"),
+    user_id: str = Depends(get_user_id),
+    idempotency_key: Optional[str] = Depends(idempotency_key_header)
+):
+    """
+    Upload a CSV or NDJSON file (optionally gzipped) of sleep, macros, workouts
+    (one row per set) or steps. The import runs in the background; poll
+    GET /api/import/{job_id} for progress and row errors. Retrying with the same
+    Idempotency-Key and file returns the original job instead of importing twice.
+    """
+    if kind not in IMPORT_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind: {kind}")
+    file_format = format or _guess_format(file.filename)
+    if file_format not in FORMATS:
+        raise HTTPException(status_code=400, detail="Specify format=csv or format=ndjson")
+
+    # Copy the upload to a file the background task owns; it is read back one row at a time.
+    # Uploads can be hundreds of MB, so copy off the event loop
+    path, size, digest = await run_in_threadpool(_save_upload, file.file)
+    queued = False
+
+    async def queue_import():
+        nonlocal queued
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+        job_id = create_job(db, user_id, kind, file_format, file.filename)
+        background_tasks.add_task(run_import, db, user_id, job_id, path, kind, file_format)
+        queued = True
+        return {"job_id": job_id, "status": "queued"}
+
+    try:
+        # Keyed on the file's hash, so a retry of the same upload gets the first job back
+        return await run_once(db, user_id, "import", idempotency_key,
+                              {"kind": kind, "format": file_format, "sha256": digest}, queue_import)
+    finally:
+        # The background task owns the file once queued; rejected uploads and replays remove it here
+        if not queued:
+            os.remove(path)
+
+@router.get("/{job_id}")
+async def get_import_job(job_id: str, user_id: str = Depends(get_user_id)):
+    job = get_job(db, user_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
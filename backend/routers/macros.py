@@ -3,10 +3,32 @@ from typing import Optional
 from datetime import datetime
 from models import MacroEntry
 from auth import get_user_id
+from idempotency import idempotency_key_header, new_document, create_document
 from db import db
+from foods import resolve_food_item
+from rollups import add_macro_entry, replace_macro_entry, remove_macro_entry, read_daily_totals
+from events import publish_change, publish_deletion
 
 router = APIRouter(prefix="/api/macros", tags=["macros"])
 
+def _publish_days(user_id: str, *dates: Optional[str]) -> None:
+    """Tell clients the daily totals of these dates changed (they refetch them)."""
+    for date in {date for date in dates if date}:
+        publish_change(user_id, "nutrition_daily", date)
+
+def _resolve_food_items(macro_dict: dict) -> None:
+    """Fill nutrients of food items logged by food_id and check manual items are complete."""
+    items = []
+    for item in macro_dict.get("food_items") or []:
+        try:
+            item = resolve_food_item(item)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not item.get("name") or item.get("calories") is None or item.get("protein") is None:
+            raise HTTPException(status_code=400, detail="Food items need name, calories and protein, or a food_id")
+        items.append(item)
+    macro_dict["food_items"] = items
+
 @router.get("")
 async def get_macro_entries(user_id: str = Depends(get_user_id), date_filter: Optional[str] = Query(None)):
     macros_ref = db.collection("users").document(user_id).collection("macros")
@@ -17,9 +39,22 @@ async def get_macro_entries(user_id: str = Depends(get_user_id), date_filter: Op
         macros.reverse()
     return [{"id": macro.id, **macro.to_dict()} for macro in macros]
 
+@router.get("/daily")
+async def get_daily_macros(
+    start: str = Query(..., alias="from", description="First date (YYYY-MM-DD)"),
+    end: str = Query(..., alias="to", description="Last date (YYYY-MM-DD)"),
+    user_id: str = Depends(get_user_id)
+):
+    """Per-date nutrition totals summed over all of the day's entries."""
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    return read_daily_totals(db, user_id, start, end)
+
 @router.post("")
-async def create_macro_entry(macro_entry: MacroEntry, user_id: str = Depends(get_user_id)):
+async def create_macro_entry(macro_entry: MacroEntry, user_id: str = Depends(get_user_id),
+                             idempotency_key: Optional[str] = Depends(idempotency_key_header)):
     macro_dict = macro_entry.dict(exclude={"id"})
+    _resolve_food_items(macro_dict)
     if not macro_dict.get("total_calories") and macro_dict.get("food_items"):
         macro_dict["total_calories"] = sum(item.get("calories", 0) for item in macro_dict["food_items"])
     if not macro_dict.get("total_protein") and macro_dict.get("food_items"):
@@ -31,13 +66,19 @@ async def create_macro_entry(macro_entry: MacroEntry, user_id: str = Depends(get
     if not macro_dict.get("food_items"):
         macro_dict["food_items"] = []
     macro_dict["created_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("macros").document()
-    doc_ref.set(macro_dict)
+    macro_dict["updated_at"] = macro_dict["created_at"]
+    doc_ref = new_document(db.collection("users").document(user_id).collection("macros"), idempotency_key)
+    existing = create_document(doc_ref, macro_dict, lambda: add_macro_entry(db, user_id, macro_dict, doc_ref.id))
+    if existing is not None:
+        return {"id": doc_ref.id, **existing}
+    publish_change(user_id, "macros", doc_ref.id, macro_dict)
+    _publish_days(user_id, macro_dict["date"])
     return {"id": doc_ref.id, **macro_dict}
 
 @router.put("/{macro_id}")
 async def update_macro_entry(macro_id: str, macro_entry: MacroEntry, user_id: str = Depends(get_user_id)):
     macro_dict = macro_entry.dict(exclude={"id"})
+    _resolve_food_items(macro_dict)
     if not macro_dict.get("total_calories") and macro_dict.get("food_items"):
         macro_dict["total_calories"] = sum(item.get("calories", 0) for item in macro_dict["food_items"])
     if not macro_dict.get("total_protein") and macro_dict.get("food_items"):
@@ -49,17 +90,19 @@ async def update_macro_entry(macro_id: str, macro_entry: MacroEntry, user_id: st
     if not macro_dict.get("food_items"):
         macro_dict["food_items"] = []
     macro_dict["updated_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("macros").document(macro_id)
-    if not doc_ref.get().exists:
+    previous = replace_macro_entry(db, user_id, macro_id, macro_dict)
+    if previous is None:
         raise HTTPException(status_code=404, detail="Macro entry not found")
-    doc_ref.update(macro_dict)
+    publish_change(user_id, "macros", macro_id, macro_dict)
+    _publish_days(user_id, previous.get("date"), macro_dict["date"])
     return {"id": macro_id, **macro_dict}
 
 @router.delete("/{macro_id}")
 async def delete_macro_entry(macro_id: str, user_id: str = Depends(get_user_id)):
-    doc_ref = db.collection("users").document(user_id).collection("macros").document(macro_id)
-    if not doc_ref.get().exists:
+    previous = remove_macro_entry(db, user_id, macro_id)
+    if previous is None:
         raise HTTPException(status_code=404, detail="Macro entry not found")
-    doc_ref.delete()
+    publish_deletion(user_id, "macros", macro_id)
+    _publish_days(user_id, previous.get("date"))
     return {"message": "Macro entry deleted"}
 
@@ -0,0 +1,23 @@
+"""
+Metrics Router
+Prometheus scrape endpoint. When METRICS_TOKEN is set, scrapers must send it
+as a Bearer token.
+"""
+
+import hmac
+import os
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from metrics import render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def get_metrics(request: Request):
+    token = os.getenv("METRICS_TOKEN")
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -3,7 +3,11 @@ from typing import Optional
 from datetime import datetime
 from models import PhysicalActivity
 from auth import get_user_id
+from idempotency import idempotency_key_header, new_document, create_document
 from db import db
+from sync import record_deletion
+from events import publish_change, publish_deletion
+from ai_analysis.retrieval import notes_index
 
 router = APIRouter(prefix="/api/physical-activities", tags=["physical-activities"])
 
@@ -18,11 +22,17 @@ async def get_physical_activities(user_id: str = Depends(get_user_id), date_filt
     return [{"id": activity.id, **activity.to_dict()} for activity in activities]
 
 @router.post("")
-async def create_physical_activity(activity: PhysicalActivity, user_id: str = Depends(get_user_id)):
+async def create_physical_activity(activity: PhysicalActivity, user_id: str = Depends(get_user_id),
+                                   idempotency_key: Optional[str] = Depends(idempotency_key_header)):
     activity_dict = activity.dict(exclude={"id"})
     activity_dict["created_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("physical_activities").document()
-    doc_ref.set(activity_dict)
+    activity_dict["updated_at"] = activity_dict["created_at"]
+    doc_ref = new_document(db.collection("users").document(user_id).collection("physical_activities"), idempotency_key)
+    existing = create_document(doc_ref, activity_dict)
+    if existing is not None:
+        return {"id": doc_ref.id, **existing}
+    publish_change(user_id, "physical_activities", doc_ref.id, activity_dict)
+    notes_index.on_write(user_id, "physical_activities", doc_ref.id, activity_dict)
     return {"id": doc_ref.id, **activity_dict}
 
 @router.put("/{activity_id}")
@@ -33,6 +43,8 @@ async def update_physical_activity(activity_id: str, activity: PhysicalActivity,
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Physical activity not found")
     doc_ref.update(activity_dict)
+    publish_change(user_id, "physical_activities", activity_id, activity_dict)
+    notes_index.on_write(user_id, "physical_activities", activity_id, activity_dict)
     return {"id": activity_id, **activity_dict}
 
 @router.delete("/{activity_id}")
@@ -41,5 +53,8 @@ async def delete_physical_activity(activity_id: str, user_id: str = Depends(get_
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Physical activity not found")
     doc_ref.delete()
+    record_deletion(db, user_id, "physical_activities", activity_id)
+    publish_deletion(user_id, "physical_activities", activity_id)
+    notes_index.on_delete(user_id, "physical_activities", activity_id)
     return {"message": "Physical activity deleted"}
 
@@ -3,7 +3,11 @@ from typing import Optional
 from datetime import datetime
 from models import SleepEntry
 from auth import get_user_id
+from idempotency import idempotency_key_header, new_document, create_document
 from db import db
+from sync import record_deletion
+from events import publish_change, publish_deletion
+from ai_analysis.retrieval import notes_index
 
 router = APIRouter(prefix="/api/sleep", tags=["sleep"])
 
@@ -18,11 +22,17 @@ async def get_sleep_entries(user_id: str = Depends(get_user_id), date_filter: Op
     return [{"id": entry.id, **entry.to_dict()} for entry in sleep_entries]
 
 @router.post("")
-async def create_sleep_entry(sleep: SleepEntry, user_id: str = Depends(get_user_id)):
+async def create_sleep_entry(sleep: SleepEntry, user_id: str = Depends(get_user_id),
+                             idempotency_key: Optional[str] = Depends(idempotency_key_header)):
     sleep_dict = sleep.dict(exclude={"id"})
     sleep_dict["created_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("sleep").document()
-    doc_ref.set(sleep_dict)
+    sleep_dict["updated_at"] = sleep_dict["created_at"]
+    doc_ref = new_document(db.collection("users").document(user_id).collection("sleep"), idempotency_key)
+    existing = create_document(doc_ref, sleep_dict)
+    if existing is not None:
+        return {"id": doc_ref.id, **existing}
+    publish_change(user_id, "sleep", doc_ref.id, sleep_dict)
+    notes_index.on_write(user_id, "sleep", doc_ref.id, sleep_dict)
     return {"id": doc_ref.id, **sleep_dict}
 
 @router.put("/{sleep_id}")
@@ -33,6 +43,8 @@ async def update_sleep_entry(sleep_id: str, sleep: SleepEntry, user_id: str = De
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Sleep entry not found")
     doc_ref.update(sleep_dict)
+    publish_change(user_id, "sleep", sleep_id, sleep_dict)
+    notes_index.on_write(user_id, "sleep", sleep_id, sleep_dict)
     return {"id": sleep_id, **sleep_dict}
 
 @router.delete("/{sleep_id}")
@@ -41,5 +53,8 @@ async def delete_sleep_entry(sleep_id: str, user_id: str = Depends(get_user_id))
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Sleep entry not found")
     doc_ref.delete()
+    record_deletion(db, user_id, "sleep", sleep_id)
+    publish_deletion(user_id, "sleep", sleep_id)
+    notes_index.on_delete(user_id, "sleep", sleep_id)
     return {"message": "Sleep entry deleted"}
 
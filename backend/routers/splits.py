@@ -1,8 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
 from datetime import datetime
 from models import WorkoutSplit
 from auth import get_user_id
+from idempotency import idempotency_key_header, new_document, create_document
 from db import db
+from sync import record_deletion
+from events import publish_change, publish_deletion
 
 router = APIRouter(prefix="/api/splits", tags=["splits"])
 
@@ -13,11 +17,16 @@ async def get_splits(user_id: str = Depends(get_user_id)):
     return [{"id": split.id, **split.to_dict()} for split in splits]
 
 @router.post("")
-async def create_split(split: WorkoutSplit, user_id: str = Depends(get_user_id)):
+async def create_split(split: WorkoutSplit, user_id: str = Depends(get_user_id),
+                       idempotency_key: Optional[str] = Depends(idempotency_key_header)):
     split_dict = split.dict(exclude={"id"})
     split_dict["created_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("splits").document()
-    doc_ref.set(split_dict)
+    split_dict["updated_at"] = split_dict["created_at"]
+    doc_ref = new_document(db.collection("users").document(user_id).collection("splits"), idempotency_key)
+    existing = create_document(doc_ref, split_dict)
+    if existing is not None:
+        return {"id": doc_ref.id, **existing}
+    publish_change(user_id, "splits", doc_ref.id, split_dict)
     return {"id": doc_ref.id, **split_dict}
 
 @router.put("/{split_id}")
@@ -28,6 +37,7 @@ async def update_split(split_id: str, split: WorkoutSplit, user_id: str = Depend
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Split not found")
     doc_ref.update(split_dict)
+    publish_change(user_id, "splits", split_id, split_dict)
     return {"id": split_id, **split_dict}
 
 @router.delete("/{split_id}")
@@ -36,5 +46,7 @@ async def delete_split(split_id: str, user_id: str = Depends(get_user_id)):
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Split not found")
     doc_ref.delete()
+    record_deletion(db, user_id, "splits", split_id)
+    publish_deletion(user_id, "splits", split_id)
     return {"message": "Split deleted"}
 
@@ -3,7 +3,11 @@ from typing import Optional
 from datetime import datetime
 from models import StressEntry
 from auth import get_user_id
+from idempotency import idempotency_key_header, new_document, create_document
 from db import db
+from sync import record_deletion
+from events import publish_change, publish_deletion
+from ai_analysis.retrieval import notes_index
 
 router = APIRouter(prefix="/api/stress", tags=["stress"])
 
@@ -18,11 +22,17 @@ async def get_stress_entries(user_id: str = Depends(get_user_id), date_filter: O
     return [{"id": entry.id, **entry.to_dict()} for entry in stress_entries]
 
 @router.post("")
-async def create_stress_entry(stress: StressEntry, user_id: str = Depends(get_user_id)):
+async def create_stress_entry(stress: StressEntry, user_id: str = Depends(get_user_id),
+                              idempotency_key: Optional[str] = Depends(idempotency_key_header)):
     stress_dict = stress.dict(exclude={"id"})
     stress_dict["created_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("stress").document()
-    doc_ref.set(stress_dict)
+    stress_dict["updated_at"] = stress_dict["created_at"]
+    doc_ref = new_document(db.collection("users").document(user_id).collection("stress"), idempotency_key)
+    existing = create_document(doc_ref, stress_dict)
+    if existing is not None:
+        return {"id": doc_ref.id, **existing}
+    publish_change(user_id, "stress", doc_ref.id, stress_dict)
+    notes_index.on_write(user_id, "stress", doc_ref.id, stress_dict)
     return {"id": doc_ref.id, **stress_dict}
 
 @router.put("/{stress_id}")
@@ -33,6 +43,8 @@ async def update_stress_entry(stress_id: str, stress: StressEntry, user_id: str
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Stress entry not found")
     doc_ref.update(stress_dict)
+    publish_change(user_id, "stress", stress_id, stress_dict)
+    notes_index.on_write(user_id, "stress", stress_id, stress_dict)
     return {"id": stress_id, **stress_dict}
 
 @router.delete("/{stress_id}")
@@ -41,5 +53,8 @@ async def delete_stress_entry(stress_id: str, user_id: str = Depends(get_user_id
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Stress entry not found")
     doc_ref.delete()
+    record_deletion(db, user_id, "stress", stress_id)
+    publish_deletion(user_id, "stress", stress_id)
+    notes_index.on_delete(user_id, "stress", stress_id)
     return {"message": "Stress entry deleted"}
 
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from auth import get_user_id
+from db import db
+from sync import sync_changes, SyncTokenExpired, MAX_PAGE_SIZE
+
+router = APIRouter(prefix="/api/sync", tags=["sync"])
+
+@router.get("")
+async def get_changes(
+    since: Optional[str] = Query(None, description="next_token from the previous response; omit for a full sync"),
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Created, updated and deleted documents across the user's collections since a
+    sync token. Keep requesting with next_token while has_more is true, then
+    store the final next_token for the next sync.
+    """
+    try:
+        return sync_changes(db, user_id, since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SyncTokenExpired:
+        raise HTTPException(status_code=410, detail="Sync token expired, start a full sync")
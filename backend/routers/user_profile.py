@@ -3,6 +3,8 @@ from models import UserProfile
 from auth import get_user_id
 from db import db
 from datetime import datetime
+from ai_analysis import invalidate_user_profile
+from events import publish_change
 
 router = APIRouter(prefix="/api/user-profile", tags=["user-profile"])
 
@@ -21,6 +23,8 @@ async def create_user_profile(profile: UserProfile, user_id: str = Depends(get_u
     profile_dict["updated_at"] = datetime.now().isoformat()
     doc_ref = db.collection("users").document(user_id).collection("user_profile").document("profile")
     doc_ref.set(profile_dict)
+    invalidate_user_profile(user_id)
+    publish_change(user_id, "user_profile", doc_ref.id, profile_dict)
     return {"id": doc_ref.id, **profile_dict}
 
 @router.put("")
@@ -36,5 +40,7 @@ async def update_user_profile(profile: UserProfile, user_id: str = Depends(get_u
     else:
         profile_dict["created_at"] = datetime.now().isoformat()
     doc_ref.set(profile_dict)
+    invalidate_user_profile(user_id)
+    publish_change(user_id, "user_profile", doc_ref.id, profile_dict)
     return {"id": doc_ref.id, **profile_dict}
 
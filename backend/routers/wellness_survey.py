@@ -3,7 +3,10 @@ from typing import Optional
 from datetime import datetime
 from models import WellnessSurvey
 from auth import get_user_id
+from idempotency import idempotency_key_header, new_document, create_document
 from db import db
+from sync import record_deletion
+from events import publish_change, publish_deletion
 
 router = APIRouter(prefix="/api/wellness-survey", tags=["wellness-survey"])
 
@@ -18,11 +21,16 @@ async def get_wellness_surveys(user_id: str = Depends(get_user_id), date_filter:
     return [{"id": survey.id, **survey.to_dict()} for survey in surveys]
 
 @router.post("")
-async def create_wellness_survey(survey: WellnessSurvey, user_id: str = Depends(get_user_id)):
+async def create_wellness_survey(survey: WellnessSurvey, user_id: str = Depends(get_user_id),
+                                 idempotency_key: Optional[str] = Depends(idempotency_key_header)):
     survey_dict = survey.dict(exclude={"id"})
     survey_dict["created_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("wellness_survey").document()
-    doc_ref.set(survey_dict)
+    survey_dict["updated_at"] = survey_dict["created_at"]
+    doc_ref = new_document(db.collection("users").document(user_id).collection("wellness_survey"), idempotency_key)
+    existing = create_document(doc_ref, survey_dict)
+    if existing is not None:
+        return {"id": doc_ref.id, **existing}
+    publish_change(user_id, "wellness_survey", doc_ref.id, survey_dict)
     return {"id": doc_ref.id, **survey_dict}
 
 @router.put("/{surveey_id}")
@@ -33,6 +41,7 @@ async def update_wellness_survey(survey_id: str, survey: WellnessSurvey, user_id
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Wellness survey not found")
     doc_ref.update(survey_dict)
+    publish_change(user_id, "wellness_survey", survey_id, survey_dict)
     return {"id": survey_id, **survey_dict}
 
 @router.delete("/{survey_id}")
@@ -41,5 +50,7 @@ async def delete_wellness_survey(survey_id: str, user_id: str = Depends(get_user
     if not doc_ref.get().exists:
         raise HTTPException(status_code=404, detail="Wellness survey not found")
     doc_ref.delete()
+    record_deletion(db, user_id, "wellness_survey", survey_id)
+    publish_deletion(user_id, "wellness_survey", survey_id)
     return {"message": "Wellness survey deleted"}
 
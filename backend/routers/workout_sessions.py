@@ -3,7 +3,12 @@ from typing import Optional
 from datetime import datetime
 from models import WorkoutSession
 from auth import get_user_id
+from idempotency import idempotency_key_header, new_document, create_document
 from db import db
+from sync import record_deletion
+from events import publish_change, publish_deletion
+from ai_analysis.retrieval import notes_index
+from exercise_index import exercise_index
 
 router = APIRouter(prefix="/api/workout-sessions", tags=["workout-sessions"])
 
@@ -18,11 +23,18 @@ async def get_workout_sessions(user_id: str = Depends(get_user_id), date_filter:
     return [{"id": session.id, **session.to_dict()} for session in sessions]
 
 @router.post("")
-async def create_workout_session(session: WorkoutSession, user_id: str = Depends(get_user_id)):
+async def create_workout_session(session: WorkoutSession, user_id: str = Depends(get_user_id),
+                                 idempotency_key: Optional[str] = Depends(idempotency_key_header)):
     session_dict = session.dict(exclude={"id"})
     session_dict["created_at"] = datetime.now().isoformat()
-    doc_ref = db.collection("users").document(user_id).collection("workout_sessions").document()
-    doc_ref.set(session_dict)
+    session_dict["updated_at"] = session_dict["created_at"]
+    doc_ref = new_document(db.collection("users").document(user_id).collection("workout_sessions"), idempotency_key)
+    existing = create_document(doc_ref, session_dict)
+    if existing is not None:
+        return {"id": doc_ref.id, **existing}
+    publish_change(user_id, "workout_sessions", doc_ref.id, session_dict)
+    notes_index.on_write(user_id, "workout_sessions", doc_ref.id, session_dict)
+    exercise_index.on_session_change(user_id, new_exercises=session_dict["exercises"])
     return {"id": doc_ref.id, **session_dict}
 
 @router.put("/{session_id}")
@@ -30,16 +42,25 @@ async def update_workout_session(session_id: str, session: WorkoutSession, user_
     session_dict = session.dict(exclude={"id"})
     session_dict["updated_at"] = datetime.now().isoformat()
     doc_ref = db.collection("users").document(user_id).collection("workout_sessions").document(session_id)
-    if not doc_ref.get().exists:
+    existing = doc_ref.get()
+    if not existing.exists:
         raise HTTPException(status_code=404, detail="Workout session not found")
     doc_ref.update(session_dict)
+    publish_change(user_id, "workout_sessions", session_id, session_dict)
+    notes_index.on_write(user_id, "workout_sessions", session_id, session_dict)
+    exercise_index.on_session_change(user_id, existing.to_dict().get("exercises"), session_dict["exercises"])
     return {"id": session_id, **session_dict}
 
 @router.delete("/{session_id}")
 async def delete_workout_session(session_id: str, user_id: str = Depends(get_user_id)):
     doc_ref = db.collection("users").document(user_id).collection("workout_sessions").document(session_id)
-    if not doc_ref.get().exists:
+    existing = doc_ref.get()
+    if not existing.exists:
         raise HTTPException(status_code=404, detail="Workout session not found")
     doc_ref.delete()
+    record_deletion(db, user_id, "workout_sessions", session_id)
+    publish_deletion(user_id, "workout_sessions", session_id)
+    notes_index.on_delete(user_id, "workout_sessions", session_id)
+    exercise_index.on_session_change(user_id, old_exercises=existing.to_dict().get("exercises"))
     return {"message": "Workout session deleted"}
 
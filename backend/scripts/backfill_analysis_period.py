@@ -0,0 +1,54 @@
+"""
+Analysis Period Backfill
+Sets the `period` field (year * 100 + month) on AI analyses stored before it
+existed, so they are found by the cross-year previous-months range query.
+
+Usage (from backend/):
+    python -m scripts.backfill_analysis_period [--dry-run]
+"""
+
+import argparse
+
+from db import db
+from routers.ai_analysis import analysis_period
+
+BATCH_SIZE = 400
+
+
+def backfill(dry_run: bool = False) -> int:
+    """
+    Add `period` to every analysis document that lacks it.
+
+    Args:
+        dry_run: Only count the documents that would be updated
+
+    Returns:
+        Number of documents updated (or that would be)
+    """
+    updated = 0
+    batch = db.batch()
+    pending = 0
+    for doc in db.collection_group("ai_analyses").select(["year", "month", "period"]).stream():
+        data = doc.to_dict()
+        if data.get("period") is not None or data.get("year") is None or data.get("month") is None:
+            continue
+        updated += 1
+        if dry_run:
+            continue
+        batch.update(doc.reference, {"period": analysis_period(int(data["year"]), int(data["month"]))})
+        pending += 1
+        if pending >= BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only count documents missing a period")
+    args = parser.parse_args()
+    count = backfill(dry_run=args.dry_run)
+    print(f"{'Would update' if args.dry_run else 'Updated'} {count} analyses")
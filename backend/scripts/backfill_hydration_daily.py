@@ -0,0 +1,38 @@
+"""
+Hydration Counter Backfill
+Rebuilds every user's hydration_daily counters from their raw hydration
+entries, keeping the quick-logged cups already counted. Run once after
+deploying counters, or to repair them after manual edits. Daily totals are
+computed from raw entries until a full run (without --user) has completed.
+
+Usage (from backend/):
+    python -m scripts.backfill_hydration_daily [--user USER_ID]
+"""
+
+import argparse
+
+from db import db
+from rollups import mark_backfilled, rebuild_hydration_daily
+
+
+def backfill(user_id: str = None) -> int:
+    """
+    Rebuild counters for one user, or for all users.
+
+    Returns:
+        Number of days written
+    """
+    user_ids = [user_id] if user_id else [ref.id for ref in db.collection("users").list_documents()]
+    days = 0
+    for uid in user_ids:
+        days += rebuild_hydration_daily(db, uid)
+    if not user_id:
+        mark_backfilled(db, "hydration_daily")
+    return days
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user", help="Only rebuild this user's counters")
+    args = parser.parse_args()
+    print(f"Wrote {backfill(args.user)} daily hydration counters")
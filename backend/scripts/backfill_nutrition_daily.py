@@ -0,0 +1,38 @@
+"""
+Nutrition Rollup Backfill
+Rebuilds every user's nutrition_daily rollups from their raw macro entries.
+Run once after deploying rollups, or to repair totals after manual edits.
+Daily totals are computed from raw entries until a full run (without --user)
+has completed.
+
+Usage (from backend/):
+    python -m scripts.backfill_nutrition_daily [--user USER_ID]
+"""
+
+import argparse
+
+from db import db
+from rollups import mark_backfilled, rebuild_daily_totals
+
+
+def backfill(user_id: str = None) -> int:
+    """
+    Rebuild rollups for one user, or for all users.
+
+    Returns:
+        Number of days written
+    """
+    user_ids = [user_id] if user_id else [ref.id for ref in db.collection("users").list_documents()]
+    days = 0
+    for uid in user_ids:
+        days += rebuild_daily_totals(db, uid)
+    if not user_id:
+        mark_backfilled(db, "nutrition_daily")
+    return days
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user", help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+    print(f"Wrote {backfill(args.user)} daily rollups")
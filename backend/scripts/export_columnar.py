@@ -0,0 +1,99 @@
+"""
+Columnar Export
+Exports every user's data as Parquet (or Arrow) tables for the analytics team,
+laid out as a Hive-partitioned dataset: OUT/{table}/user_id={uid}/part-0.parquet.
+Users are exported in parallel by a process pool; each worker opens its own
+Firestore client.
+
+Usage (from backend/):
+    python -m scripts.export_columnar --out /data/gymai [--workers 4] [--format arrow] [--tables sleep,workout_sets] [--user USER_ID]
+"""
+
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List
+
+
+def export_user(user_id: str, out_dir: str, tables: List[str], file_format: str) -> Dict[str, int]:
+    """
+    Write all tables of one user (runs in a worker process).
+
+    Returns:
+        Rows written per table; tables without rows are not written
+    """
+    from db import db
+    from columnar import FORMATS, write_table
+
+    extension = FORMATS[file_format][1]
+    counts = {}
+    for table in tables:
+        directory = os.path.join(out_dir, table, f"user_id={user_id}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-0.{extension}")
+        rows = write_table(db, user_id, table, path + ".tmp", file_format)
+        if rows:
+            os.replace(path + ".tmp", path)
+        else:
+            os.remove(path + ".tmp")
+            if not os.listdir(directory):
+                os.rmdir(directory)
+        counts[table] = rows
+    return counts
+
+
+def export_all(out_dir: str, tables: List[str], file_format: str, workers: int, user_id: str = None) -> Dict[str, int]:
+    """
+    Export one user, or all users, keeping at most a few users per worker in flight.
+
+    Returns:
+        Rows written per table across users
+    """
+    from db import db
+
+    user_ids = iter([user_id] if user_id else (ref.id for ref in db.collection("users").list_documents()))
+    totals = {table: 0 for table in tables}
+    exported = failed = 0
+    # Spawned workers do not inherit the parent's gRPC channels, which are not fork-safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = {}
+        while True:
+            while len(pending) < workers * 4:
+                uid = next(user_ids, None)
+                if uid is None:
+                    break
+                pending[pool.submit(export_user, uid, out_dir, tables, file_format)] = uid
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                uid = pending.pop(future)
+                try:
+                    for table, rows in future.result().items():
+                        totals[table] += rows
+                    exported += 1
+                except Exception as e:
+                    failed += 1
+                    print(f"Warning: Could not export user {uid}: {e}")
+    print(f"Exported {exported} users ({failed} failed)")
+    return totals
+
+
+if __name__ == "__main__":
+    from columnar import TABLES, FORMATS
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--tables", help=f"Comma-separated subset of: {', '.join(TABLES)}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--user", help="Only export this user")
+    args = parser.parse_args()
+
+    tables = [table.strip() for table in args.tables.split(",")] if args.tables else list(TABLES)
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown:
+        parser.error(f"Unknown tables: {', '.join(unknown)}")
+    for table, rows in export_all(args.out, tables, args.format, args.workers, args.user).items():
+        print(f"{table}: {rows} rows")
@@ -0,0 +1,158 @@
+"""
+Delta sync
+Lists everything in a user's collections that was created, updated or deleted
+since an opaque sync token, page by page. Changes are found by `updated_at`
+(set on create and update) and deletions by tombstone documents written by the
+delete handlers.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# User collections mirrored by the mobile client, in the order they are paged through
+SYNC_COLLECTIONS = [
+    "user_profile",
+    "exercises",
+    "splits",
+    "workout_sessions",
+    "physical_activities",
+    "macros",
+    "nutrition_daily",
+    "hydration",
+    "hydration_daily",
+    "stress",
+    "body_feelings",
+    "wellness_survey",
+    "sleep",
+    "ai_analyses",
+]
+
+TOMBSTONES = "tombstones"
+
+# Tombstones are expired by a Firestore TTL policy on `expires_at`; tokens older
+# than this can no longer see every deletion and must resync from scratch
+TOMBSTONE_RETENTION_DAYS = 90
+
+# Writes stamped just before a sync started may still be committing, so the
+# window a sync covers ends slightly in the past and the next sync picks them up
+SYNC_SAFETY_SECONDS = 5
+
+MAX_PAGE_SIZE = 1000
+
+
+class SyncTokenExpired(Exception):
+    """The token predates tombstone retention; the client must do a full sync."""
+
+
+def encode_token(state: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid sync token")
+    if not isinstance(state, dict) or "u" not in state:
+        raise ValueError("Invalid sync token")
+    return state
+
+
+def record_deletion(db, user_id: str, collection: str, doc_id: str, writer=None) -> None:
+    """
+    Write a tombstone for a deleted document.
+
+    Args:
+        writer: Batch or transaction the delete is part of; written directly if None
+    """
+    now = datetime.now()
+    ref = db.collection("users").document(user_id).collection(TOMBSTONES).document(f"{collection}:{doc_id}")
+    data = {
+        "collection": collection,
+        "doc_id": doc_id,
+        "updated_at": now.isoformat(),
+        "expires_at": now + timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    }
+    if writer is None:
+        ref.set(data)
+    else:
+        writer.set(ref, data)
+
+
+def _query(user_ref, collection: str, since: Optional[str], until: str, after: Optional[list], limit: int):
+    ref = user_ref.collection(collection)
+    if since is None:
+        # Full sync: every document, including ones written before updated_at existed
+        query = ref.order_by("__name__")
+        if after:
+            query = query.start_after({"__name__": after[-1]})
+    else:
+        query = (
+            ref.where("updated_at", ">", since).where("updated_at", "<=", until)
+            .order_by("updated_at").order_by("__name__")
+        )
+        if after:
+            query = query.start_after({"updated_at": after[0], "__name__": after[1]})
+    return query.limit(limit)
+
+
+def sync_changes(db, user_id: str, token: Optional[str] = None, limit: int = 500) -> Dict[str, Any]:
+    """
+    Return one page of changes since a sync token.
+
+    Args:
+        token: Token from the previous response; None for a full sync
+        limit: Maximum number of changes in this page
+
+    Returns:
+        changes (upserts with data, deletes with only collection and id),
+        has_more, and next_token: a page cursor while has_more is true,
+        otherwise the token to send on the next sync
+
+    Raises:
+        ValueError: If the token is malformed
+        SyncTokenExpired: If the token is older than tombstone retention
+    """
+    if token:
+        state = decode_token(token)
+        if "c" not in state:
+            # A completed sync's token: start a new window after it
+            oldest = (datetime.now() - timedelta(days=TOMBSTONE_RETENTION_DAYS)).isoformat()
+            if state["u"] < oldest:
+                raise SyncTokenExpired()
+            state = {"s": state["u"], "c": 0}
+    else:
+        state = {"s": None, "c": 0}
+    if "u" not in state:
+        state["u"] = (datetime.now() - timedelta(seconds=SYNC_SAFETY_SECONDS)).isoformat()
+
+    since, until = state["s"], state["u"]
+    # Tombstones first, so a document deleted and recreated in the window ends up present
+    collections = ([TOMBSTONES] if since is not None else []) + SYNC_COLLECTIONS
+    user_ref = db.collection("users").document(user_id)
+    changes: List[Dict[str, Any]] = []
+    after = state.get("a")
+
+    for index in range(state["c"], len(collections)):
+        collection = collections[index]
+        remaining = limit - len(changes)
+        docs = list(_query(user_ref, collection, since, until, after, remaining).stream())
+        for doc in docs:
+            data = doc.to_dict()
+            if collection == TOMBSTONES:
+                changes.append({"op": "delete", "collection": data["collection"], "id": data["doc_id"]})
+            else:
+                changes.append({"op": "upsert", "collection": collection, "id": doc.id, "data": data})
+        after = None
+        if len(docs) == remaining:
+            last = docs[-1]
+            cursor = {"s": since, "u": until, "c": index, "a": [last.to_dict().get("updated_at"), last.id]}
+            return {"changes": changes, "has_more": True, "next_token": encode_token(cursor)}
+
+    return {"changes": changes, "has_more": False, "next_token": encode_token({"u": until})}
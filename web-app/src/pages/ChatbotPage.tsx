@@ -14,7 +14,7 @@ export default function ChatbotPage() {
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputMessage, setInputMessage] = useState("");
   const [loading, setLoading] = useState(false);
-  const [conversationHistory, setConversationHistory] = useState<any[]>([]);
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
@@ -36,9 +36,15 @@ export default function ChatbotPage() {
     setLoading(true);
 
     try {
-      const res = await apiClient.post("/api/ai-analysis/chat", {
+      let currentSessionId = sessionId;
+      if (!currentSessionId) {
+        const sessionRes = await apiClient.post("/api/ai-analysis/chat/sessions", {});
+        currentSessionId = sessionRes.data.session_id as string;
+        setSessionId(currentSessionId);
+      }
+
+      const res = await apiClient.post(`/api/ai-analysis/chat/sessions/${currentSessionId}/messages`, {
         message: messageToSend,
-        conversation_history: conversationHistory,
       });
 
       if (res.data.status === "success") {
@@ -47,7 +53,6 @@ export default function ChatbotPage() {
           content: res.data.response,
         };
         setMessages([...updatedMessages, assistantMessage]);
-        setConversationHistory(res.data.conversation_history || []);
       } else {
         throw new Error("Chat failed");
       }
@@ -65,8 +70,13 @@ export default function ChatbotPage() {
 
   const clearConversation = () => {
     if (confirm("Clear conversation history?")) {
+      if (sessionId) {
+        apiClient.delete(`/api/ai-analysis/chat/sessions/${sessionId}`).catch((error) => {
+          console.error("Error deleting chat session:", error);
+        });
+      }
       setMessages([]);
-      setConversationHistory([]);
+      setSessionId(null);
     }
   };
 